@@ -0,0 +1,3 @@
+"""Benchmarks for lsf-ibutils. Each module can be run as a script, e.g.,
+``python -m benchmarks.startup``, or all of them with ``paver benchmark``.
+"""
@@ -0,0 +1,89 @@
+"""Measure how rendering a large batch of scripts scales with the number of
+processes used by :meth:`~lsf_ibutils.ibsub.batch.RunBatch.render_shards`.
+Rows are validated by the real prompts, answered as in ``ibsub batch``.
+"""
+
+from __future__ import print_function
+
+import io
+import shutil
+import sys
+import tempfile
+import time
+
+import pinject
+
+from lsf_ibutils.ibsub.batch import BatchBindingSpec, RunBatch
+from lsf_ibutils.ibsub.binding_specs import IbsubBindingSpec
+from lsf_ibutils.ibsub.hosts import Host, QueueTopology
+from lsf_ibutils.ibsub.queues import QueueLimits, QueueLoad
+
+ROWS = 20000
+
+JOBS = [1, 2, 4, 8]
+
+
+# Like the completers, return the same memoized objects on every call.
+_QUEUE_NAMES = ['regular']
+_QUEUE_LIMITS = {
+    'regular': QueueLimits('regular', run_limit=720.0, max_tasks=1024)}
+_QUEUE_LOADS = {'regular': QueueLoad('regular')}
+_QUEUE_TOPOLOGY = {
+    'regular': QueueTopology('regular', [Host('node', slots=16)])}
+
+
+class _BenchmarkBindingSpec(pinject.BindingSpec):
+    def provide_get_queue_completions(self):
+        return lambda: _QUEUE_NAMES
+
+    def provide_get_queue_limits(self):
+        return lambda: _QUEUE_LIMITS
+
+    def provide_get_queue_loads(self):
+        return lambda: _QUEUE_LOADS
+
+    def provide_get_queue_topology(self):
+        return lambda: _QUEUE_TOPOLOGY
+
+    def provide_get_group_completions(self):
+        return lambda: ['group']
+
+
+def _rows():
+    for number in range(ROWS):
+        yield {
+            'JobName': 'wrf-{0}'.format(number),
+            'ProjectCode': 'SCSG0001',
+            'QueueName': 'regular',
+            'TasksPerJob': '64',
+            'WallClockTime': '2:00',
+            'Command': 'mpirun.lsf ./wrf.exe --case {0}'.format(number),
+        }
+
+
+def main():
+    obj_graph = pinject.new_object_graph(binding_specs=[
+        IbsubBindingSpec(), BatchBindingSpec(), _BenchmarkBindingSpec()])
+    run_batch = obj_graph.provide(RunBatch)
+    baseline = None
+    for jobs in JOBS:
+        directory = tempfile.mkdtemp()
+        err_stream = io.StringIO()
+        try:
+            start = time.time()
+            succeeded, failed = run_batch.render_shards(
+                _rows(), 'bash', err_stream, directory, jobs)
+            seconds = time.time() - start
+        finally:
+            shutil.rmtree(directory)
+        if failed:
+            sys.exit(err_stream.getvalue())
+        if baseline is None:
+            baseline = seconds
+        print('{0:>2} processes: {1:9.0f} scripts per second, '
+              '{2:4.2f}x'.format(jobs, succeeded / seconds,
+                                 baseline / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Compare listing completions for a prefix with the old linear scan, which
+lowercased every completion for every state, against
+:class:`~lsf_ibutils.ibsub.matchers.PrefixMatcher`, and measure
+:class:`~lsf_ibutils.ibsub.matchers.FuzzyMatcher` on the same completions.
+"""
+
+from __future__ import print_function
+
+import random
+import string
+import timeit
+
+from lsf_ibutils.ibsub.matchers import FuzzyMatcher, PrefixMatcher
+
+SIZE = 100000
+
+# Prefixes with many, few and no matches among the synthetic completions.
+PREFIXES = ['S', 'SCSG00', 'SCSG001', 'zzz']
+
+# Texts for the fuzzy matcher: a prefix, a substring, subsequences with few
+# and many candidates, and no match.
+FUZZY_TEXTS = ['SCSG', 'G001', 'sg01', 'ab1', 'qqqqq']
+
+
+def synthetic_completions(size, seed=0):
+    """Generate project-code-like completions, e.g., ``SCSG0001``.
+
+    :param size: number of completions
+    :type size: :class:`int`
+    :rtype: :class:`list` of :class:`str`
+    """
+    generator = random.Random(seed)
+    return ['{0}{1:04d}'.format(
+        ''.join(generator.choice(string.ascii_uppercase) for _ in range(4)),
+        generator.randrange(10000)) for _ in range(size)]
+
+
+def linear_completer(completions):
+    """The completer as it was before indexing."""
+    def completer(text, state):
+        for completion in completions:
+            if completion.lower().startswith(text.lower()):
+                if state == 0:
+                    return completion
+                else:
+                    state -= 1
+    return completer
+
+
+def list_all(completer, text):
+    """Collect all completions the way readline does."""
+    matches = []
+    while True:
+        match = completer(text, len(matches))
+        if match is None:
+            return matches
+        matches.append(match)
+
+
+def main():
+    completions = synthetic_completions(SIZE)
+    completions += ['SCSG{0:04d}'.format(n) for n in range(0, 200, 7)]
+    build = min(timeit.repeat(
+        lambda: PrefixMatcher(completions), number=1, repeat=3))
+    print('{0} completions, index built in {1:.1f} ms'.format(
+        len(completions), build * 1000))
+    linear = linear_completer(completions)
+    indexed = PrefixMatcher(completions).nth_match
+    for prefix in PREFIXES:
+        count = len(list_all(indexed, prefix))
+        indexed_time = min(timeit.repeat(
+            lambda: list_all(indexed, prefix), number=10, repeat=3)) / 10
+        # The linear scan is quadratic in the number of matches, so don't
+        # wait for it when there are many.
+        if count <= 100:
+            linear_time = min(timeit.repeat(
+                lambda: list_all(linear, prefix), number=1, repeat=3))
+            linear_text = '{0:9.2f} ms'.format(linear_time * 1000)
+        else:
+            linear_text = '  too slow'
+        print('{0:>10} ({1:5d} matches): linear {2}, indexed {3:7.3f} ms'
+              .format(repr(prefix), count, linear_text,
+                      indexed_time * 1000))
+
+    build = min(timeit.repeat(
+        lambda: FuzzyMatcher(completions), number=1, repeat=3))
+    print('fuzzy index built in {0:.1f} ms'.format(build * 1000))
+    for text in FUZZY_TEXTS:
+        # A fresh matcher for every run, since matchers remember the last
+        # search. They are all kept alive, so that freeing one isn't timed.
+        matchers = [FuzzyMatcher(completions) for _ in range(3)]
+        unused = iter(matchers)
+        seconds = min(timeit.repeat(
+            lambda: next(unused).matches(text), number=1, repeat=3))
+        print('{0:>10} ({1:5d} matches): fuzzy {2:8.2f} ms'.format(
+            repr(text), len(FuzzyMatcher(completions).matches(text)),
+            seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure reading `lsb.events' with
+:class:`~lsf_ibutils.ibsub.watch.EventWatcher`: a first scan of a file of
+500,000 records for 10,000 tracked jobs among 100,000, then a poll reading
+only the records appended since. Most records are of types which aren't
+decoded at all.
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+from lsf_ibutils.ibsub.watch import EventWatcher
+
+JOBS = 100000
+TRACKED = 10000
+RECORDS = 500000
+APPENDED = 5000
+
+
+def _records(count, start=0):
+    for number in range(start, start + count):
+        job_id = 1000000 + number % JOBS
+        kind = number // JOBS
+        if kind == 0:
+            yield ('"JOB_NEW" "10.1" 1369000000 {0} 1000 33554434 1 '
+                   '1369000000 0 0 -65535 -1 0 "user" -1 -1 -1 -1 -1 -1 -1 '
+                   '-1 -1 -1 -1 "" 1.00 18 "normal" "" "login1" "/home/user" '
+                   '"" "" "" "" "" "" "/home/user" "1369000000.{0}" 0 "" "" '
+                   '"job" "./run"\n').format(job_id)
+        elif kind == 1:
+            yield ('"JOB_START" "10.1" 1369000100 {0} 4 0 0 1.00 1 "node1" '
+                   '"" "" 0 "" 0 "" 0 0\n').format(job_id)
+        elif kind % 2:
+            yield ('"JOB_EXECUTE" "10.1" 1369000100 {0} 1000 1234 '
+                   '"/home/user" "/home/user" "user" 1234 0\n').format(job_id)
+        else:
+            yield ('"JOB_STATUS" "10.1" 1369000200 {0} 64 0 0 12.5 '
+                   '1369000200 0 0 0 0 0 -1 0\n').format(job_id)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'lsb.events')
+        with open(path, 'w') as events_file:
+            events_file.writelines(_records(RECORDS))
+        job_ids = [str(1000000 + number) for number in range(TRACKED)]
+        watcher = EventWatcher(
+            job_ids, path, state_path=os.path.join(directory, 'state.json'))
+        start = time.time()
+        transitions = watcher.poll()
+        print('first scan of {0:.0f} MB: {1:7.1f} ms, {2:6d} changes'.format(
+            os.path.getsize(path) / 1e6, (time.time() - start) * 1e3,
+            len(transitions)))
+        with open(path, 'a') as events_file:
+            events_file.writelines(_records(APPENDED, start=RECORDS))
+        start = time.time()
+        transitions = watcher.poll()
+        print('poll of {0} appended: {1:7.1f} ms, {2:6d} changes'.format(
+            APPENDED, (time.time() - start) * 1e3, len(transitions)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
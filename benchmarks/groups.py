@@ -0,0 +1,70 @@
+"""Compare finding the groups of a user by scanning every line of `bugroup'
+output, as ``GetGroupCompletions`` used to, against building the index of all
+users with :func:`~lsf_ibutils.ibsub.completers.parse_group_index` once and
+looking users up in it.
+"""
+
+from __future__ import print_function
+
+import json
+import random
+import time
+import timeit
+
+from lsf_ibutils.ibsub.completers import parse_group_index
+
+GROUPS = 20000
+MEMBERS = 200
+USERS = 20000
+SUBGROUP_FRACTION = 0.1
+
+
+def _bugroup_lines():
+    rng = random.Random(0)
+    lines = ['GROUP_NAME    USERS']
+    for number in range(GROUPS):
+        members = ['user{0}'.format(rng.randrange(USERS))
+                   for _ in range(MEMBERS)]
+        if number > 0 and rng.random() < SUBGROUP_FRACTION:
+            members.append('group{0}/'.format(rng.randrange(number)))
+        lines.append('group{0}    {1}'.format(number, ' '.join(members)))
+    return lines
+
+
+def _scan_groups_containing(user, lines):
+    # The old parser, without subgroups.
+    next(lines, None)
+    groups_containing_user = []
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) > 0 and user in tokens[1:]:
+            groups_containing_user.append(tokens[0])
+    return groups_containing_user
+
+
+def main():
+    lines = _bugroup_lines()
+    seconds = min(timeit.repeat(
+        lambda: _scan_groups_containing('user1', iter(lines)),
+        number=1, repeat=3))
+    print('{0:>22}: {1:9.1f} ms per user'.format('scan', seconds * 1e3))
+
+    start = time.time()
+    index = parse_group_index(iter(lines))
+    print('{0:>22}: {1:9.1f} ms'.format(
+        'build index', (time.time() - start) * 1e3))
+    seconds = min(timeit.repeat(
+        lambda: index.get('user1', '').split(), number=100000, repeat=3))
+    print('{0:>22}: {1:9.3f} us per user'.format(
+        'look up', seconds / 100000 * 1e6))
+
+    # What later runs pay to read the index from the completion cache.
+    serialized = json.dumps(index)
+    seconds = min(timeit.repeat(
+        lambda: json.loads(serialized), number=1, repeat=3))
+    print('{0:>22}: {1:9.1f} ms for {2:.1f} MB'.format(
+        'load cached index', seconds * 1e3, len(serialized) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare writing one file per script against packing all scripts into a
+single archive, and measure how long picking the last script out of each
+archive takes, as the last element of a job array would.
+"""
+
+from __future__ import print_function
+
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import time
+import timeit
+
+from lsf_ibutils.ibsub import pack
+from lsf_ibutils.ibsub.batch import script_file_name
+from lsf_ibutils.ibsub.output import BuildScript
+
+SCRIPTS = 20000
+
+FLAGS = [['-J', 'wrf'], ['-q', 'regular'], ['-n', '64']]
+
+
+def _scripts():
+    build_script = BuildScript(datetime.today)
+    for row_number in range(1, SCRIPTS + 1):
+        yield row_number, build_script(
+            FLAGS, 'mpirun.lsf ./wrf.exe --case {0}'.format(row_number),
+            'bash')
+
+
+def _write_files(directory):
+    for row_number, script in _scripts():
+        path = os.path.join(directory, script_file_name(row_number))
+        with open(path, 'w') as script_file:
+            script_file.write(script)
+
+
+def _write_archive(path):
+    with open(path, 'wb') as archive_file:
+        writer = pack.new_writer(path, archive_file)
+        for row_number, script in _scripts():
+            writer.add(script_file_name(row_number), row_number, script)
+        writer.close()
+
+
+def _read_last(path):
+    with open(path, 'rb') as archive_file:
+        return pack.new_reader(path, archive_file).entry(SCRIPTS)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        _write_files(directory)
+        print('{0:>10}: {1:9.0f} scripts per second written'.format(
+            'files', SCRIPTS / (time.time() - start)))
+        for extension in sorted(pack.FORMATS):
+            path = os.path.join(directory, 'jobs' + extension)
+            start = time.time()
+            _write_archive(path)
+            print('{0:>10}: {1:9.0f} scripts per second written, '
+                  '{2:9.3f} ms to read script {3}'.format(
+                      extension, SCRIPTS / (time.time() - start),
+                      min(timeit.repeat(lambda: _read_last(path),
+                                        number=1, repeat=3)) * 1e3,
+                      SCRIPTS))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compare running the prompts by resolving each one through pinject, as
+``ExecPrompts`` used to, against a precompiled
+:class:`~lsf_ibutils.ibsub.prompts.PromptPipeline`. Prompts are answered
+non-interactively, as in batch mode.
+"""
+
+from __future__ import print_function
+
+import timeit
+
+import pinject
+
+from lsf_ibutils.ibsub.binding_specs import IbsubBindingSpec
+from lsf_ibutils.ibsub.hosts import Host, QueueTopology
+from lsf_ibutils.ibsub.queues import QueueLimits, QueueLoad
+from lsf_ibutils.ibsub.prompts import ExecPrompts
+
+RUNS = 2000
+
+
+def _answer(message, required=False, format_=None, validator=None,
+            default=None, completions=[], fuzzy=False):
+    return default or '1'
+
+
+# Like the completers, return the same memoized objects on every call.
+_QUEUE_NAMES = ['regular']
+_QUEUE_LIMITS = {
+    'regular': QueueLimits('regular', run_limit=720.0, max_tasks=1024)}
+_QUEUE_LOADS = {'regular': QueueLoad('regular')}
+_QUEUE_TOPOLOGY = {
+    'regular': QueueTopology('regular', [Host('node', slots=16)])}
+
+
+class _BenchmarkBindingSpec(pinject.BindingSpec):
+    def provide_simple_prompt(self):
+        return _answer
+
+    def provide_get_queue_completions(self):
+        return lambda: _QUEUE_NAMES
+
+    def provide_get_queue_limits(self):
+        return lambda: _QUEUE_LIMITS
+
+    def provide_get_queue_loads(self):
+        return lambda: _QUEUE_LOADS
+
+    def provide_get_queue_topology(self):
+        return lambda: _QUEUE_TOPOLOGY
+
+    def provide_get_group_completions(self):
+        return lambda: ['group']
+
+
+def _new_obj_graph():
+    return pinject.new_object_graph(
+        binding_specs=[IbsubBindingSpec(), _BenchmarkBindingSpec()])
+
+
+def main():
+    obj_graph = _new_obj_graph()
+    pipeline = obj_graph.provide(ExecPrompts)
+    prompt_classes = [
+        prompt_class for prompt_class, _ in pipeline._prompt_pipeline]
+
+    def run_resolved():
+        values = {}
+        for prompt_class in prompt_classes:
+            value, _ = obj_graph.provide(prompt_class)(values)
+            values[prompt_class] = value
+
+    per_run = [
+        ('resolved through pinject', run_resolved),
+        ('precompiled pipeline', pipeline),
+    ]
+    for name, function in per_run:
+        seconds = min(timeit.repeat(function, number=RUNS, repeat=3))
+        print('{0:>26}: {1:8.1f} us per run'.format(
+            name, seconds / RUNS * 1e6))
+
+    # What a single `ibsub' process pays once: building the graph and
+    # compiling the pipeline.
+    seconds = min(timeit.repeat(
+        lambda: _new_obj_graph().provide(ExecPrompts), number=20, repeat=3))
+    print('{0:>26}: {1:8.1f} us'.format(
+        'graph and compilation', seconds / 20 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Measure quoting of the flag values of a large sweep, with and without the
+cache made by :func:`~lsf_ibutils.ibsub.quoting.make_quoter`.
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from lsf_ibutils.ibsub.quoting import (
+    quote_uncached, make_quoter, format_cache_info)
+
+JOBS = 20000
+
+# Most flags repeat for every job; only the job name varies.
+FLAG_VALUES = [
+    'SCSG0001',
+    'regular',
+    'span[ptile=16]',
+    'wrf output.%J.out',
+    "rusage[mem=2000] select[type=='X86_64']",
+    '64',
+]
+
+
+def _values():
+    for number in range(JOBS):
+        for value in FLAG_VALUES:
+            yield value
+        yield 'wrf run {0}'.format(number)
+
+
+def main():
+    values = list(_values())
+    quote = make_quoter()
+    for name, function in [('uncached', quote_uncached), ('cached', quote)]:
+        seconds = min(timeit.repeat(
+            lambda: [function(value) for value in values],
+            number=1, repeat=3))
+        print('{0:>9}: {1:9.0f} values per second'.format(
+            name, len(values) / seconds))
+    print('{0:>9}: {1}'.format('stats', format_cache_info(quote.cache_info())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measure script and command rendering throughput when rendering straight
+to a stream with :meth:`~lsf_ibutils.ibsub.output.BuildScript.render_to`
+and :func:`~lsf_ibutils.ibsub.output.render_command_to`, against building
+each one as a string first.
+"""
+
+from __future__ import print_function
+
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import timeit
+
+from lsf_ibutils.ibsub.output import (
+    BuildScript, build_command, render_command_to)
+
+JOBS = 20000
+
+FLAGS = [
+    ['-J', 'wrf'],
+    ['-P', 'SCSG0001'],
+    ['-n', '64'],
+    ['-R', 'span[ptile=16]'],
+    ['-W', '2:00'],
+    ['-q', 'regular'],
+    ['-o', 'wrf.%J.out'],
+    ['-e', 'wrf.%J.err'],
+]
+
+COMMAND = "mpirun.lsf ./wrf.exe --namelist 'namelist input'"
+
+
+def _per_second(function, jobs):
+    seconds = min(timeit.repeat(function, number=1, repeat=3))
+    return jobs / seconds
+
+
+def _report(name, per_second):
+    print('{0:>28}: {1:9.0f} per second'.format(name, per_second))
+
+
+def _stream_benchmarks(build_script, stream):
+    """Return (name, function) pairs each rendering ``JOBS`` jobs to a
+    stream.
+    """
+    def scripts_as_strings():
+        for _ in range(JOBS):
+            stream.write(build_script(FLAGS, COMMAND, 'bash'))
+
+    def scripts_rendered():
+        for _ in range(JOBS):
+            build_script.render_to(stream, FLAGS, COMMAND, 'bash')
+
+    def commands_as_strings():
+        for _ in range(JOBS):
+            stream.write(build_command(FLAGS, COMMAND) + '\n')
+
+    def commands_rendered():
+        for _ in range(JOBS):
+            render_command_to(stream, FLAGS, COMMAND)
+            stream.write('\n')
+
+    return [
+        ('scripts as strings', scripts_as_strings),
+        ('scripts rendered to stream', scripts_rendered),
+        ('commands as strings', commands_as_strings),
+        ('commands rendered to stream', commands_rendered),
+    ]
+
+
+def _write_script_files(build_script, directory, count):
+    # One file per script, as `ibsub batch' writes them.
+    for number in range(count):
+        path = os.path.join(directory, '{0}.lsf'.format(number))
+        with open(path, 'w') as script_file:
+            build_script.render_to(script_file, FLAGS, COMMAND, 'bash')
+
+
+def main():
+    build_script = BuildScript(datetime.today)
+    with open(os.devnull, 'w') as devnull:
+        for name, function in _stream_benchmarks(build_script, devnull):
+            _report(name, _per_second(function, JOBS))
+
+    directory = tempfile.mkdtemp()
+    try:
+        _report('script files', _per_second(
+            lambda: _write_script_files(build_script, directory, JOBS // 10),
+            JOBS // 10))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare import and process-tree walking time of the /proc reader in
+:mod:`lsf_ibutils.ibsub.procfs` against psutil.
+"""
+
+from __future__ import print_function
+
+import subprocess
+import sys
+import timeit
+
+from lsf_ibutils.ibsub import shell
+
+RUNS = 200
+
+IMPORT_CODE = '''
+import time
+start = time.time()
+import {0}
+print(time.time() - start)
+'''
+
+
+def import_seconds(module):
+    """Return how long importing a module takes in a fresh interpreter.
+
+    :param module: module name
+    :type module: :class:`str`
+    :rtype: :class:`float`
+    """
+    out = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_CODE.format(module)])
+    return float(out)
+
+
+def main():
+    paths = [
+        ('procfs', 'lsf_ibutils.ibsub.procfs',
+         lambda: list(shell.procfs.ancestors(shell.MAX_DEPTH))),
+        ('psutil', 'psutil',
+         lambda: list(shell._psutil_ancestors(shell.MAX_DEPTH))),
+    ]
+    for name, module, walk in paths:
+        try:
+            imported = min(import_seconds(module) for _ in range(3))
+        except subprocess.CalledProcessError:
+            print('{0}: not available'.format(name))
+            continue
+        walked = min(timeit.repeat(walk, number=RUNS, repeat=3)) / RUNS
+        print('{0}: import {1:6.2f} ms, walk {2:6.3f} ms ({3} ancestors)'
+              .format(name, imported * 1000, walked * 1000, len(walk())))
+
+
+if __name__ == '__main__':
+    main()
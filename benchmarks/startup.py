@@ -0,0 +1,89 @@
+"""Measure how long `ibsub' takes to start, using ``python -X importtime``
+(Python 3.7 and later).
+"""
+
+from __future__ import print_function
+
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pinject', 'psutil', 'readline']
+"""Modules which are slow to import and must stay off the startup path."""
+
+STARTUP_BUDGET_US = 150000
+"""Most microseconds ``ibsub --version`` may spend importing
+:mod:`lsf_ibutils.ibsub.main`. Wall clock times vary with the load of the
+machine, so this is checked here rather than in the tests.
+"""
+
+STARTUP_CODE = ('from lsf_ibutils.ibsub.main import main; '
+                'main(["ibsub"] + {0!r})')
+
+
+def import_times(args):
+    """Run ``ibsub`` with arguments in a fresh interpreter and return how long
+    each module took to import.
+
+    :param args: arguments to pass to ``ibsub``
+    :type args: :class:`list` of :class:`str`
+    :return: map of module name to cumulative import time in microseconds
+    :rtype: :class:`dict`
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c',
+         STARTUP_CODE.format(args)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = proc.communicate()
+    return parse_import_times(err.decode('utf-8', 'replace').splitlines())
+
+
+def parse_import_times(lines):
+    """Parse the report printed by ``-X importtime``, whose lines look like::
+
+        import time: self [us] | cumulative | imported package
+        import time:       120 |        340 |   lsf_ibutils.ibsub.output
+
+    :param lines: lines of standard error
+    :type lines: iterable of :class:`str`
+    :return: map of module name to cumulative import time in microseconds
+    :rtype: :class:`dict`
+    """
+    times = {}
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except (IndexError, ValueError):
+            # The header line.
+            continue
+        times[fields[2].strip()] = cumulative
+    return times
+
+
+def main():
+    retcode = 0
+    for args in [['--version'], ['--help'], ['-t', 'command', '--help']]:
+        times = import_times(args)
+        total = sum(times[name] for name in times if '.' not in name)
+        print('ibsub {0}: {1:.1f} ms importing {2} modules'.format(
+            ' '.join(args), total / 1000.0, len(times)))
+        slowest = sorted(times, key=times.get, reverse=True)[:5]
+        for name in slowest:
+            print('    {0:8.1f} ms  {1}'.format(times[name] / 1000.0, name))
+        heavy = [name for name in HEAVY_MODULES if name in times]
+        if heavy:
+            print('    heavy modules imported: {0}'.format(', '.join(heavy)))
+        if args == ['--version']:
+            main_time = times.get('lsf_ibutils.ibsub.main', 0)
+            if main_time >= STARTUP_BUDGET_US:
+                print('    over budget: {0:.1f} ms importing '
+                      'lsf_ibutils.ibsub.main, budget {1:.1f} ms'.format(
+                          main_time / 1000.0, STARTUP_BUDGET_US / 1000.0))
+                retcode = 1
+    return retcode
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
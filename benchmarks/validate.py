@@ -0,0 +1,51 @@
+"""Compare validating a column of batch answers one answer at a time against
+the column validators in :mod:`lsf_ibutils.ibsub.validate`.
+"""
+
+from __future__ import print_function
+
+import random
+import timeit
+
+from lsf_ibutils.ibsub import validate
+
+ROWS = 200000
+
+
+def _columns():
+    rng = random.Random(0)
+    return [
+        ('positive_integer', validate.positive_integer,
+         validate.positive_integer_column,
+         [str(rng.randint(1, 512)) for _ in range(ROWS)]),
+        ('time_duration', validate.time_duration,
+         validate.time_duration_column,
+         ['{0}:{1:02d}'.format(rng.randint(0, 12), rng.randint(0, 59))
+          for _ in range(ROWS)]),
+        ('yes_no', validate.yes_no, validate.yes_no_column,
+         [rng.choice('yn') for _ in range(ROWS)]),
+    ]
+
+
+def main():
+    for name, validator, column_validator, texts in _columns():
+        for invalid_every in [None, 1000]:
+            if invalid_every is not None:
+                texts = list(texts)
+                for index in range(0, ROWS, invalid_every):
+                    texts[index] = 'x'
+            per_answer = min(timeit.repeat(
+                lambda: [validator(text) for text in texts],
+                number=1, repeat=3))
+            per_column = min(timeit.repeat(
+                lambda: column_validator(texts), number=1, repeat=3))
+            print('{0:>16} {1:>11}: {2:6.2f}M answers/s one at a time, '
+                  '{3:6.2f}M answers/s by column'.format(
+                      name,
+                      'all valid' if invalid_every is None
+                      else '0.1% invalid',
+                      ROWS / per_answer / 1e6, ROWS / per_column / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Measure one poll of :class:`~lsf_ibutils.ibsub.watch.JobWatcher` over
+100,000 tracked jobs, among other jobs of the user, and the memory it keeps
+between polls. `bjobs' is replaced by a function yielding its output, so
+only the parsing and diffing are measured. For comparison, the old shell loop
+ran one `bjobs' process per job per refresh.
+"""
+
+from __future__ import print_function
+
+import time
+import tracemalloc
+
+from lsf_ibutils.ibsub.watch import JobWatcher
+
+TRACKED = 100000
+UNTRACKED = 50000
+# Fraction of tracked jobs changing state between polls.
+CHANGING = 0.05
+
+
+def _bjobs_lines(tick):
+    changing = int(TRACKED * CHANGING)
+    for number in range(TRACKED + UNTRACKED):
+        state = 'RUN' if number < changing * tick else 'PEND'
+        yield '{0};0;{1};-'.format(1000000 + number, state)
+
+
+def _poll(watcher, tick):
+    def stream_lines(args, timeout=None):
+        return _bjobs_lines(tick)
+    watcher._stream_lines = stream_lines
+    return watcher.poll()
+
+
+def main():
+    job_ids = [str(1000000 + number) for number in range(TRACKED)]
+    watcher = JobWatcher(job_ids)
+    for tick in range(4):
+        start = time.time()
+        transitions = _poll(watcher, tick)
+        print('poll {0}: {1:7.1f} ms, {2:6d} changes'.format(
+            tick, (time.time() - start) * 1e3, len(transitions)))
+
+    # Tracing slows everything down, so measure memory separately.
+    tracemalloc.start()
+    watcher = JobWatcher(job_ids)
+    for tick in range(4):
+        _poll(watcher, tick)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('memory kept: {0:.1f} MB, peak: {1:.1f} MB'.format(
+        current / 1e6, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
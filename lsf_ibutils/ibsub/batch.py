@@ -0,0 +1,501 @@
+""":mod:`lsf_ibutils.ibsub.batch` -- Output from parameter files
+"""
+
+import collections
+import csv
+import itertools
+import json
+import multiprocessing
+import numbers
+import os
+import posixpath
+
+import pinject
+
+from lsf_ibutils.ibsub import submit
+from lsf_ibutils.ibsub import validate
+# Import prompts module for the sake of pinject being able to find it.
+from lsf_ibutils.ibsub import prompts  # NOQA
+
+# Text in parameter files; unicode on Python 2.
+_TEXT_TYPES = (str, type(u''))
+
+COMMAND_FIELD = 'Command'
+"""Name of the column holding the command to run. All other columns are named
+after the :class:`~lsf_ibutils.ibsub.prompts.Prompt` subclass they answer,
+e.g., ``JobName`` or ``QueueName``.
+"""
+
+FORMATS = [
+    'csv',
+    'jsonl',
+]
+"""Supported parameter file formats."""
+
+
+SHARD_SIZE = 1000
+"""Number of rows per shard when rendering scripts in shards. Each shard's
+scripts are written to their own directory.
+"""
+
+MANIFEST_FILE_NAME = 'manifest.jsonl'
+"""Name of the file listing the scripts rendered in shards."""
+
+
+class BatchError(Exception):
+    """Raised when a parameter file cannot be processed at all."""
+    pass
+
+
+class AnswerError(Exception):
+    """Raised when an answer in a parameter file is missing or invalid."""
+    pass
+
+
+def detect_format(file_name):
+    """Guess the format of a parameter file from its extension.
+
+    :param file_name: name of the parameter file
+    :type file_name: :class:`str`
+    :return: one of :data:`FORMATS`
+    :rtype: :class:`str`
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(input_file, format_):
+    """Lazily read answer rows from a parameter file. Rows are yielded one at
+    a time so that files of any size are read in constant memory.
+
+    :param input_file: open parameter file
+    :type input_file: :class:`file`
+    :param format_: one of :data:`FORMATS`
+    :type format_: :class:`str`
+    :return: iterator of dictionaries mapping column name to answer text
+    :rtype: iterator of :class:`dict`
+    """
+    if format_ == 'csv':
+        return csv.DictReader(input_file)
+    if format_ == 'jsonl':
+        return _read_jsonl_rows(input_file)
+    raise BatchError('invalid parameter file format {0}, valid formats are '
+                     '{1}'.format(repr(format_),
+                                  ', '.join([repr(f) for f in FORMATS])))
+
+
+def _read_jsonl_rows(input_file):
+    for line_number, line in enumerate(input_file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise BatchError('line {0}: invalid JSON: {1}'.format(
+                line_number, error))
+        if not isinstance(row, dict):
+            raise BatchError('line {0}: expected a JSON object'.format(
+                line_number))
+        yield row
+
+
+class AnswerPrompt(object):
+    """Stand-in for :class:`~lsf_ibutils.ibsub.input.SimplePrompt` which
+    answers each prompt from a row of a parameter file instead of asking the
+    user. Instead of prompting again on invalid input, it raises
+    :class:`AnswerError`.
+    """
+    def __init__(self):
+        self.field = None
+        self.answer = None
+        # Whether the answer was already found valid by a column validator.
+        self.checked = False
+        # The validator each field was last checked with.
+        self.validators = {}
+
+    def __call__(self, message, required=False, format_=None, validator=None,
+                 default=None, completions=[], fuzzy=False):
+        text = self.answer
+        if text is None or text == '':
+            if default is not None:
+                return default
+            elif not required:
+                return None
+            raise AnswerError('{0}: a value is required'.format(self.field))
+        if validator is None:
+            return text
+        self.validators[self.field] = validator
+        if not self.checked and not validator(text):
+            expected = '' if format_ is None else ', expected {0}'.format(
+                format_)
+            raise AnswerError('{0}: invalid value {1}{2}'.format(
+                self.field, repr(text), expected))
+        return text
+
+
+class BatchBindingSpec(pinject.BindingSpec):
+    """Answer prompts from parameter file rows instead of from the user."""
+    def configure(self, bind):
+        bind('answer_prompt', to_instance=AnswerPrompt())
+
+    def provide_simple_prompt(self, answer_prompt):
+        return answer_prompt
+
+
+class ExecRow(object):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, prompt_pipeline, prompt_command, answer_prompt):
+        self._prompts = [
+            (prompt_class.__name__, prompt_class, prompt)
+            for prompt_class, prompt in prompt_pipeline]
+
+    @property
+    def field_names(self):
+        """Column names understood by this object, in prompt order.
+
+        :rtype: :class:`list` of :class:`str`
+        """
+        return [name for name, _, _ in self._prompts] + [COMMAND_FIELD]
+
+    def __call__(self, row, checked_fields=frozenset()):
+        """Answer all prompts from a row.
+
+        :param row: mapping of column name to answer text
+        :type row: :class:`dict`
+        :param checked_fields: columns whose answers in this row were already \
+        found valid, e.g., by :meth:`exec_rows`
+        :type checked_fields: :class:`set` of :class:`str`
+        :return: tuple of (flags, command, errors); if errors is non-empty, \
+        flags and command should not be used
+        :rtype: :class:`tuple` of (:class:`list`, :class:`str`, \
+        :class:`list` of :class:`str`)
+        """
+        unknown = sorted(set(row) - set(self.field_names))
+        errors = ['{0}: unknown column'.format(name) for name in unknown
+                  if name is not None]
+        values = {}
+        flags_list = []
+        for name, prompt_class, prompt in self._prompts:
+            try:
+                self._set_answer(name, row.get(name), name in checked_fields)
+                value, flags = prompt(values)
+            except AnswerError as error:
+                errors.append(str(error))
+                continue
+            except prompts.PromptError as error:
+                errors.append('{0}: {1}'.format(name, error))
+                continue
+            if value is None:
+                continue
+            values[prompt_class] = value
+            flags_list.append(flags)
+        try:
+            self._set_answer(COMMAND_FIELD, row.get(COMMAND_FIELD), False)
+            command = self._prompt_command()
+        except AnswerError as error:
+            errors.append(str(error))
+            command = None
+        return flags_list, command, errors
+
+    def exec_rows(self, rows):
+        """Answer all prompts from each of many rows, with the same results
+        as calling this object on each row.
+
+        Rows are taken a chunk at a time, and columns answering prompts whose
+        validators have column-wise counterparts in
+        :data:`~lsf_ibutils.ibsub.validate.COLUMN_VALIDATORS` are checked for
+        the whole chunk at once. Only answers which fail are checked again as
+        each row is answered, to report them.
+
+        :param rows: mappings of column name to answer text
+        :type rows: iterable of :class:`dict`
+        :return: iterator of (flags, command, errors) tuples, one per row
+        :rtype: iterator of :class:`tuple`
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, validate.COLUMN_CHUNK_SIZE))
+            if not chunk:
+                return
+            for row, checked_fields in zip(chunk, self._check_columns(chunk)):
+                yield self(row, checked_fields)
+
+    def _check_columns(self, rows):
+        # Validators are learned from the prompts as they answer rows, so the
+        # first chunk is checked row by row.
+        checked = [set() for _ in rows]
+        for field, validator in self._answer_prompt.validators.items():
+            column_validator = validate.COLUMN_VALIDATORS.get(validator)
+            if column_validator is None:
+                continue
+            indices = []
+            texts = []
+            for index, row in enumerate(rows):
+                try:
+                    text = _answer_text(field, row.get(field))
+                except AnswerError:
+                    continue
+                if text:
+                    indices.append(index)
+                    texts.append(text)
+            mask, _ = column_validator(texts)
+            for index, valid in zip(indices, mask):
+                if valid:
+                    checked[index].add(field)
+        return checked
+
+    def _set_answer(self, field, answer, checked):
+        self._answer_prompt.field = field
+        self._answer_prompt.answer = None
+        self._answer_prompt.checked = checked
+        self._answer_prompt.answer = _answer_text(field, answer)
+
+
+def _answer_text(field, answer):
+    """Convert an answer from a parameter file row to text."""
+    if isinstance(answer, bool):
+        # JSON true and false answer yes or no questions.
+        return 'y' if answer else 'n'
+    if isinstance(answer, numbers.Number):
+        return str(answer)
+    if answer is not None and not isinstance(answer, _TEXT_TYPES):
+        raise AnswerError(
+            '{0}: expected text, a number or a boolean, got {1}'.format(
+                field, json.dumps(answer)))
+    return answer
+
+
+def script_file_name(row_number):
+    """Return the deterministic file name for the script generated from a row.
+
+    :param row_number: one-based number of the row in the parameter file
+    :type row_number: :class:`int`
+    :rtype: :class:`str`
+    """
+    return 'job-{0:08d}.lsf'.format(row_number)
+
+
+def shard_directory_name(shard_index):
+    """Return the deterministic name of the directory holding the scripts of
+    a shard. Rows are assigned to shards by row number, so the layout doesn't
+    depend on the number of processes.
+
+    :param shard_index: zero-based index of the shard
+    :type shard_index: :class:`int`
+    :rtype: :class:`str`
+    """
+    return 'shard-{0:05d}'.format(shard_index)
+
+
+def _shards(rows, shard_size):
+    numbered_rows = enumerate(rows, 1)
+    for shard_index in itertools.count():
+        shard = list(itertools.islice(numbered_rows, shard_size))
+        if not shard:
+            return
+        yield shard_index, shard
+
+
+# The RunBatch and arguments used by worker processes, set by _init_worker.
+_worker_args = None
+
+
+def _init_worker(run_batch, syntax, output_directory):
+    global _worker_args
+    _worker_args = (run_batch, syntax, output_directory)
+
+
+def _render_shard_in_worker(shard_index, numbered_rows):
+    run_batch, syntax, output_directory = _worker_args
+    return run_batch.render_shard(
+        shard_index, numbered_rows, syntax, output_directory)
+
+
+def _imap_bounded(pool, function, arg_tuples, window):
+    # Like Pool.imap, except that at most `window' tasks are queued at once.
+    # Pool.imap reads its whole input up front, which for a huge parameter
+    # file would hold every row in memory.
+    pending = collections.deque()
+    for args in arg_tuples:
+        pending.append(pool.apply_async(function, args))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+class RunBatch(object):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, exec_row, build_script, build_command,
+                 render_command_to):
+        pass
+
+    def __call__(self, rows, output_type, syntax, out_stream, err_stream,
+                 output_directory=None, submitter=None, jobs=None,
+                 archive=None):
+        """Render output for every row. Rows which fail validation are
+        reported on ``err_stream`` and skipped; they don't stop the run.
+
+        Commands are written to ``out_stream``, one per line. Scripts are
+        written to ``output_directory``, one file per row, or added to
+        ``archive`` if it is given. If a submitter is
+        given, commands are submitted instead and a manifest of the results
+        is written to ``out_stream``.
+
+        If ``jobs`` is given, scripts are instead rendered in shards of
+        :data:`SHARD_SIZE` rows using that many processes. See
+        :meth:`render_shards`.
+
+        :param submitter: submitter for ``--submit`` mode
+        :type submitter: :class:`~lsf_ibutils.ibsub.submit.Submitter`
+        :param jobs: number of processes rendering scripts
+        :type jobs: :class:`int`
+        :param archive: writer for the archive holding all scripts
+        :type archive: :class:`~lsf_ibutils.ibsub.pack.PackWriter` or \
+        :class:`~lsf_ibutils.ibsub.pack.TarWriter`
+        :return: tuple of (number of rows rendered or submitted, number of \
+        rows failed)
+        :rtype: :class:`tuple` of (:class:`int`, :class:`int`)
+        """
+        if jobs is not None and output_type == 'script' and submitter is None:
+            return self.render_shards(
+                rows, syntax, err_stream, output_directory, jobs)
+        invalid = [0]
+        valid_rows = self._valid_rows(rows, err_stream, invalid)
+        if submitter is not None:
+            submissions = (
+                (row_number, self._build_command(flags, command))
+                for row_number, flags, command in valid_rows)
+            succeeded, failed = submit.write_manifest(
+                submitter.submit_all(submissions), out_stream)
+            return succeeded, failed + invalid[0]
+
+        succeeded = 0
+        for row_number, flags, command in valid_rows:
+            succeeded += 1
+            if archive is not None:
+                archive.add(
+                    script_file_name(row_number), row_number,
+                    self._build_script(flags, command, syntax))
+            elif output_type == 'script':
+                path = os.path.join(
+                    output_directory, script_file_name(row_number))
+                with open(path, 'w') as script_file:
+                    self._build_script.render_to(
+                        script_file, flags, command, syntax)
+            else:
+                self._render_command_to(out_stream, flags, command)
+                out_stream.write('\n')
+        return succeeded, invalid[0]
+
+    def render_shards(self, rows, syntax, err_stream, output_directory, jobs):
+        """Render a script for every row, splitting the rows into shards of
+        :data:`SHARD_SIZE` which are rendered by a pool of ``jobs``
+        processes. Each shard's scripts are written to their own directory,
+        named by :func:`shard_directory_name`. Once all shards are done, a
+        manifest named :data:`MANIFEST_FILE_NAME` is written to
+        ``output_directory``, with one JSON line per script, in row order,
+        giving its row number and path relative to ``output_directory``.
+
+        Rows which fail validation are reported on ``err_stream`` in row
+        order, as by :meth:`__call__`.
+
+        :param jobs: number of processes, or 1 to render in this process
+        :type jobs: :class:`int`
+        :return: tuple of (number of rows rendered, number of rows failed)
+        :rtype: :class:`tuple` of (:class:`int`, :class:`int`)
+        """
+        shards = _shards(rows, SHARD_SIZE)
+        pool = None
+        if jobs == 1:
+            results = (
+                self.render_shard(
+                    shard_index, numbered_rows, syntax, output_directory)
+                for shard_index, numbered_rows in shards)
+        else:
+            # Workers inherit this object by forking, so nothing but rows and
+            # results needs to be pickled. LSF only runs on Unix, where fork
+            # is available.
+            pool = _fork_context().Pool(
+                jobs, initializer=_init_worker,
+                initargs=(self, syntax, output_directory))
+            results = _imap_bounded(
+                pool, _render_shard_in_worker, shards, 2 * jobs)
+
+        succeeded = failed = 0
+        manifest_path = os.path.join(output_directory, MANIFEST_FILE_NAME)
+        try:
+            with open(manifest_path, 'w') as manifest:
+                for scripts, errors, invalid in results:
+                    for error in errors:
+                        err_stream.write(error)
+                    failed += invalid
+                    for row_number, path in scripts:
+                        manifest.write(json.dumps(
+                            {'row': row_number, 'script': path},
+                            sort_keys=True) + '\n')
+                    succeeded += len(scripts)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return succeeded, failed
+
+    def render_shard(self, shard_index, numbered_rows, syntax,
+                     output_directory):
+        """Render the scripts for one shard of rows into the shard's
+        directory.
+
+        :param shard_index: zero-based index of the shard
+        :type shard_index: :class:`int`
+        :param numbered_rows: list of (row number, row) tuples
+        :type numbered_rows: :class:`list` of :class:`tuple`
+        :return: tuple of (list of (row number, script path relative to \
+        ``output_directory``) tuples, list of error lines, number of rows \
+        failed)
+        :rtype: :class:`tuple` of (:class:`list`, :class:`list`, \
+        :class:`int`)
+        """
+        directory_name = shard_directory_name(shard_index)
+        directory = os.path.join(output_directory, directory_name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        scripts = []
+        errors = []
+        invalid = 0
+        results = self._exec_row.exec_rows(row for _, row in numbered_rows)
+        for (row_number, _), (flags, command, row_errors) in zip(
+                numbered_rows, results):
+            if row_errors:
+                invalid += 1
+                errors += ['row {0}: {1}\n'.format(row_number, error)
+                           for error in row_errors]
+                continue
+            file_name = script_file_name(row_number)
+            with open(os.path.join(directory, file_name), 'w') as script_file:
+                self._build_script.render_to(
+                    script_file, flags, command, syntax)
+            scripts.append(
+                (row_number, posixpath.join(directory_name, file_name)))
+        return scripts, errors, invalid
+
+    def _valid_rows(self, rows, err_stream, invalid):
+        results = self._exec_row.exec_rows(rows)
+        for row_number, (flags, command, errors) in enumerate(results, 1):
+            if errors:
+                invalid[0] += 1
+                for error in errors:
+                    err_stream.write('row {0}: {1}\n'.format(
+                        row_number, error))
+                continue
+            yield row_number, flags, command
+
+
+def _fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2, which always forks on Unix.
+        return multiprocessing
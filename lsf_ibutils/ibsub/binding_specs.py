@@ -5,24 +5,52 @@ from datetime import datetime
 
 from pinject import BindingSpec
 
-from lsf_ibutils.ibsub.prompts import Prompt
+from lsf_ibutils.ibsub.cache import DiskCache
+from lsf_ibutils.ibsub.prompts import Prompt, PromptPipeline
 from lsf_ibutils.ibsub.input import prompt_for_line, set_completions
-from lsf_ibutils.ibsub.output import build_command
-from lsf_ibutils.ibsub import validate
+from lsf_ibutils.ibsub.output import build_command, render_command_to
+from lsf_ibutils.ibsub import queues, validate
 
 
 class IbsubBindingSpec(BindingSpec):
-    def provide_today_datetime(self):
-        return datetime.today()
+    def provide_get_today_datetime(self):
+        # A function rather than a value, so that a long-running server
+        # stamps each script with the time it was generated.
+        return datetime.today
 
     def provide_prompt_class_list(self):
         return Prompt.__subclasses__()
 
+    def provide_prompt_pipeline(
+            self, prompt_class_list, simple_prompt, get_group_completions,
+            get_queue_completions, get_queue_limits, get_queue_loads,
+            get_queue_topology, validate_positive_integer,
+            validate_queue_limits, validate_time_duration, validate_yes_no):
+        # Resolve the prompts' dependencies once through pinject, then build
+        # the prompts directly.
+        return PromptPipeline.compile(prompt_class_list, {
+            'simple_prompt': simple_prompt,
+            'get_group_completions': get_group_completions,
+            'get_queue_completions': get_queue_completions,
+            'get_queue_limits': get_queue_limits,
+            'get_queue_loads': get_queue_loads,
+            'get_queue_topology': get_queue_topology,
+            'validate_positive_integer': validate_positive_integer,
+            'validate_queue_limits': validate_queue_limits,
+            'validate_time_duration': validate_time_duration,
+            'validate_yes_no': validate_yes_no,
+        })
+
+    def provide_completion_cache(self):
+        return DiskCache()
+
     def configure(self, bind):
         bind('prompt_for_line', to_instance=prompt_for_line)
         bind('set_completions', to_instance=set_completions)
         bind('build_command', to_instance=build_command)
+        bind('render_command_to', to_instance=render_command_to)
         bind('validate_positive_integer',
              to_instance=validate.positive_integer)
+        bind('validate_queue_limits', to_instance=queues.validate_answers)
         bind('validate_time_duration', to_instance=validate.time_duration)
         bind('validate_yes_no', to_instance=validate.yes_no)
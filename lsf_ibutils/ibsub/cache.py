@@ -0,0 +1,222 @@
+""":mod:`lsf_ibutils.ibsub.cache` -- Persistent on-disk cache
+"""
+
+import errno
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+DEFAULT_TTL = 60 * 60
+"""Default number of seconds for which a cache entry is considered fresh."""
+
+REFRESH_WAIT = 0.25
+"""Number of seconds to wait for background refreshes before exiting. Quick
+refreshes still finish in short runs; slow ones are abandoned, and since
+their entries stay stale, the next run starts them again.
+"""
+
+_UNSAFE_KEY_CHARS_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def default_directory():
+    """Return the per-user cache directory, following the XDG base directory
+    specification.
+
+    :return: path to the cache directory
+    :rtype: :class:`str`
+    """
+    base = os.getenv('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'lsf-ibutils')
+
+
+class CacheStats(object):
+    """Counters describing how a :class:`DiskCache` has been used."""
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_seconds = 0.0
+
+    def __str__(self):
+        return ('hits={0} stale_hits={1} misses={2} refreshes={3} '
+                'refresh_seconds={4:.3f}'.format(
+                    self.hits, self.stale_hits, self.misses,
+                    self.refreshes, self.refresh_seconds))
+
+
+class DiskCache(object):
+    """Cache of JSON-serializable values stored one file per key.
+
+    Fresh entries are returned directly. Stale entries are also returned
+    immediately, but a refresh is started in a background thread so the next
+    lookup sees new data (stale-while-revalidate). Missing entries are
+    computed synchronously. Files are written atomically so that concurrent
+    ``ibsub`` processes never read a partially written entry.
+    """
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, clock=time.time):
+        if directory is None:
+            directory = default_directory()
+        self.directory = directory
+        self.ttl = ttl
+        self.enabled = True
+        self.force_refresh = False
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refresh_threads = {}
+
+    def configure(self, enabled=None, force_refresh=None, ttl=None):
+        """Change the behavior of the cache after construction, e.g., from
+        command-line arguments. Arguments which are ``None`` are unchanged.
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if force_refresh is not None:
+            self.force_refresh = force_refresh
+        if ttl is not None:
+            self.ttl = ttl
+
+    def get(self, key, compute):
+        """Retrieve the value for a key, computing it if necessary.
+
+        :param key: name of the entry
+        :type key: :class:`str`
+        :param compute: zero-argument function producing the value, or \
+        ``None`` if the value could not be computed (which is not cached)
+        :type compute: :class:`function`
+        :return: the cached or computed value
+        """
+        if not self.enabled:
+            self._count('misses')
+            return compute()
+
+        entry = None if self.force_refresh else self._load(key)
+        if entry is None:
+            self._count('misses')
+            return self._refresh(key, compute)
+
+        created, value = entry
+        if self._clock() - created < self.ttl:
+            self._count('hits')
+        else:
+            self._count('stale_hits')
+            self._refresh_in_background(key, compute)
+        return value
+
+    def refresh(self, key, compute):
+        """Compute the value for a key and store it, whether or not the
+        cached entry is fresh.
+
+        :param key: name of the entry
+        :type key: :class:`str`
+        :param compute: as for :meth:`get`
+        :type compute: :class:`function`
+        :return: the computed value
+        """
+        self._count('misses')
+        if not self.enabled:
+            return compute()
+        return self._refresh(key, compute)
+
+    def wait(self, timeout=None):
+        """Wait for all background refreshes to finish.
+
+        :param timeout: maximum number of seconds to wait in total, or \
+        ``None`` to wait as long as it takes
+        :type timeout: :class:`float`
+        :return: whether all refreshes finished
+        :rtype: :class:`bool`
+        """
+        with self._lock:
+            threads = list(self._refresh_threads.values())
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in threads:
+            if deadline is None:
+                thread.join()
+            else:
+                thread.join(max(0, deadline - time.time()))
+        return not any(thread.is_alive() for thread in threads)
+
+    def path(self, key):
+        """Return the file path in which the entry for ``key`` is stored.
+
+        :param key: name of the entry
+        :type key: :class:`str`
+        :rtype: :class:`str`
+        """
+        return os.path.join(
+            self.directory, _UNSAFE_KEY_CHARS_RE.sub('_', key) + '.json')
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self.stats, counter,
+                    getattr(self.stats, counter) + amount)
+
+    def _load(self, key):
+        try:
+            with open(self.path(key)) as cache_file:
+                entry = json.load(cache_file)
+            return entry['created'], entry['value']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            # Missing or corrupt entries are treated the same way: as a miss.
+            return None
+
+    def _store(self, key, value):
+        try:
+            os.makedirs(self.directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                return
+        # Write to a temporary file in the same directory, then rename it into
+        # place. The rename is atomic on POSIX file systems.
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=self.directory, prefix='.tmp-', suffix='.json')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                json.dump({'created': self._clock(), 'value': value},
+                          temp_file)
+            os.rename(temp_path, self.path(key))
+        except (IOError, OSError):
+            # The cache is only an optimization; failing to write it is fine.
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _refresh(self, key, compute):
+        start = time.time()
+        value = compute()
+        elapsed = time.time() - start
+        with self._lock:
+            self.stats.refreshes += 1
+            self.stats.refresh_seconds += elapsed
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    def _refresh_in_background(self, key, compute):
+        def run():
+            try:
+                self._refresh(key, compute)
+            finally:
+                with self._lock:
+                    del self._refresh_threads[key]
+
+        with self._lock:
+            if key in self._refresh_threads:
+                # A refresh of this entry is already in progress.
+                return
+            thread = threading.Thread(target=run)
+            # Don't keep the program alive just to refresh the cache.
+            thread.daemon = True
+            self._refresh_threads[key] = thread
+        thread.start()
@@ -0,0 +1,68 @@
+""":mod:`lsf_ibutils.ibsub.client` -- Talking to `ibsub serve'
+
+Requests and responses are single lines of JSON. A request looks like::
+
+    {"answers": {"JobName": "wrf", "QueueName": "regular",
+                 "Command": "mpirun.lsf ./wrf.exe"},
+     "type": "script", "syntax": "bash"}
+
+where ``answers`` uses the same column names as ``ibsub batch``. The
+response is either ``{"output": "..."}`` or ``{"errors": ["...", ...]}``.
+
+This module deliberately imports nothing heavy, so that a client which finds
+the server running starts as quickly as possible.
+"""
+
+import json
+import os
+import socket
+
+from lsf_ibutils.ibsub import cache
+
+DEFAULT_TIMEOUT = 10
+"""Seconds to wait for the server to answer a request."""
+
+
+class ServerUnavailable(Exception):
+    """Raised when the server isn't running or doesn't answer."""
+    pass
+
+
+def default_socket_path():
+    """Return the path of the server's socket, in the cache directory.
+
+    :rtype: :class:`str`
+    """
+    return os.path.join(cache.default_directory(), 'ibsub.sock')
+
+
+def send(request, socket_path=None, timeout=DEFAULT_TIMEOUT):
+    """Send one request to the server and return its response.
+
+    :param request: the request
+    :type request: :class:`dict`
+    :param socket_path: path of the server's socket (default: \
+    :func:`default_socket_path`)
+    :type socket_path: :class:`str`
+    :param timeout: seconds to wait for the response
+    :type timeout: :class:`float`
+    :return: the response
+    :rtype: :class:`dict`
+    :raises ServerUnavailable: if the server can't be reached or doesn't \
+    answer in time
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        line = sock.makefile('rb').readline()
+    except socket.error as error:
+        raise ServerUnavailable('{0}: {1}'.format(socket_path, error))
+    finally:
+        sock.close()
+    if not line:
+        raise ServerUnavailable('{0}: connection closed'.format(socket_path))
+    return json.loads(line.decode('utf-8'))
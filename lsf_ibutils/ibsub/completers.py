@@ -1,116 +1,399 @@
 """:mod:`lsf_ibutils.ibsub.completers` -- Completion functions for prompts
 """
 
+import collections
 import os
-import subprocess
-from tempfile import TemporaryFile
+import threading
 
+import pinject
 
-class GetQueueCompletions(object):
+# Import runner module for the sake of pinject being able to find it.
+from lsf_ibutils.ibsub import runner  # NOQA
+from lsf_ibutils.ibsub import hosts
+from lsf_ibutils.ibsub.queues import (
+    QueueLimits, QueueLoad, parse_queue_limits)
+
+
+# Guards swapping in the completions computed by a refresh.
+_memo_lock = threading.Lock()
+
+
+class _PrefetchingCompleter(object):
+    """Base for completers which can compute their completions in a background
+    thread before they are needed.
+
+    Subclasses implement :meth:`_compute`, and read what it returned through
+    :meth:`_memoized`.
+    """
+    _prefetch_thread = None
+    _refresh_thread = None
+    _memo = None
+
+    def prefetch(self):
+        """Start computing the completions in a background thread. A later
+        call to the completer waits for the thread if it hasn't finished.
+        """
+        if self._prefetch_thread is not None:
+            return
+        self._prefetch_thread = threading.Thread(target=self)
+        # Don't keep the program alive just to compute completions.
+        self._prefetch_thread.daemon = True
+        self._prefetch_thread.start()
+
+    def refresh(self):
+        """Start computing the completions again in the background. Used by
+        long-running processes such as the server. The old completions are
+        served until the new ones are ready, then replaced all at once.
+
+        LSF is queried again even if the disk cache holds a fresh result,
+        which would otherwise be served until it expired.
+        """
+        self._wait_for_prefetch()
+        thread = self._refresh_thread
+        if thread is not None and thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh)
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+
+    def _refresh(self):
+        memo = self._compute(refresh=True)
+        with _memo_lock:
+            self._memo = memo
+
+    def _memoized(self):
+        self._wait_for_prefetch()
+        memo = self._memo
+        if memo is None:
+            memo = self._compute(refresh=False)
+            with _memo_lock:
+                # A refresh may have finished in the meantime.
+                if self._memo is None:
+                    self._memo = memo
+                memo = self._memo
+        return memo
+
+    def _compute(self, refresh):
+        """Query LSF for the completions.
+
+        :param refresh: whether to bypass fresh disk cache entries
+        :type refresh: :class:`bool`
+        :return: the completions, in whatever form the subclass reads
+        """
+        raise NotImplementedError()
+
+    def _query(self, args, parse, refresh):
+        return self._command_runner.query(args, parse, refresh=refresh)
+
+    def _wait_for_prefetch(self):
+        thread = self._prefetch_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+
+def parse_queue_names(lines):
+    """Parse queue names from the output of `bqueues'.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :rtype: :class:`list` of :class:`str`
+    """
+    # Strip off the first line, which is a header.
+    next(lines, None)
+    queues = []
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) > 0:
+            queues.append(tokens[0])
+    return queues
+
+
+def _count(row, column):
+    try:
+        return int(row.get(column, 0))
+    except ValueError:
+        return 0
+
+
+def parse_queue_table(lines):
+    """Parse the name, status and job counts of each queue from the output
+    of `bqueues'.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :return: list of [name, status, jobs, pending, running, suspended] lists, \
+    in order
+    :rtype: :class:`list` of :class:`list`
+    """
+    header = next(lines, '').split()
+    table = []
+    for line in lines:
+        row = dict(zip(header, line.split()))
+        if 'QUEUE_NAME' not in row:
+            continue
+        # Older versions split suspended jobs by who suspended them.
+        suspended = _count(row, 'SUSP') + _count(row, 'SSUSP') + _count(
+            row, 'USUSP')
+        table.append([
+            row['QUEUE_NAME'], row.get('STATUS', ''), _count(row, 'NJOBS'),
+            _count(row, 'PEND'), _count(row, 'RUN'), suspended])
+    return table
+
+
+class _GroupMembership(object):
+    """Groups containing each user and each subgroup directly, read from
+    `bugroup' output a line at a time. Groups are numbered in order of
+    appearance, so that sorting numbers sorts groups.
+    """
     def __init__(self):
-        self._queue_cache = None
+        self.names = []
+        self.direct_groups = collections.defaultdict(list)
+        self.parent_groups = {}
+        self._numbers = {}
+
+    def number(self, group):
+        result = self._numbers.get(group)
+        if result is None:
+            result = self._numbers[group] = len(self.names)
+            self.names.append(group)
+        return result
+
+    def add_line(self, line):
+        tokens = line.split()
+        if len(tokens) == 0:
+            return
+        group = self.number(tokens[0])
+        if '/' not in line:
+            # Most groups have no subgroups.
+            for member in tokens[1:]:
+                self.direct_groups[member].append(group)
+            return
+        for member in tokens[1:]:
+            if member.endswith('/'):
+                self.parent_groups.setdefault(
+                    self.number(member[:-1]), []).append(group)
+            else:
+                self.direct_groups[member].append(group)
+
+
+def parse_group_index(lines):
+    """Parse the output of `bugroup' into an index from each user to the
+    groups containing them, directly or through subgroups. Subgroups are the
+    members ending in a slash, e.g., ``physics/``. Cycles of subgroups are
+    allowed.
+
+    Lines are consumed one at a time, so the output doesn't have to be held
+    in memory. Each user's groups are joined into one string, because a
+    cached index of a few large strings loads much faster than one of many
+    small lists.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :return: mapping of user name to the space-separated names of the \
+    groups containing the user, in the order the groups first appear in the \
+    output
+    :rtype: :class:`dict` of :class:`str` to :class:`str`
+    """
+    # Strip off the first line, which is a header.
+    next(lines, None)
+    membership = _GroupMembership()
+    for line in lines:
+        membership.add_line(line)
+    direct_groups = membership.direct_groups
+    parent_groups = membership.parent_groups
+    group_names = membership.names
+    # `all' means every user, which can't be expanded.
+    direct_groups.pop('all', None)
+
+    enclosing_groups = {}
+
+    def enclosing(group):
+        # Every group containing the group, directly or not.
+        result = enclosing_groups.get(group)
+        if result is None:
+            result = set()
+            stack = [group]
+            while stack:
+                for parent in parent_groups.get(stack.pop(), ()):
+                    if parent not in result:
+                        result.add(parent)
+                        stack.append(parent)
+            enclosing_groups[group] = result
+        return result
+
+    index = {}
+    for user, groups in direct_groups.items():
+        all_groups = set(groups)
+        for group in groups:
+            if group in parent_groups:
+                all_groups.update(enclosing(group))
+        index[user] = ' '.join([group_names[group]
+                                for group in sorted(all_groups)])
+    return index
+
+
+class GetQueueCompletions(_PrefetchingCompleter):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, command_runner):
+        pass
 
     def __call__(self):
-        # XXX TODO Untested
+        queue_names, _ = self._memoized()
+        return queue_names
+
+    def loads(self):
+        """Return the load of each queue, from the same query as the
+        completions. See :class:`GetQueueLoads`.
 
-        # Retrieve memoized queue list, if it exists.
-        if self._queue_cache is not None:
-            return self._queue_cache
+        :return: mapping of queue name to load
+        :rtype: :class:`dict` of :class:`str` to \
+        :class:`~lsf_ibutils.ibsub.queues.QueueLoad`
+        """
+        _, loads = self._memoized()
+        return loads
 
-        bqueues_args = ['bqueues']
+    def _compute(self, refresh):
+        # Wide output keeps long queue names from being truncated.
+        bqueues_args = ['bqueues', '-w']
         current_user = os.getenv('USER')
         if current_user is not None:
             # These arguments will get allowed queues for the current user.
             bqueues_args += ['-u', current_user]
-        queues = []
-        with TemporaryFile() as output_file:
-            try:
-                subprocess.check_call(bqueues_args, stdout=output_file)
-            except (subprocess.CalledProcessError, OSError):
-                # If the bqueues subprocess bombs out on an error, just ignore
-                # it.  The program can be useful even without completions. If
-                # we don't have bqueues our program should not crash.
-                return queues
-
-            # Jump to beginning of file.
-            output_file.seek(0)
-            try:
-                # Strip off the first line, which is a header. If this doesn't
-                # exist, it will raise a StopIteration.
-                next(output_file)
-            except StopIteration:
-                # Raised by the call to next() if there are no lines in the
-                # file.
-                return queues
-            # Grab queue names. Process the file line-by-line instead of
-            # reading the whole file into memory. Should be more
-            # memory-efficient.
-            for line in output_file:
-                tokens = line.split()
-                if len(tokens) > 0:
-                    queues.append(tokens[0])
-
-        # Memoize the completions. We also memoize an empty list of completions
-        # because if it didn't work a second ago, it's not likely to work now.
-        self._queue_cache = queues
-
-        return queues
-
-
-class GetGroupCompletions(object):
-    def __init__(self):
-        self._group_cache = None
+        table = self._query(bqueues_args, parse_queue_table, refresh)
+        if table is None:
+            # If bqueues bombs out on an error, just ignore it. The program
+            # can be useful even without completions.
+            table = []
+
+        # We also memoize an empty list of completions because if it didn't
+        # work a second ago, it's not likely to work now.
+        return ([row[0] for row in table],
+                dict((row[0], QueueLoad(*row)) for row in table))
+
+
+class GetQueueLoads(object):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, get_queue_completions):
+        pass
 
     def __call__(self):
-        # XXX TODO Untested
+        """Return the load of each queue. The loads come from the same
+        `bqueues' query as the queue completions, so they are prefetched and
+        refreshed with them.
+
+        :return: mapping of queue name to load
+        :rtype: :class:`dict` of :class:`str` to \
+        :class:`~lsf_ibutils.ibsub.queues.QueueLoad`
+        """
+        return self._get_queue_completions.loads()
+
+
+class GetQueueLimits(_PrefetchingCompleter):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, command_runner):
+        pass
+
+    def __call__(self):
+        """Return the limits of every queue.
+
+        :return: mapping of queue name to limits
+        :rtype: :class:`dict` of :class:`str` to \
+        :class:`~lsf_ibutils.ibsub.queues.QueueLimits`
+        """
+        return self._memoized()
+
+    def _compute(self, refresh):
+        queues = self._query(['bqueues', '-l'], parse_queue_limits, refresh)
+        if queues is None:
+            # Without limits, answers are only checked by bsub itself.
+            queues = {}
+        return dict(
+            (name, QueueLimits.from_dict(fields))
+            for name, fields in queues.items())
+
 
-        # Retrieve memoized group list, if it exists.
-        if self._group_cache is not None:
-            return self._group_cache
+class GetQueueTopology(_PrefetchingCompleter):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, command_runner, get_queue_limits):
+        pass
 
-        groups_containing_user = []
+    def __call__(self):
+        """Return the hosts of every queue.
+
+        :return: mapping of queue name to topology
+        :rtype: :class:`dict` of :class:`str` to \
+        :class:`~lsf_ibutils.ibsub.hosts.QueueTopology`
+        """
+        return self._memoized()
+
+    def _compute(self, refresh):
+        # Wide output keeps long host and group names from being truncated.
+        # Any of these failing just leaves less to suggest from.
+        host_info = self._query(
+            ['lshosts', '-w'], hosts.parse_lshosts, refresh) or {}
+        host_slots = self._query(
+            ['bhosts', '-w'], hosts.parse_bhosts, refresh) or {}
+        host_groups = self._query(
+            ['bmgroup', '-w'], hosts.parse_host_groups, refresh) or {}
+        queue_hosts = dict(
+            (name, limits.hosts)
+            for name, limits in self._get_queue_limits().items())
+        return hosts.index_topology(
+            host_info, host_slots, host_groups, queue_hosts)
+
+
+class GetGroupCompletions(_PrefetchingCompleter):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, command_runner):
+        pass
+
+    def __call__(self):
         current_user = os.getenv('USER')
         if current_user is None:
             # If we can't detect the current user, just give up. Returning the
             # entire list of groups produced by `bugroup' would be too many
             # group completions.
-            return groups_containing_user
-
-        # Process the file line-by-line instead of reading the whole file into
-        # memory. Should be more memory-efficient.
-        with TemporaryFile() as output_file:
-            try:
-                subprocess.check_call(['bugroup'], stdout=output_file)
-            except (subprocess.CalledProcessError, OSError):
-                # If the bqueues subprocess bombs out on an error, just ignore
-                # it.  The program can be useful even without completions. If
-                # we don't have bqueues our program should not crash.
-                return groups_containing_user
-
-            # Jump to beginning of file.
-            output_file.seek(0)
-
-            try:
-                # Strip off the first line, which is a header. If this doesn't
-                # exist, it will raise a StopIteration.
-                next(output_file)
-            except StopIteration:
-                # Raised by the call to next() if there are no lines in the
-                # file.
-                return groups_containing_user
-
-            # Parse group names to which the user belongs. Process the file
-            # line-by-line instead of reading the whole file into
-            # memory. Should be more memory-efficient.
-            for line in output_file:
-                tokens = line.split()
-                group_name = tokens[0]
-                group_members = tokens[1:]
-                if current_user in group_members:
-                    groups_containing_user.append(group_name)
-
-        # Memoize the completions. We also memoize an empty list of completions
-        # because if it didn't work a second ago, it's not likely to work now.
-        self._group_cache = groups_containing_user
-
-        return groups_containing_user
+            return []
+        return self.groups_of(current_user)
+
+    def groups_of(self, user):
+        """Return the groups containing any user. The index of all users is
+        built from `bugroup' once and cached, so that long-running processes
+        serving many users don't query LSF per user.
+
+        :param user: the user name
+        :type user: :class:`str`
+        :rtype: :class:`list` of :class:`str`
+        """
+        return self._memoized().get(user, '').split()
+
+    def _compute(self, refresh):
+        # Wide output keeps long group names from being truncated.
+        index = self._query(['bugroup', '-w'], parse_group_index, refresh)
+        if index is None:
+            # Same as for bqueues: no completions are better than a crash.
+            index = {}
+        return index
+
+
+class PrefetchCompletions(object):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, get_queue_completions, get_queue_limits,
+                 get_queue_topology, get_group_completions):
+        pass
+
+    def __call__(self):
+        """Start querying LSF for all completions concurrently, so that the
+        queries run while the user is answering earlier prompts.
+        """
+        self._get_queue_completions.prefetch()
+        self._get_queue_limits.prefetch()
+        self._get_queue_topology.prefetch()
+        self._get_group_completions.prefetch()
+
+    def refresh(self):
+        """Query LSF for all completions again, in the background."""
+        self._get_queue_completions.refresh()
+        self._get_queue_limits.refresh()
+        self._get_queue_topology.refresh()
+        self._get_group_completions.refresh()
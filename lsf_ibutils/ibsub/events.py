@@ -0,0 +1,288 @@
+""":mod:`lsf_ibutils.ibsub.events` -- Following `lsb.events'
+
+mbatchd appends a record to ``lsb.events`` for every change to every job, so
+following the file tells when jobs change state without querying mbatchd at
+all. Each record is one line of space-separated fields, strings in double
+quotes, starting with the record type, format version, time and job ID::
+
+    "JOB_STATUS" "9.13" 1369123456 1234 64 0 0 12.5 1369123456 0 0 0 0 0
+
+When the file grows too large, mbatchd renames it to ``lsb.events.1``,
+shifting older files up by one, and starts a new ``lsb.events``. Following
+the file therefore remembers its inode as well as the offset reached, to
+notice the switch and finish the renamed file first.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from lsf_ibutils.ibsub import cache
+
+READ_SIZE = 4 * 1024 * 1024
+"""Bytes read from the file at a time."""
+
+JOB_EVENT_TYPES = ('JOB_NEW', 'JOB_START', 'JOB_STATUS')
+"""Types of the records which change the state of a job."""
+
+# Records are filtered by these prefixes before being decoded at all.
+_PREFIXES = tuple(
+    '"{0}" '.format(event_type).encode('ascii')
+    for event_type in JOB_EVENT_TYPES)
+
+# Quoted strings escape double quotes by doubling them.
+_FIELD_RE = re.compile(r'"(?:[^"]|"")*"|\S+')
+
+# Bits of a job's status, from lsbatch.h, in order of precedence.
+_STATUS_BITS = [
+    (0x40, 'DONE'),
+    (0x80, 'DONE'),
+    (0x20, 'EXIT'),
+    (0x100, 'EXIT'),
+    (0x10000, 'UNKWN'),
+    (0x10, 'USUSP'),
+    (0x08, 'SSUSP'),
+    (0x02, 'PSUSP'),
+    (0x04, 'RUN'),
+    (0x200, 'WAIT'),
+    (0x01, 'PEND'),
+]
+
+# Number of fields of the resource usage which JOB_STATUS records include if
+# their `ru' field is non-zero.
+_RUSAGE_FIELDS = 19
+
+
+class EventLogError(Exception):
+    """Raised when the event file cannot be read."""
+    pass
+
+
+def job_state(status):
+    """Convert a job's status bits to its state, as shown by `bjobs'.
+
+    :param status: the ``jStatus`` field of a record
+    :type status: :class:`int`
+    :rtype: :class:`str`
+    """
+    for bit, state in _STATUS_BITS:
+        if status & bit:
+            return state
+    return 'UNKWN'
+
+
+def record_job_id(line):
+    """Return the job ID of a record without decoding the record, so that
+    records of untracked jobs can be skipped cheaply.
+
+    :param line: the record
+    :type line: :class:`bytes`
+    :return: the job ID, still encoded
+    :rtype: :class:`bytes`
+    """
+    fields = line.split(b' ', 4)
+    return fields[3] if len(fields) > 3 else None
+
+
+def _exit_code(exit_status):
+    if exit_status == 0:
+        return None
+    # Like the status returned by wait(): an exit code or a signal number.
+    if exit_status & 0xff:
+        return str(exit_status & 0x7f)
+    return str(exit_status >> 8)
+
+
+def parse_record(line):
+    """Parse a JOB_NEW, JOB_START or JOB_STATUS record.
+
+    :param line: the record
+    :type line: :class:`bytes`
+    :return: tuple of (job ID, array job ID or ``None``, state, exit code or \
+    ``None``), in the form yielded by \
+    :func:`~lsf_ibutils.ibsub.watch.parse_bjobs`, or ``None`` if the record \
+    is malformed
+    :rtype: :class:`tuple`
+    """
+    fields = _FIELD_RE.findall(line.decode('utf-8', 'replace'))
+    try:
+        event_type = fields[0].strip('"')
+        job_id = fields[3]
+        if event_type == 'JOB_NEW':
+            return job_id, None, 'PEND', None
+        state = job_state(int(fields[4]))
+        exit_code = None
+        if event_type == 'JOB_START':
+            # Pid, process group, host factor, then the execution hosts,
+            # the queue's pre- and post-execution commands, flags and user
+            # group.
+            index = fields[9 + int(fields[8]) + 4]
+        else:
+            # Reason, subreasons, CPU time, end time, then resource usage.
+            position = 10
+            if fields[9] != '0':
+                position += _RUSAGE_FIELDS
+            # Flags, exit status, then the index.
+            exit_code = _exit_code(int(fields[position + 1]))
+            index = fields[position + 2]
+    except (IndexError, ValueError):
+        return None
+    if index != '0':
+        return '{0}[{1}]'.format(job_id, index), job_id, state, exit_code
+    return job_id, None, state, exit_code
+
+
+class EventLog(object):
+    """Follows an event file from the offset reached last time, across
+    rotations.
+    """
+    def __init__(self, path, inode=None, offset=0):
+        self.path = path
+        self.inode = inode
+        self.offset = offset
+
+    def to_dict(self):
+        """Return the position in the file as a JSON-serializable
+        dictionary.
+
+        :rtype: :class:`dict`
+        """
+        return {'path': self.path, 'inode': self.inode, 'offset': self.offset}
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Create a follower from the result of :meth:`to_dict`.
+
+        :param fields: the position
+        :type fields: :class:`dict`
+        :rtype: :class:`EventLog`
+        """
+        return cls(fields['path'], fields['inode'], fields['offset'])
+
+    def read_job_records(self):
+        """Read the JOB_NEW, JOB_START and JOB_STATUS records appended since
+        the last read. An incomplete last record is left for the next read.
+
+        The position advances as records are read, so the iterator should be
+        exhausted; records which are read again are harmless, as they only
+        repeat states.
+
+        :return: iterator of records
+        :rtype: iterator of :class:`bytes`
+        :raises EventLogError: if the file cannot be read
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError as error:
+            raise EventLogError('{0}: {1}'.format(self.path, error.strerror))
+        if self.inode is not None and inode != self.inode:
+            # Rotated. Finish the old file, if it's still around.
+            rotated_path = self._find_rotated()
+            if rotated_path is not None:
+                for line in self._read(rotated_path):
+                    yield line
+            self.offset = 0
+        self.inode = inode
+        for line in self._read(self.path):
+            yield line
+
+    def _find_rotated(self):
+        directory, name = os.path.split(self.path)
+        try:
+            names = os.listdir(directory or '.')
+        except OSError:
+            return None
+        for rotated_name in sorted(names):
+            if not rotated_name.startswith(name + '.'):
+                continue
+            path = os.path.join(directory, rotated_name)
+            try:
+                if os.stat(path).st_ino == self.inode:
+                    return path
+            except OSError:
+                pass
+        return None
+
+    def _read(self, path):
+        try:
+            events_file = open(path, 'rb')
+        except (IOError, OSError) as error:
+            raise EventLogError('{0}: {1}'.format(path, error.strerror))
+        with events_file:
+            events_file.seek(0, os.SEEK_END)
+            if events_file.tell() < self.offset:
+                # Truncated in place; start again.
+                self.offset = 0
+            events_file.seek(self.offset)
+            remainder = b''
+            while True:
+                chunk = events_file.read(READ_SIZE)
+                if not chunk:
+                    break
+                data = remainder + chunk
+                end = data.rfind(b'\n') + 1
+                remainder = data[end:]
+                for line in data[:end].splitlines():
+                    if line.startswith(_PREFIXES):
+                        yield line
+                self.offset += end
+
+
+def default_state_path(events_path, job_ids):
+    """Return the file in which to save the state of following an event file
+    for a set of jobs, in the per-user cache directory.
+
+    :param events_path: path of the event file
+    :type events_path: :class:`str`
+    :param job_ids: the tracked jobs
+    :type job_ids: iterable of :class:`str`
+    :rtype: :class:`str`
+    """
+    key = '\n'.join([os.path.abspath(events_path)] + sorted(set(job_ids)))
+    return os.path.join(
+        cache.default_directory(), 'events',
+        hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_state(path):
+    """Load state saved by :func:`save_state`.
+
+    :param path: path of the state file
+    :type path: :class:`str`
+    :return: the state, or ``None`` if there is none or it is corrupt
+    :rtype: :class:`dict`
+    """
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_state(path, state):
+    """Save state atomically, so that an interrupted save leaves the previous
+    state in place.
+
+    :param path: path of the state file
+    :type path: :class:`str`
+    :param state: JSON-serializable state
+    :type state: :class:`dict`
+    """
+    directory = os.path.dirname(path) or '.'
+    try:
+        os.makedirs(directory)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            json.dump(state, temp_file)
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,241 @@
+""":mod:`lsf_ibutils.ibsub.hosts` -- Host topology from `lshosts' and `bhosts'
+"""
+
+import collections
+import re
+
+_MEMORY_UNITS_MB = {
+    'K': 1.0 / 1024,
+    'M': 1,
+    'G': 1024,
+    'T': 1024 * 1024,
+}
+
+_MEMORY_RE = re.compile(r'(\d+(?:\.\d+)?)([KMGT]?)B?$', re.IGNORECASE)
+
+# Preference levels in queue host lists, e.g., `hostA+2'.
+_PREFERENCE_RE = re.compile(r'\+\d*$')
+
+
+class Host(object):
+    """An execution host. Values are ``None`` if LSF doesn't report them.
+
+    ``slots`` is the number of job slots LSF allocates on the host, which is
+    what ``span[ptile=...]`` counts. Memory is in megabytes.
+    """
+    def __init__(self, name, slots=None, cores=None, sockets=None,
+                 memory=None):
+        self.name = name
+        self.slots = slots
+        self.cores = cores
+        self.sockets = sockets
+        self.memory = memory
+
+
+class QueueTopology(object):
+    """The hosts on which a queue runs jobs."""
+    def __init__(self, name, hosts):
+        self.name = name
+        self.hosts = hosts
+        self.slot_counts = collections.Counter(
+            host.slots for host in hosts if host.slots)
+
+    @property
+    def slots_per_host(self):
+        """The most common number of slots per host, or ``None`` if
+        unknown.
+        """
+        return typical_slots([self])
+
+    def allows_ptile(self, ptile):
+        """Whether the queue has hosts with at least ``ptile`` slots, as
+        ``span[ptile=...]`` needs. Any ptile is allowed if no slot counts are
+        known.
+
+        :param ptile: number of tasks per host
+        :type ptile: :class:`int`
+        :rtype: :class:`bool`
+        """
+        return not self.slot_counts or max(self.slot_counts) >= ptile
+
+
+def typical_slots(topologies):
+    """Return the most common number of slots per host over the hosts of
+    several queues. Ties go to the larger hosts.
+
+    :param topologies: the queues
+    :type topologies: iterable of :class:`QueueTopology`
+    :rtype: :class:`int`
+    """
+    counts = collections.Counter()
+    for topology in topologies:
+        counts.update(topology.slot_counts)
+    if not counts:
+        return None
+    return max(counts, key=lambda slots: (counts[slots], slots))
+
+
+def suggest_ptile(tasks, slots_per_host):
+    """Suggest the number of tasks per node which packs a job onto the
+    fewest hosts, filling all but the last.
+
+    :param tasks: number of tasks in the job
+    :type tasks: :class:`int`
+    :param slots_per_host: number of slots on each host
+    :type slots_per_host: :class:`int`
+    :rtype: :class:`int`
+    """
+    return max(1, min(tasks, slots_per_host))
+
+
+def _parse_int(text):
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def _parse_memory(text):
+    match = _MEMORY_RE.match(text)
+    if match is None:
+        return None
+    amount, unit = match.groups()
+    # Without a unit, LSF reports megabytes.
+    return int(float(amount) * _MEMORY_UNITS_MB[unit.upper() or 'M'])
+
+
+def parse_lshosts(lines):
+    """Parse the cores, sockets and memory of each host from the output of
+    `lshosts -w'. Sockets are only known if the output has an ``nprocs``
+    column, and cores default to ``ncpus`` if it has no ``ncores`` column.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :return: mapping of host name to [cores, sockets, memory], for caching \
+    as JSON
+    :rtype: :class:`dict`
+    """
+    header = next(lines, '').split()
+    hosts = {}
+    for line in lines:
+        row = dict(zip(header, line.split()))
+        if 'HOST_NAME' not in row:
+            continue
+        nprocs = _parse_int(row.get('nprocs', '-'))
+        cores = _parse_int(row.get('ncores', '-'))
+        if cores is not None and nprocs is not None:
+            # ncores counts the cores of one socket.
+            cores *= nprocs
+        else:
+            cores = _parse_int(row.get('ncpus', '-'))
+        hosts[row['HOST_NAME']] = [
+            cores, nprocs, _parse_memory(row.get('maxmem', '-'))]
+    return hosts
+
+
+def parse_bhosts(lines):
+    """Parse the number of job slots of each host from the output of
+    `bhosts -w'.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :return: mapping of host name to slots, or ``None`` if unlimited
+    :rtype: :class:`dict`
+    """
+    header = next(lines, '').split()
+    slots = {}
+    for line in lines:
+        row = dict(zip(header, line.split()))
+        if 'HOST_NAME' in row:
+            slots[row['HOST_NAME']] = _parse_int(row.get('MAX', '-'))
+    return slots
+
+
+def parse_host_groups(lines):
+    """Parse the members of each host group from the output of
+    `bmgroup -w'. Subgroups are members ending in a slash, as in queue host
+    lists.
+
+    :param lines: output lines, including the header
+    :type lines: iterator of :class:`str`
+    :rtype: :class:`dict` of :class:`str` to :class:`list` of :class:`str`
+    """
+    # Strip off the first line, which is a header.
+    next(lines, None)
+    groups = {}
+    for line in lines:
+        tokens = line.split()
+        if tokens:
+            groups[tokens[0]] = tokens[1:]
+    return groups
+
+
+def expand_hosts(names, host_groups, all_hosts):
+    """Expand a queue's host list into host names. Host groups, including
+    nested ones, are replaced by their members, preference levels such as
+    ``+2`` are ignored and ``~name`` excludes a host or group.
+
+    :param names: the host list, e.g., from ``HOSTS:`` of `bqueues -l', or \
+    ``None`` for all hosts
+    :type names: :class:`list` of :class:`str`
+    :param host_groups: result of :func:`parse_host_groups`
+    :type host_groups: :class:`dict`
+    :param all_hosts: names of all hosts
+    :type all_hosts: iterable of :class:`str`
+    :rtype: :class:`set` of :class:`str`
+    """
+    if names is None:
+        return set(all_hosts)
+    included = set()
+    excluded = set()
+    for name in names:
+        hosts = excluded if name.startswith('~') else included
+        _expand(name.lstrip('~'), host_groups, all_hosts, hosts, set())
+    return included - excluded
+
+
+def _expand(name, host_groups, all_hosts, hosts, seen):
+    name = _PREFERENCE_RE.sub('', name)
+    if name in ('all', 'others', 'allremote'):
+        hosts.update(all_hosts)
+        return
+    group = name.rstrip('/')
+    if group not in host_groups:
+        hosts.add(group)
+        return
+    if group in seen:
+        # Cycles of groups are an LSF misconfiguration, but don't loop.
+        return
+    seen.add(group)
+    for member in host_groups[group]:
+        _expand(member, host_groups, all_hosts, hosts, seen)
+
+
+def index_topology(host_info, host_slots, host_groups, queue_hosts):
+    """Build the topology of every queue, so that looking one up while
+    prompting takes no further work.
+
+    :param host_info: result of :func:`parse_lshosts`
+    :type host_info: :class:`dict`
+    :param host_slots: result of :func:`parse_bhosts`
+    :type host_slots: :class:`dict`
+    :param host_groups: result of :func:`parse_host_groups`
+    :type host_groups: :class:`dict`
+    :param queue_hosts: mapping of queue name to its host list, as in \
+    :attr:`~lsf_ibutils.ibsub.queues.QueueLimits.hosts`
+    :type queue_hosts: :class:`dict`
+    :return: mapping of queue name to topology
+    :rtype: :class:`dict` of :class:`str` to :class:`QueueTopology`
+    """
+    hosts = {}
+    for name in set(host_info) | set(host_slots):
+        cores, sockets, memory = host_info.get(name, [None, None, None])
+        # Without a slot limit from bhosts, LSF allocates one slot per core.
+        slots = host_slots.get(name) or cores
+        hosts[name] = Host(name, slots, cores, sockets, memory)
+    return dict(
+        (queue, QueueTopology(queue, [
+            hosts[name] for name in sorted(
+                expand_hosts(names, host_groups, hosts))
+            if name in hosts]))
+        for queue, names in queue_hosts.items())
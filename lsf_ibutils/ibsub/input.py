@@ -3,11 +3,11 @@
 
 from __future__ import print_function
 import sys
-# Uses GNU readline on UNIX-like operating systems, pyreadline on Windows.
-import readline
 
 import pinject
 
+from lsf_ibutils.ibsub.matchers import FuzzyMatcher, PrefixMatcher
+
 
 class SimplePrompt(object):
     @pinject.copy_args_to_internal_fields
@@ -15,7 +15,7 @@ class SimplePrompt(object):
         pass
 
     def __call__(self, message, required=False, format_=None, validator=None,
-                 default=None, completions=[]):
+                 default=None, completions=[], fuzzy=False):
         """Prompt the user based on the passed options.
 
         :param message: the prompt message to display to the user
@@ -32,6 +32,9 @@ class SimplePrompt(object):
         :type default: :class:`str`
         :param completions: a list of completions for this prompt
         :type completions: :class:`list` of :class:`str`
+        :param fuzzy: whether completions match text anywhere in them, \
+        ranked, instead of only at the start
+        :type fuzzy: :class:`bool`
         :return: the user-entered text
         :rtype: :class:`str`
         """
@@ -45,7 +48,7 @@ class SimplePrompt(object):
         prompt_text = ''.join(prompt_text_list)
 
         # Set the completions.
-        self._set_completions(completions)
+        self._set_completions(completions, fuzzy=fuzzy)
 
         # Prompt for the value.
         while True:
@@ -85,7 +88,9 @@ def prompt_for_line(prompt):
     try:
         # If input is being piped or redirected in, there is no need to print
         # the prompts.
-        if not sys.stdin.isatty():
+        if sys.stdin.isatty():
+            _init_readline()
+        else:
             prompt = ''
         return raw_input(prompt)
     except EOFError:
@@ -102,30 +107,49 @@ def prompt_for_line(prompt):
 
 # Completion handling
 
-_completions = []
+_matcher = PrefixMatcher([])
+_matched_completions = None
 
 
-def set_completions(completions):
+def set_completions(completions, fuzzy=False):
     """Set global readline completions.
 
     :param completions: list of completions
     :type completions: :class:`list` of :class:`str`
+    :param fuzzy: whether to use a :class:`~lsf_ibutils.ibsub.matchers.\
+FuzzyMatcher` instead of a :class:`~lsf_ibutils.ibsub.matchers.\
+PrefixMatcher`
+    :type fuzzy: :class:`bool`
     """
-    # Set the contents of the list.
-    _completions[:] = completions
+    global _matcher, _matched_completions
+    matcher_class = FuzzyMatcher if fuzzy else PrefixMatcher
+    # Completers return the same memoized list each time, so an index built
+    # for it can be reused when prompting again.
+    if (completions is _matched_completions and
+            isinstance(_matcher, matcher_class)):
+        return
+    # Index the completions once here rather than on every press of tab.
+    _matcher = matcher_class(completions)
+    _matched_completions = completions
 
 
 def _readline_completer(text, state):
-    # This is a clever way to return the correction completion for
-    # the "state". Basically, the "state" is the amount of times
-    # tab has been pressed. This code decrements state to find the
-    # nth completion starting with the text.
-    for completion in _completions:
-        if completion.lower().startswith(text.lower()):
-            if state == 0:
-                return completion
-            else:
-                state -= 1
+    # Readline calls this with state 0, 1, 2, ... until it returns None to
+    # collect all completions for the text.
+    return _matcher.nth_match(text, state)
+
+
+_readline_initialized = False
+
 
-readline.parse_and_bind('tab: complete')
-readline.set_completer(_readline_completer)
+def _init_readline():
+    # readline is slow to import and pointless when input isn't coming from a
+    # terminal, so it is set up on the first interactive prompt.
+    global _readline_initialized
+    if _readline_initialized:
+        return
+    # Uses GNU readline on UNIX-like operating systems, pyreadline on Windows.
+    import readline
+    readline.parse_and_bind('tab: complete')
+    readline.set_completer(_readline_completer)
+    _readline_initialized = True
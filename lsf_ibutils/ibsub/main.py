@@ -4,16 +4,20 @@
 
 from __future__ import print_function
 import argparse
+import json
+import os
 import sys
 import signal
 
-import pinject
-
 from lsf_ibutils import ibsub
 from lsf_ibutils import metadata
-from lsf_ibutils.ibsub.binding_specs import IbsubBindingSpec
+from lsf_ibutils.ibsub import cache
+from lsf_ibutils.ibsub import client
 from lsf_ibutils.ibsub import output
+from lsf_ibutils.ibsub import ratelimit
 from lsf_ibutils.ibsub import shell
+from lsf_ibutils.ibsub import submit
+from lsf_ibutils.ibsub import sweep
 
 
 def _install_sigint_handler():
@@ -31,74 +35,318 @@ def main(argv):
     :param argv: command-line arguments
     :type argv: :class:`list`
     """
-    # Setup pinject.
-    obj_graph = pinject.new_object_graph(binding_specs=[IbsubBindingSpec()])
-    # TODO Not the cleanest solution.
-    ibsub.obj_graph = obj_graph
+    main_class = Main
+    if len(argv) > 1 and argv[1] in _SUBCOMMANDS:
+        main_class = _SUBCOMMANDS[argv[1]]
+        # Make the program name in usage messages include the subcommand.
+        argv = [argv[0] + ' ' + argv[1]] + argv[2:]
+
+    # Parse arguments before setting up pinject, so that --help, --version
+    # and usage errors don't pay for importing it and the prompts.
+    args = main_class.parse_args(argv)
 
     # Setup signal handlers.
     _install_sigint_handler()
 
+    if main_class in (RequestMain, UnpackMain, WatchMain):
+        # The client only sets up pinject if it has to render the request
+        # itself, and unpacking and watching never need it.
+        return main_class().run(args)
+
     # Run pinject-provided main.
-    return obj_graph.provide(Main)(argv)
+    obj_graph = _new_obj_graph(answer_prompts=main_class is not Main)
+    return obj_graph.provide(main_class).run(args)
 
 
-class Main(object):
-    @pinject.copy_args_to_internal_fields
-    def __init__(self, exec_prompts, prompt_command,
-                 build_script, build_command):
-        pass
+def _new_obj_graph(answer_prompts):
+    """Setup pinject.
 
-    def __call__(self, argv):
-        author_strings = []
-        for name, email in zip(metadata.authors, metadata.emails):
-            author_strings.append('Author: {0} <{1}>'.format(name, email))
+    :param answer_prompts: whether prompts are answered from parameters \
+    instead of by the user
+    :type answer_prompts: :class:`bool`
+    :return: the object graph
+    :rtype: :class:`pinject.ObjectGraph`
+    """
+    import pinject
+    from lsf_ibutils.ibsub.binding_specs import IbsubBindingSpec
+    binding_specs = [IbsubBindingSpec()]
+    if answer_prompts:
+        from lsf_ibutils.ibsub.batch import BatchBindingSpec
+        # Import server module for the sake of pinject being able to find
+        # RenderRequest.
+        from lsf_ibutils.ibsub import server  # NOQA
+        binding_specs.append(BatchBindingSpec())
+    obj_graph = pinject.new_object_graph(binding_specs=binding_specs)
+    # TODO Not the cleanest solution.
+    ibsub.obj_graph = obj_graph
+    return obj_graph
+
+
+def _new_bare_arg_parser(prog, description):
+    """Create an argument parser with only the --help and --version options.
 
-        epilog = '''
+    :param prog: program name to display in usage messages
+    :type prog: :class:`str`
+    :param description: description of the command
+    :type description: :class:`str`
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    author_strings = []
+    for name, email in zip(metadata.authors, metadata.emails):
+        author_strings.append('Author: {0} <{1}>'.format(name, email))
+
+    epilog = '''
 {project} {version}
 
 {authors}
 URL: <{url}>
 '''.format(
-            project=metadata.project,
-            version=metadata.version,
-            authors='\n'.join(author_strings),
-            url=metadata.url)
+        project=metadata.project,
+        version=metadata.version,
+        authors='\n'.join(author_strings),
+        url=metadata.url)
 
-        arg_parser = argparse.ArgumentParser(
-            prog=argv[0],
-            formatter_class=argparse.RawDescriptionHelpFormatter,
-            description=metadata.description,
-            epilog=epilog)
-        arg_parser.add_argument(
-            '-V', '--version',
-            action='version',
-            version='{0} {1}'.format(metadata.project, metadata.version))
-        type_choices = ['script', 'command']
-        arg_parser.add_argument(
-            '-t', '--type',
-            choices=type_choices,
-            default=type_choices[0],
-            help='type of output')
-        # XXX TODO Test this code
-        default_syntax = shell.detect()
-        if default_syntax is None:
-            default_syntax = 'bash'
-        arg_parser.add_argument(
-            '-s', '--syntax',
-            choices=output.SYNTAXES,
-            default=default_syntax,
-            help='shell syntax to use in conjuction with --type script')
+    arg_parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=description,
+        epilog=epilog)
+    arg_parser.add_argument(
+        '-V', '--version',
+        action='version',
+        version='{0} {1}'.format(metadata.project, metadata.version))
+    return arg_parser
 
-        args = arg_parser.parse_args(args=argv[1:])
-        flags = self._exec_prompts()
+
+def _new_arg_parser(prog, description):
+    """Create an argument parser with the options common to all commands
+    which render jobs.
+
+    :param prog: program name to display in usage messages
+    :type prog: :class:`str`
+    :param description: description of the command
+    :type description: :class:`str`
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    arg_parser = _new_bare_arg_parser(prog, description)
+    arg_parser.add_argument(
+        '-t', '--type',
+        choices=output.TYPES,
+        default=output.TYPES[0],
+        help='type of output')
+    arg_parser.add_argument(
+        '-s', '--syntax',
+        choices=output.SYNTAXES,
+        help='shell syntax to use in conjuction with --type script '
+        '(default: the running shell, or bash if it cannot be detected)')
+    cache_group = arg_parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='ignore cached completions and query LSF again')
+    cache_group.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='neither read nor write the completion cache')
+    arg_parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        metavar='SECONDS',
+        help='age after which cached completions are refreshed '
+        '(default: {0})'.format(cache.DEFAULT_TTL))
+    return arg_parser
+
+
+def _parse_args(arg_parser, argv):
+    """Parse arguments with a parser made by :func:`_new_arg_parser`.
+
+    :param arg_parser: the parser
+    :type arg_parser: :class:`argparse.ArgumentParser`
+    :param argv: command-line arguments
+    :type argv: :class:`list`
+    :rtype: :class:`argparse.Namespace`
+    """
+    args = arg_parser.parse_args(args=argv[1:])
+    args.prog = arg_parser.prog
+    if args.syntax is None and args.type == 'script':
+        # Detecting the shell walks the process tree, so only do it when the
+        # result is actually needed.
+        args.syntax = shell.detect()
+        if args.syntax is None:
+            args.syntax = 'bash'
+    return args
+
+
+def _integer_at_least(minimum):
+    """Return an argparse type for integers no less than ``minimum``.
+
+    :param minimum: the smallest valid value
+    :type minimum: :class:`int`
+    :rtype: :class:`function`
+    """
+    def parse(text):
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                'invalid integer {0!r}'.format(text))
+        if value < minimum:
+            raise argparse.ArgumentTypeError(
+                'must be at least {0}, got {1}'.format(minimum, value))
+        return value
+    return parse
+
+
+def _add_submit_arguments(arg_parser):
+    """Add the options controlling job submission."""
+    arg_parser.add_argument(
+        '--submit',
+        action='store_true',
+        help='submit the job(s) with bsub instead of printing them')
+    arg_parser.add_argument(
+        '--workers',
+        type=_integer_at_least(1),
+        default=4,
+        help='maximum number of concurrent bsub processes (default: '
+        '%(default)s)')
+    arg_parser.add_argument(
+        '--retries',
+        type=_integer_at_least(0),
+        default=5,
+        help='times to retry a submission when mbatchd is busy (default: '
+        '%(default)s)')
+    arg_parser.add_argument(
+        '--target-latency',
+        type=float,
+        metavar='SECONDS',
+        help='adapt the number of concurrent bsub processes (up to '
+        '--workers) to keep bsub latency under this target')
+    arg_parser.add_argument(
+        '--bsub-timeout',
+        type=float,
+        metavar='SECONDS',
+        default=submit.SUBMIT_TIMEOUT,
+        help='give up on a bsub call after this long; the submission fails '
+        'without a retry (default: %(default)s)')
+
+
+def _new_submitter(args):
+    """Create a submitter from the options added by
+    :func:`_add_submit_arguments`.
+    """
+    limiter = None
+    if args.target_latency is not None:
+        limiter = ratelimit.AdaptiveLimiter(
+            initial=min(2, args.workers),
+            maximum=args.workers,
+            target_latency=args.target_latency)
+    return submit.Submitter(
+        workers=args.workers, retries=args.retries, limiter=limiter,
+        timeout=args.bsub_timeout)
+
+
+def _configure_cache(completion_cache, args):
+    """Apply the cache options parsed by :func:`_new_arg_parser`."""
+    completion_cache.configure(
+        enabled=not args.no_cache,
+        force_refresh=args.refresh_cache,
+        ttl=args.cache_ttl)
+
+
+def _wait_for_refreshes(completion_cache):
+    """Give background refreshes of stale cache entries a moment to finish
+    before exiting, without noticeably delaying the exit. See
+    :data:`~lsf_ibutils.ibsub.cache.REFRESH_WAIT`.
+    """
+    completion_cache.wait(timeout=cache.REFRESH_WAIT)
+
+
+class Main(object):
+    # Fields are assigned by hand instead of using
+    # @pinject.copy_args_to_internal_fields so that this module can be
+    # imported without importing pinject.
+    def __init__(self, exec_prompts, prompt_command,
+                 build_script, build_command, completion_cache,
+                 prefetch_completions):
+        self._exec_prompts = exec_prompts
+        self._prompt_command = prompt_command
+        self._build_script = build_script
+        self._build_command = build_command
+        self._completion_cache = completion_cache
+        self._prefetch_completions = prefetch_completions
+
+    def __call__(self, argv):
+        return self.run(self.parse_args(argv))
+
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        arg_parser = _new_arg_parser(argv[0], metadata.description)
+        arg_parser.add_argument(
+            '--sweep',
+            metavar='SPEC_FILE',
+            type=argparse.FileType('r'),
+            help='JSON parameter sweep specification; builds a single job '
+            'array script with one element per point of the sweep')
+        _add_submit_arguments(arg_parser)
+        args = _parse_args(arg_parser, argv)
+        if args.sweep is not None:
+            if args.type != 'script':
+                arg_parser.error('--sweep requires --type script')
+            try:
+                args.sweep = sweep.load(args.sweep)
+            except sweep.SweepError as error:
+                arg_parser.error('invalid sweep: {0}'.format(error))
+        return args
+
+    def run(self, args):
+        """Prompt for the job and output it as requested.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        _configure_cache(self._completion_cache, args)
+        try:
+            return self._run(args)
+        finally:
+            _wait_for_refreshes(self._completion_cache)
+
+    def _run(self, args):
+        # Query LSF in the background while the user answers the prompts.
+        self._prefetch_completions()
+
+        from lsf_ibutils.ibsub import prompts
+        try:
+            flags = self._exec_prompts()
+        except prompts.PromptError as error:
+            print('{0}: {1}'.format(args.prog, error), file=sys.stderr)
+            return 1
         command = self._prompt_command()
 
         if args.type == 'script':
-            out = self._build_script(flags, command, args.syntax)
+            out = self._build_script(
+                flags, command, args.syntax, sweep=args.sweep)
         else:
             out = self._build_command(flags, command)
 
+        if args.submit:
+            if args.type == 'script':
+                result = _new_submitter(args).submit(script=out)
+            else:
+                result = _new_submitter(args).submit(command=out)
+            if not result.succeeded:
+                print('{0}: submission failed: {1}'.format(
+                    args.prog, result.error), file=sys.stderr)
+                return 1
+            out = result.output.rstrip()
+
         # If stdout is not being redirected, print a blank line so output
         # looks nicer.
         if sys.stdout.isatty():
@@ -109,6 +357,509 @@ URL: <{url}>
         return 0
 
 
+class BatchMain(object):
+    # See the note in Main.
+    def __init__(self, run_batch, completion_cache):
+        self._run_batch = run_batch
+        self._completion_cache = completion_cache
+
+    def __call__(self, argv):
+        return self.run(self.parse_args(argv))
+
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        from lsf_ibutils.ibsub import batch
+        from lsf_ibutils.ibsub import pack
+        arg_parser = _new_arg_parser(
+            argv[0],
+            'Generate one bsub command or script per row of a parameter file. '
+            'Columns are named after the prompts they answer (e.g., JobName, '
+            'QueueName), plus {0} for the command to run.'.format(
+                batch.COMMAND_FIELD))
+        arg_parser.add_argument(
+            '-f', '--format',
+            choices=batch.FORMATS,
+            help='parameter file format (default: guessed from the file '
+            'extension)')
+        arg_parser.add_argument(
+            '-o', '--output-directory',
+            help='directory in which to write scripts, required for '
+            '--type script')
+        arg_parser.add_argument(
+            '-j', '--jobs',
+            type=int,
+            metavar='N',
+            help='render scripts in N processes, writing them in '
+            'subdirectories of {0} scripts each along with a manifest, {1}'
+            .format(batch.SHARD_SIZE, batch.MANIFEST_FILE_NAME))
+        arg_parser.add_argument(
+            '-a', '--archive',
+            help='write all scripts into this archive instead of one file '
+            'per row; its extension selects the format, one of {0}. Use '
+            "`ibsub unpack' to run a script from it".format(
+                ', '.join(sorted(pack.FORMATS))))
+        _add_submit_arguments(arg_parser)
+        arg_parser.add_argument(
+            '--manifest',
+            help='with --submit, file to which to write one JSON line per '
+            'submitted job (default: standard output)')
+        arg_parser.add_argument(
+            'parameter_file',
+            help="CSV or JSON Lines file with one job per row, `-' for "
+            'standard input')
+        args = _parse_args(arg_parser, argv)
+        if args.submit:
+            # Rows are always submitted as bsub commands.
+            args.type = 'command'
+        elif args.manifest is not None:
+            arg_parser.error('--manifest only applies with --submit')
+        BatchMain._check_output_args(arg_parser, args)
+        return args
+
+    @staticmethod
+    def _check_output_args(arg_parser, args):
+        """Check that the options choosing where output goes fit together,
+        exiting with a usage error if not.
+        """
+        from lsf_ibutils.ibsub import pack
+        if args.archive is not None:
+            if args.type != 'script':
+                arg_parser.error('--archive only applies to scripts')
+            if args.output_directory is not None or args.jobs is not None:
+                arg_parser.error('--archive cannot be combined with '
+                                 '--output-directory or --jobs')
+            try:
+                pack.archive_format(args.archive)
+            except pack.PackError as error:
+                arg_parser.error(str(error))
+        elif args.type == 'script' and args.output_directory is None:
+            arg_parser.error('--output-directory or --archive is required '
+                             'for scripts')
+        if args.jobs is not None:
+            if args.type != 'script':
+                arg_parser.error('--jobs only applies to scripts')
+            if args.jobs < 1:
+                arg_parser.error('--jobs must be at least 1')
+
+    def run(self, args):
+        """Generate or submit a job for every row of the parameter file.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        _configure_cache(self._completion_cache, args)
+        try:
+            return self._run(args)
+        finally:
+            _wait_for_refreshes(self._completion_cache)
+
+    def _run(self, args):
+        from lsf_ibutils.ibsub import batch
+        from lsf_ibutils.ibsub import pack
+        format_ = args.format
+        if format_ is None:
+            format_ = batch.detect_format(args.parameter_file)
+        if (args.output_directory is not None and
+                not os.path.isdir(args.output_directory)):
+            os.makedirs(args.output_directory)
+
+        if args.parameter_file == '-':
+            input_file = sys.stdin
+        else:
+            input_file = open(args.parameter_file)
+        submitter = _new_submitter(args) if args.submit else None
+        out = sys.stdout
+        if args.manifest is not None:
+            # Only opened here, so that usage errors don't truncate it.
+            out = open(args.manifest, 'w')
+        archive_file = archive = None
+        if args.archive is not None:
+            archive_file = open(args.archive, 'wb')
+            archive = pack.new_writer(args.archive, archive_file)
+        try:
+            succeeded, failed = self._run_batch(
+                batch.read_rows(input_file, format_),
+                args.type, args.syntax, out, sys.stderr,
+                output_directory=args.output_directory,
+                submitter=submitter, jobs=args.jobs, archive=archive)
+        except batch.BatchError as error:
+            print('{0}: {1}'.format(args.prog, error), file=sys.stderr)
+            return 2
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+            if out is not sys.stdout:
+                out.close()
+            if archive is not None:
+                archive.close()
+                archive_file.close()
+
+        print('{0} rows {1}, {2} rows failed'.format(
+            succeeded, 'submitted' if args.submit else 'rendered', failed),
+            file=sys.stderr)
+        if submitter is not None and submitter.limiter is not None:
+            print(ratelimit.format_metrics(submitter.limiter.metrics()),
+                  file=sys.stderr)
+        return 1 if failed else 0
+
+
+def _add_socket_argument(arg_parser):
+    arg_parser.add_argument(
+        '--socket',
+        default=client.default_socket_path(),
+        help='path of the server socket (default: %(default)s)')
+
+
+class ServeMain(object):
+    # See the note in Main.
+    def __init__(self, render_request, completion_cache,
+                 prefetch_completions):
+        self._render_request = render_request
+        self._completion_cache = completion_cache
+        self._prefetch_completions = prefetch_completions
+
+    def __call__(self, argv):
+        return self.run(self.parse_args(argv))
+
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        arg_parser = argparse.ArgumentParser(
+            prog=argv[0],
+            description='Keep ibsub and its completions warm, rendering '
+            "jobs requested with `ibsub request' over a Unix socket.")
+        _add_socket_argument(arg_parser)
+        arg_parser.add_argument(
+            '--refresh-interval',
+            type=int,
+            metavar='SECONDS',
+            default=cache.DEFAULT_TTL,
+            help='how often to query LSF for completions again (default: '
+            '%(default)s)')
+        args = arg_parser.parse_args(args=argv[1:])
+        args.prog = arg_parser.prog
+        return args
+
+    def run(self, args):
+        """Serve requests until interrupted.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        from lsf_ibutils.ibsub import server
+        self._prefetch_completions()
+        try:
+            request_server = server.Server(
+                args.socket, self._render_request,
+                refresh=self._prefetch_completions.refresh,
+                refresh_interval=args.refresh_interval)
+        except (server.ServerError, EnvironmentError) as error:
+            print('{0}: {1}'.format(args.prog, error), file=sys.stderr)
+            return 2
+        print('{0}: listening on {1}'.format(args.prog, args.socket),
+              file=sys.stderr)
+        try:
+            request_server.serve_forever()
+        finally:
+            request_server.server_close()
+        return 0
+
+
+class RequestMain(object):
+    """Thin client for `ibsub serve', which renders the request in process
+    if the server isn't running.
+    """
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        arg_parser = _new_arg_parser(
+            argv[0],
+            "Render a job using `ibsub serve', or in this process if the "
+            'server is not running. Answers are a JSON object keyed by the '
+            "same names as `ibsub batch' columns.")
+        _add_socket_argument(arg_parser)
+        arg_parser.add_argument(
+            'answers_file',
+            nargs='?',
+            type=argparse.FileType('r'),
+            default=sys.stdin,
+            help='JSON file of answers (default: standard input)')
+        args = _parse_args(arg_parser, argv)
+        try:
+            args.answers = json.load(args.answers_file)
+        except ValueError as error:
+            arg_parser.error('invalid answers: {0}'.format(error))
+        return args
+
+    def run(self, args):
+        """Render the job and print it.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        request = {'answers': args.answers, 'type': args.type}
+        if args.syntax is not None:
+            request['syntax'] = args.syntax
+        try:
+            response = client.send(request, args.socket)
+        except client.ServerUnavailable:
+            response = self._render_in_process(request, args)
+        if 'errors' in response:
+            for error in response['errors']:
+                print('{0}: {1}'.format(args.prog, error), file=sys.stderr)
+            return 1
+        print(response['output'])
+        return 0
+
+    @staticmethod
+    def _render_in_process(request, args):
+        obj_graph = _new_obj_graph(answer_prompts=True)
+        return obj_graph.provide(_RenderInProcess)(request, args)
+
+
+class _RenderInProcess(object):
+    # See the note in Main.
+    def __init__(self, render_request, completion_cache):
+        self._render_request = render_request
+        self._completion_cache = completion_cache
+
+    def __call__(self, request, args):
+        _configure_cache(self._completion_cache, args)
+        try:
+            return self._render_request(request)
+        finally:
+            _wait_for_refreshes(self._completion_cache)
+
+
+class UnpackMain(object):
+    """Print, write or run one script from an archive made by
+    ``ibsub batch --archive``. This runs on compute nodes, so it doesn't use
+    pinject.
+    """
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        arg_parser = _new_bare_arg_parser(
+            argv[0],
+            "Print, write or run one script from an archive made by `ibsub "
+            "batch --archive'. In a job array, each element picks its "
+            'script by $LSB_JOBINDEX. Note that LSF does not see the #BSUB '
+            'lines of scripts run this way; submit the array with the flags '
+            'it needs.')
+        arg_parser.add_argument(
+            '-i', '--index',
+            type=int,
+            help='one-based index of the script (default: $LSB_JOBINDEX)')
+        action_group = arg_parser.add_mutually_exclusive_group()
+        action_group.add_argument(
+            '-o', '--output',
+            metavar='FILE',
+            help='write the script to FILE, made executable')
+        action_group.add_argument(
+            '-x', '--exec',
+            # `exec' is a keyword in Python 2.
+            dest='exec_',
+            action='store_true',
+            help="replace this process with the script's interpreter running "
+            'the script')
+        action_group.add_argument(
+            '-l', '--list',
+            action='store_true',
+            help='list the index and parameter file row of every script')
+        arg_parser.add_argument('archive', help='the archive')
+        args = arg_parser.parse_args(args=argv[1:])
+        args.prog = arg_parser.prog
+        if args.index is None and not args.list:
+            try:
+                args.index = int(os.environ['LSB_JOBINDEX'])
+            except (KeyError, ValueError):
+                arg_parser.error('--index is required outside a job array')
+        return args
+
+    def run(self, args):
+        """Unpack the script.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        from lsf_ibutils.ibsub import pack
+        try:
+            with open(args.archive, 'rb') as archive_file:
+                reader = pack.new_reader(args.archive, archive_file)
+                if args.list:
+                    for index, row_number in enumerate(reader.rows(), 1):
+                        print('{0}\trow {1}'.format(index, row_number))
+                    return 0
+                _, script = reader.entry(args.index)
+            if args.exec_:
+                pack.exec_script(script)
+        except (IOError, OSError, pack.PackError) as error:
+            print('{0}: {1}'.format(args.prog, error), file=sys.stderr)
+            return 1
+        if args.output is not None:
+            with open(args.output, 'w') as script_file:
+                script_file.write(script)
+            os.chmod(args.output, 0o755)
+        else:
+            sys.stdout.write(script)
+        return 0
+
+
+class WatchMain(object):
+    """Report state changes of submitted jobs, querying LSF once per interval
+    for all of them, or following its event file.
+    """
+    @staticmethod
+    def parse_args(argv):
+        """Parse command-line arguments.
+
+        :param argv: command-line arguments
+        :type argv: :class:`list`
+        :rtype: :class:`argparse.Namespace`
+        """
+        from lsf_ibutils.ibsub import watch
+        arg_parser = _new_bare_arg_parser(
+            argv[0],
+            'Watch jobs until they finish, printing each change of state. '
+            'Job IDs are read from manifests written by `ibsub batch '
+            "--submit', from the output of `bsub', or from lists of IDs. "
+            "Every poll is a single `bjobs' call, however many jobs are "
+            'watched; with --events, LSF is not queried at all. Exits with '
+            'status 1 if any job exited with an error.')
+        arg_parser.add_argument(
+            '-j', '--job',
+            dest='job_ids',
+            action='append',
+            default=[],
+            metavar='ID',
+            help='watch the job with this ID; may be given more than once')
+        arg_parser.add_argument(
+            '-u', '--user',
+            help="user whose jobs to list, or `all' (default: the current "
+            'user)')
+        arg_parser.add_argument(
+            '-i', '--interval',
+            type=float,
+            metavar='SECONDS',
+            default=watch.DEFAULT_INTERVAL,
+            help='seconds between polls (default: %(default)s)')
+        arg_parser.add_argument(
+            '--once',
+            action='store_true',
+            help='poll once, print how many jobs are in each state and exit')
+        arg_parser.add_argument(
+            '--events',
+            metavar='FILE',
+            help="follow this copy of `lsb.events' instead of calling "
+            "`bjobs', e.g., $LSB_SHAREDIR/<cluster>/logdir/lsb.events")
+        arg_parser.add_argument(
+            '--state-file',
+            metavar='FILE',
+            help='with --events, where to save the position reached, to '
+            'resume from there next time (default: in the cache directory)')
+        arg_parser.add_argument(
+            'files',
+            nargs='*',
+            type=argparse.FileType('r'),
+            help="files from which to read job IDs, `-' for standard input")
+        args = arg_parser.parse_args(args=argv[1:])
+        args.prog = arg_parser.prog
+        for job_id in args.job_ids:
+            if not watch.is_job_id(job_id):
+                arg_parser.error('invalid job ID: {0}'.format(job_id))
+        for ids_file in args.files:
+            with ids_file:
+                args.job_ids.extend(watch.read_job_ids(ids_file))
+        if not args.job_ids:
+            arg_parser.error('no job IDs to watch')
+        if args.interval <= 0:
+            arg_parser.error('--interval must be positive')
+        if args.events is None:
+            if args.state_file is not None:
+                arg_parser.error('--state-file requires --events')
+        elif args.user is not None:
+            arg_parser.error('--user does not apply with --events')
+        return args
+
+    def run(self, args, sleep=None):
+        """Watch the jobs.
+
+        The first poll only prints how many jobs are in each state. Later
+        polls print each change on standard output, followed by the new
+        counts on standard error.
+
+        :param args: arguments parsed by :meth:`parse_args`
+        :type args: :class:`argparse.Namespace`
+        :param sleep: function to wait a number of seconds
+        :type sleep: :class:`function`
+        :return: exit code
+        :rtype: :class:`int`
+        """
+        import time
+        from lsf_ibutils.ibsub import events, watch
+        if args.events is not None:
+            state_path = args.state_file or events.default_state_path(
+                args.events, args.job_ids)
+            watcher = watch.EventWatcher(
+                args.job_ids, args.events, state_path=state_path)
+        else:
+            watcher = watch.JobWatcher(args.job_ids, user=args.user)
+        if args.once:
+            polls = iter([watcher.poll()])
+        else:
+            polls = watcher.watch(args.interval, sleep=sleep or time.sleep)
+        for transitions in polls:
+            if watcher.polls > 1:
+                for transition in transitions:
+                    print(transition)
+                sys.stdout.flush()
+            if watcher.error is not None:
+                print('{0}: {1}'.format(args.prog, watcher.error),
+                      file=sys.stderr)
+            print('{0} {1}'.format(
+                time.strftime('%H:%M:%S'),
+                watch.format_counts(watcher.counts())), file=sys.stderr)
+        return 1 if 'EXIT' in watcher.states.values() else 0
+
+
+_SUBCOMMANDS = {
+    'batch': BatchMain,
+    'request': RequestMain,
+    'serve': ServeMain,
+    'unpack': UnpackMain,
+    'watch': WatchMain,
+}
+
+
 def entry_point():
     """Zero-argument entry point for use with setuptools/distribute."""
     raise SystemExit(main(sys.argv))
@@ -0,0 +1,193 @@
+""":mod:`lsf_ibutils.ibsub.matchers` -- Matching typed text to completions
+"""
+
+import bisect
+import heapq
+
+
+class PrefixMatcher(object):
+    """Case-insensitive prefix matching over a fixed list of completions.
+
+    The completions are lowercased and sorted once, so finding the matches
+    for some text is a binary search for the first match followed by a walk
+    over the rest: O(log M + k) for k matches out of M completions.
+    Completions which differ only in case keep their original order.
+    """
+    def __init__(self, completions):
+        pairs = sorted(
+            ((completion.lower(), completion) for completion in completions),
+            key=lambda pair: pair[0])
+        self._keys = [key for key, _ in pairs]
+        self._completions = [completion for _, completion in pairs]
+        # Readline asks for matches one at a time with the same text, so
+        # remember where the last search started.
+        self._last_search = (None, 0)
+
+    def __len__(self):
+        return len(self._completions)
+
+    def _start(self, text):
+        if self._last_search[0] != text:
+            self._last_search = (
+                text, bisect.bisect_left(self._keys, text.lower()))
+        return self._last_search[1]
+
+    def nth_match(self, text, n):
+        """Return the nth completion starting with ``text``, ignoring case.
+
+        :param text: the text typed so far
+        :type text: :class:`str`
+        :param n: zero-based index of the match
+        :type n: :class:`int`
+        :return: the match, or ``None`` if there are ``n`` or fewer matches
+        :rtype: :class:`str`
+        """
+        index = self._start(text) + n
+        if (index < len(self._keys) and
+                self._keys[index].startswith(text.lower())):
+            return self._completions[index]
+        return None
+
+    def matches(self, text):
+        """Return all completions starting with ``text``, ignoring case.
+
+        :param text: the text typed so far
+        :type text: :class:`str`
+        :rtype: :class:`list` of :class:`str`
+        """
+        prefix = text.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        # Every key starting with the prefix sorts before the prefix followed
+        # by the highest code point.
+        stop = bisect.bisect_left(self._keys, prefix + u'\U0010ffff', start)
+        return self._completions[start:stop]
+
+
+DEFAULT_LIMIT = 100
+"""Maximum number of completions :class:`FuzzyMatcher` offers at once."""
+
+
+def _repeats(text):
+    # Each character repeated once for each time it occurs so far, e.g.,
+    # ``a``, ``b``, ``aa`` for ``aba``.
+    counts = {}
+    for char in text:
+        counts[char] = counts.get(char, '') + char
+        yield counts[char]
+
+
+def _fuzzy_score(text, key):
+    # Lower scores rank higher. Substrings rank above scattered matches and
+    # earlier, more contiguous and shorter matches above later ones.
+    position = key.find(text)
+    if position >= 0:
+        return (1, position, len(key))
+    gaps = 0
+    first = index = None
+    for char in text:
+        found = key.find(char, 0 if index is None else index + 1)
+        if found < 0:
+            return None
+        if index is None:
+            first = found
+        elif found != index + 1:
+            gaps += 1
+        index = found
+    return (2, gaps, first, len(key))
+
+
+class FuzzyMatcher(object):
+    """Case-insensitive, ranked matching of text appearing anywhere in the
+    completions, either as a substring or as a subsequence, e.g., ``sg01``
+    matches ``SCSG0001``.
+
+    Matches are ranked prefix matches first, then substrings, then
+    subsequences. At most ``limit`` matches are returned.
+
+    Prefix matches come from a :class:`PrefixMatcher`, so short texts, which
+    have many prefix matches, never need to score the other completions.
+    Otherwise only completions containing every character of the text, at
+    least as many times as the text does, are scored. They are found by
+    intersecting the entries of an index from each character, and from each
+    run of it up to as many times as it occurs in a completion, e.g., ``00``
+    and ``000``, to the completions containing it that many times.
+
+    Subsequence matches are why the index isn't of n-grams: their characters
+    needn't be adjacent, so every completion containing the characters would
+    have to be scored anyway, and indexing trigrams too took five times as
+    long to build, which happens while the user waits at the prompt.
+    """
+    def __init__(self, completions, limit=DEFAULT_LIMIT):
+        self.limit = limit
+        self._completions = list(completions)
+        self._keys = [completion.lower() for completion in self._completions]
+        self._prefix_matcher = PrefixMatcher(self._completions)
+        postings = {}
+        for number, key in enumerate(self._keys):
+            chars = set(key)
+            for char in chars:
+                postings.setdefault(char, []).append(number)
+            if len(chars) == len(key):
+                # No character repeats.
+                continue
+            for char in chars:
+                for count in range(2, key.count(char) + 1):
+                    postings.setdefault(char * count, []).append(number)
+        self._postings = dict(
+            (repeat, frozenset(numbers))
+            for repeat, numbers in postings.items())
+        self._last_search = (None, [])
+
+    def __len__(self):
+        return len(self._completions)
+
+    def matches(self, text):
+        """Return the best completions matching ``text``, best first.
+
+        :param text: the text typed so far
+        :type text: :class:`str`
+        :rtype: :class:`list` of :class:`str`
+        """
+        if self._last_search[0] == text:
+            return self._last_search[1]
+        prefix_matches = self._prefix_matcher.matches(text)
+        ranked = heapq.nsmallest(
+            self.limit, prefix_matches,
+            key=lambda completion: (len(completion), completion.lower()))
+        if text and len(ranked) < self.limit:
+            ranked += self._other_matches(text, self.limit - len(ranked))
+        self._last_search = (text, ranked)
+        return ranked
+
+    def nth_match(self, text, n):
+        """Return the nth best completion matching ``text``.
+
+        :param text: the text typed so far
+        :type text: :class:`str`
+        :param n: zero-based index of the match
+        :type n: :class:`int`
+        :return: the match, or ``None`` if there are ``n`` or fewer matches
+        :rtype: :class:`str`
+        """
+        matches = self.matches(text)
+        return matches[n] if n < len(matches) else None
+
+    def _other_matches(self, text, limit):
+        text = text.lower()
+        # Intersect starting from the rarest character.
+        postings = sorted(
+            (self._postings.get(repeat, frozenset())
+             for repeat in set(_repeats(text))),
+            key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        scored = []
+        for number in candidates:
+            key = self._keys[number]
+            if key.startswith(text):
+                # Already a prefix match.
+                continue
+            score = _fuzzy_score(text, key)
+            if score is not None:
+                scored.append((score, key, number))
+        return [self._completions[number]
+                for _, _, number in heapq.nsmallest(limit, scored)]
@@ -1,97 +1,222 @@
 """:mod:`lsf_ibutils.ibsub.output` -- Command and script output formatting
 """
-# This function has an interesting history of being undocumented, deprecated,
-# etc. However, it seems to be portable across Python 2 and 3. See here:
-# <http://docs.python.org/2/library/pipes.html#pipes.quote>
-from pipes import quote
 import shlex
+try:
+    from cStringIO import StringIO
+except ImportError:
+    # Python 3
+    from io import StringIO
 
-import pinject
+from lsf_ibutils.ibsub import sweep as sweep_module
+from lsf_ibutils.ibsub.quoting import quote
 
 
-SYNTAXES = [
-    'bash',
-    'zsh',
-    'tcsh',
-    'ksh',
-    'python',
+TYPES = [
+    'script',
+    'command',
 ]
-"""Supported shell output syntaxes."""
+"""Supported types of output, the first being the default."""
 
 
-def build_command(flags, command):
-    """Build a bsub command string from a list of flags.
+def render_command_to(stream, flags, command):
+    """Write a bsub command built from a list of flags to a stream, without a
+    trailing newline.
 
+    :param stream: text stream to write to
+    :type stream: :class:`file`
     :param flags: a list of flags
     :type flags: :class:`list` of :class:`tuple`
     :param command: command to run, in shell syntax \
     e.g., ``"mpirun.lsf './my executable' --flag"``
     :type command: :class:`str`
-    :return: the command string
-    :rtype: :class:`str`
     """
-    quoted_args = ['bsub']
+    write = stream.write
+    write('bsub')
     for flag_tuple in flags:
         for flag in flag_tuple:
-            quoted_args.append(quote(flag))
+            write(' ')
+            write(quote(flag))
     # Command is assumed to already be in shell syntax, so it gets passed
     # through unquoted.
-    quoted_args.append(command)
-    return ' '.join(quoted_args)
+    write(' ')
+    write(command)
+
+
+def build_command(flags, command):
+    """Build a bsub command string from a list of flags.
+
+    :param flags: a list of flags
+    :type flags: :class:`list` of :class:`tuple`
+    :param command: command to run, in shell syntax \
+    e.g., ``"mpirun.lsf './my executable' --flag"``
+    :type command: :class:`str`
+    :return: the command string
+    :rtype: :class:`str`
+    """
+    stream = StringIO()
+    render_command_to(stream, flags, command)
+    return stream.getvalue()
+
+
+class ScriptTemplate(object):
+    """The fixed parts of a script in one shell syntax, formatted once and
+    reused for every script. To support another syntax, add an instance of
+    this class, or of a subclass overriding :meth:`render_command_to`, to
+    :data:`TEMPLATES`.
+    """
+    flag_prefix = '#BSUB '
+
+    def __init__(self, syntax, comments=()):
+        self.syntax = syntax
+        # The generation time is only known to BuildScript, so it is left as
+        # a format field.
+        self.header_format = ''.join(
+            ['#!/usr/bin/env {0}\n'
+             '#\n'
+             '# LSF batch script\n'.format(syntax),
+             '# Generated by ibsub on {0}\n'] +
+            ['# {0}\n'.format(comment.replace('{', '{{').replace('}', '}}'))
+             for comment in comments])
+
+    def header(self, formatted_time):
+        """Return the lines at the top of the script.
+
+        :param formatted_time: when the script was generated
+        :type formatted_time: :class:`str`
+        :rtype: :class:`str`
+        """
+        return self.header_format.format(formatted_time)
+
+    def render_command_to(self, stream, command, sweep):
+        """Write the block which runs the command.
+
+        :param stream: text stream to write to
+        :type stream: :class:`file`
+        :param command: command to run, in shell syntax
+        :type command: :class:`str`
+        :param sweep: parameter sweep, or ``None``
+        """
+        # Command is assumed to already be in shell syntax, so it gets passed
+        # through unquoted.
+        stream.write(command)
+        stream.write('\n')
+
+
+class PythonScriptTemplate(ScriptTemplate):
+    """Template for scripts in Python syntax, which run the command without a
+    shell.
+    """
+    def __init__(self):
+        super(PythonScriptTemplate, self).__init__(
+            'python', comments=['Compatible with Python >= 2.4'])
+
+    def render_command_to(self, stream, command, sweep):
+        command_list_string = repr(shlex.split(command))
+        if sweep is not None:
+            command_list_string = (
+                '[os.path.expandvars(arg) for arg in {0}]'.format(
+                    command_list_string))
+        stream.write('import subprocess\n'
+                     'subprocess.call({0})\n'.format(command_list_string))
+
+
+TEMPLATES = [
+    ScriptTemplate('bash'),
+    ScriptTemplate('zsh'),
+    ScriptTemplate('tcsh'),
+    ScriptTemplate('ksh'),
+    PythonScriptTemplate(),
+]
+"""Templates for each supported output syntax."""
+
+SYNTAXES = [template.syntax for template in TEMPLATES]
+"""Supported shell output syntaxes."""
+
+_TEMPLATES_BY_SYNTAX = dict(
+    (template.syntax, template) for template in TEMPLATES)
 
 
 class BuildScript(object):
-    @pinject.copy_args_to_internal_fields
-    def __init__(self, today_datetime):
-        pass
+    def __init__(self, get_today_datetime):
+        # Not using @pinject.copy_args_to_internal_fields keeps pinject out of
+        # the imports needed to parse command-line arguments.
+        self._get_today_datetime = get_today_datetime
+        # The time is taken for every script, so that a long-running server
+        # stamps each with its own. Scripts are often built many per second,
+        # so it is only formatted again when the second changes.
+        self._formatted_time = (None, None)
+
+    def __call__(self, flags, command, syntax, sweep=None):
+        """Build a script string from a list of flags and given syntax. See
+        :meth:`render_to` for the meaning of the arguments.
 
-    def __call__(self, flags, command, syntax):
-        """Build a script string from a list of flags and given syntax. The
-        command is assumed to already be in shell syntax, so it is passed
-        through unquoted. If using Python syntax, shell metacharacters will not
-        be recognized.
+        :return: the script as a string
+        :rtype: class:`str`
+        """
+        stream = StringIO()
+        self.render_to(stream, flags, command, syntax, sweep=sweep)
+        return stream.getvalue()
+
+    def render_to(self, stream, flags, command, syntax, sweep=None):
+        """Write a script built from a list of flags and given syntax to a
+        stream. The command is assumed to already be in shell syntax, so it
+        is passed through unquoted. If using Python syntax, shell
+        metacharacters will not be recognized.
 
+        If a sweep is given, a single job array script is built with one
+        element per point of the sweep. Each parameter of the sweep is
+        available to the command as an environment variable, e.g., ``$tasks``.
+        In Python syntax, these variables are expanded in the command's
+        arguments.
+
+        :param stream: text stream to write to
+        :type stream: :class:`file`
         :param flags: a list of flags
         :type flags: :class:`list` of :class:`tuple`
         :param syntax: shell syntax to use
-        :type syntax: :class:`str`, one of :data:`SHELLS`
+        :type syntax: :class:`str`, one of :data:`SYNTAXES`
         :param command: command to run, in shell syntax \
         e.g., ``"mpirun.lsf './my executable' --flag"``
         :type command: :class:`str`
-        :return: the script as a string
-        :rtype: class:`str`
+        :param sweep: parameter sweep, see :mod:`lsf_ibutils.ibsub.sweep`
         """
-        if syntax not in SYNTAXES:
-            raise ValueError(
-                'invalid shell syntax {0}, valid syntaxes are {1}'.format(
-                    repr(syntax),
-                    ', '.join([repr(s) for s in SYNTAXES])))
-        formatted_time = self._today_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        lines = [
-            '#!/usr/bin/env {0}'.format(syntax),
-            '#',
-            '# LSF batch script',
-            '# Generated by ibsub on {0}'.format(formatted_time),
-        ]
-
-        if syntax == 'python':
-            lines.append('# Compatible with Python >= 2.4')
-
-        lines.append('#')
+        template = _template(syntax)
+        write = stream.write
+        write(template.header(self._format_time()))
+        if sweep is not None:
+            write('# Job array over parameters: {0}\n'.format(
+                ', '.join(sweep.names)))
+            flags = sweep_module.array_flags(flags, len(sweep))
+
+        write('#\n')
+        flag_prefix = template.flag_prefix
         for flag_tuple in flags:
-            lines.append('#BSUB {0}'.format(
-                ' '.join([quote(flag) for flag in flag_tuple])))
-        lines.append('')
-
-        if syntax == 'python':
-            command_list_string = repr(shlex.split(command))
-            lines += [
-                'import subprocess',
-                "subprocess.call({0})".format(command_list_string),
-            ]
-        else:
-            # Command is assumed to already be in shell syntax, so it gets
-            # passed through unquoted.
-            lines.append(command)
-
-        return '\n'.join(lines) + '\n'
+            write(flag_prefix)
+            write(' '.join([quote(flag) for flag in flag_tuple]))
+            write('\n')
+        write('\n')
+
+        if sweep is not None:
+            for line in sweep_module.lookup_table(sweep, syntax):
+                write(line)
+                write('\n')
+            write('\n')
+
+        template.render_command_to(stream, command, sweep)
+
+    def _format_time(self):
+        now = self._get_today_datetime().replace(microsecond=0)
+        last, formatted = self._formatted_time
+        if now != last:
+            formatted = now.strftime('%Y-%m-%d %H:%M:%S')
+            self._formatted_time = (now, formatted)
+        return formatted
+
+
+def _template(syntax):
+    try:
+        return _TEMPLATES_BY_SYNTAX[syntax]
+    except KeyError:
+        raise ValueError(
+            'invalid shell syntax {0}, valid syntaxes are {1}'.format(
+                repr(syntax), ', '.join([repr(s) for s in SYNTAXES])))
@@ -0,0 +1,281 @@
+""":mod:`lsf_ibutils.ibsub.pack` -- Job scripts packed into a single file
+
+Writing one file per job is hard on the metadata servers of parallel file
+systems when a batch has many thousands of rows. Instead, ``ibsub batch`` can
+write all scripts into one archive, from which each element of a job array
+picks its own script by ``$LSB_JOBINDEX``.
+
+Two formats are supported, chosen by the archive's extension:
+
+``.tar``
+    A plain tar file with one member per script, readable by any tool.
+    Finding script N means reading the headers of the N - 1 before it.
+
+``.pack``
+    An indexed pack: a header, the scripts back to back, then a table with
+    one fixed-size entry per script and a footer locating the table. Finding
+    script N takes two seeks, regardless of the number of scripts.
+
+Scripts are numbered from 1, in the order they were added, to match
+``$LSB_JOBINDEX``. Each also records the row of the parameter file it came
+from.
+
+This module deliberately imports nothing heavy, so that unpacking a script on
+a compute node starts as quickly as possible.
+"""
+
+import io
+import os
+import re
+import struct
+import tarfile
+import tempfile
+import time
+
+FORMATS = {
+    '.tar': 'tar',
+    '.pack': 'pack',
+}
+"""Archive formats by file extension."""
+
+PACK_MAGIC = b'IBSUBPK1'
+
+# Offset and length of a script, and the row it came from.
+_ENTRY = struct.Struct('<QII')
+# Offset of the entry table, number of entries and the magic again.
+_FOOTER = struct.Struct('<QQ8s')
+
+_MEMBER_NAME_RE = re.compile(r'(\d+)\.[^.]*$')
+
+
+class PackError(Exception):
+    """Raised when an archive cannot be written or read."""
+    pass
+
+
+def archive_format(path):
+    """Return the format of an archive from its extension.
+
+    :param path: path of the archive
+    :type path: :class:`str`
+    :return: one of the values of :data:`FORMATS`
+    :rtype: :class:`str`
+    :raises PackError: if the extension isn't known
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[extension]
+    except KeyError:
+        raise PackError(
+            'unknown archive extension {0}, valid extensions are {1}'.format(
+                repr(extension),
+                ', '.join([repr(e) for e in sorted(FORMATS)])))
+
+
+class PackWriter(object):
+    """Writes scripts to an indexed pack. The entry table is kept in memory,
+    at 16 bytes per script, until the pack is closed.
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self._entries = []
+        stream.write(PACK_MAGIC)
+        self._offset = len(PACK_MAGIC)
+
+    def add(self, name, row_number, script):
+        """Add the next script.
+
+        :param name: file name of the script; not stored in packs
+        :type name: :class:`str`
+        :param row_number: row of the parameter file
+        :type row_number: :class:`int`
+        :param script: the script
+        :type script: :class:`str`
+        """
+        data = script.encode('utf-8')
+        self._stream.write(data)
+        self._entries.append(_ENTRY.pack(self._offset, len(data), row_number))
+        self._offset += len(data)
+
+    def close(self):
+        """Write the entry table and footer."""
+        self._stream.write(b''.join(self._entries))
+        self._stream.write(_FOOTER.pack(
+            self._offset, len(self._entries), PACK_MAGIC))
+
+
+class TarWriter(object):
+    """Writes scripts to a tar file, one member per script."""
+    def __init__(self, stream):
+        self._tar_file = tarfile.open(fileobj=stream, mode='w|')
+        self._mtime = time.time()
+
+    def add(self, name, row_number, script):
+        """Add the next script. See :meth:`PackWriter.add`. The row number is
+        taken from ``name`` when reading, so ``name`` must end in it.
+        """
+        data = script.encode('utf-8')
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mode = 0o755
+        info.mtime = self._mtime
+        self._tar_file.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        """Write the end-of-archive marker."""
+        self._tar_file.close()
+
+
+class PackReader(object):
+    """Reads scripts from an indexed pack."""
+    def __init__(self, stream):
+        self._stream = stream
+        if stream.read(len(PACK_MAGIC)) != PACK_MAGIC:
+            raise PackError('not an ibsub pack')
+        stream.seek(-_FOOTER.size, os.SEEK_END)
+        self._table_offset, self._count, magic = _FOOTER.unpack(
+            stream.read(_FOOTER.size))
+        if magic != PACK_MAGIC:
+            raise PackError('truncated ibsub pack')
+
+    def __len__(self):
+        return self._count
+
+    def entry(self, index):
+        """Return the row number and script with the given index.
+
+        :param index: one-based index of the script
+        :type index: :class:`int`
+        :return: tuple of (row number, script)
+        :rtype: :class:`tuple` of (:class:`int`, :class:`str`)
+        :raises PackError: if there is no such script
+        """
+        _check_index(index, self._count)
+        self._stream.seek(self._table_offset + (index - 1) * _ENTRY.size)
+        offset, length, row_number = _ENTRY.unpack(
+            self._stream.read(_ENTRY.size))
+        self._stream.seek(offset)
+        return row_number, self._stream.read(length).decode('utf-8')
+
+    def rows(self):
+        """Return the row number of every script, in order.
+
+        :rtype: :class:`list` of :class:`int`
+        """
+        self._stream.seek(self._table_offset)
+        table = self._stream.read(self._count * _ENTRY.size)
+        return [_ENTRY.unpack_from(table, position)[2]
+                for position in range(0, len(table), _ENTRY.size)]
+
+
+class TarReader(object):
+    """Reads scripts from a tar file written by :class:`TarWriter`."""
+    def __init__(self, stream):
+        try:
+            self._tar_file = tarfile.open(fileobj=stream, mode='r:')
+        except tarfile.TarError as error:
+            raise PackError('not a tar file: {0}'.format(error))
+
+    def __len__(self):
+        return len(self._tar_file.getmembers())
+
+    def entry(self, index):
+        """Return the row number and script with the given index. See
+        :meth:`PackReader.entry`.
+        """
+        if index < 1:
+            _check_index(index, len(self))
+        # Stop reading headers once the member is found.
+        count = 0
+        for info in self._tar_file:
+            count += 1
+            if count == index:
+                data = self._tar_file.extractfile(info).read()
+                return _row_number(info.name), data.decode('utf-8')
+        _check_index(index, count)
+
+    def rows(self):
+        """Return the row number of every script, in order.
+
+        :rtype: :class:`list` of :class:`int`
+        """
+        return [_row_number(info.name)
+                for info in self._tar_file.getmembers()]
+
+
+def _check_index(index, count):
+    if not 1 <= index <= count:
+        raise PackError('no script {0}, the archive has {1}'.format(
+            index, count))
+
+
+def _row_number(name):
+    match = _MEMBER_NAME_RE.search(name)
+    return None if match is None else int(match.group(1))
+
+
+def new_writer(path, stream):
+    """Create a writer for the format given by the archive's extension.
+
+    :param path: path of the archive
+    :type path: :class:`str`
+    :param stream: binary stream to write to
+    :type stream: :class:`file`
+    :rtype: :class:`PackWriter` or :class:`TarWriter`
+    :raises PackError: if the extension isn't known
+    """
+    if archive_format(path) == 'tar':
+        return TarWriter(stream)
+    return PackWriter(stream)
+
+
+def new_reader(path, stream):
+    """Create a reader for the format given by the archive's extension.
+
+    :param path: path of the archive
+    :type path: :class:`str`
+    :param stream: seekable binary stream to read from
+    :type stream: :class:`file`
+    :rtype: :class:`PackReader` or :class:`TarReader`
+    :raises PackError: if the extension isn't known or the archive is invalid
+    """
+    if archive_format(path) == 'tar':
+        return TarReader(stream)
+    return PackReader(stream)
+
+
+def interpreter_args(script):
+    """Return the arguments of the interpreter named by a script's ``#!``
+    line, e.g., ``['/usr/bin/env', 'bash']``.
+
+    :param script: the script
+    :type script: :class:`str`
+    :rtype: :class:`list` of :class:`str`
+    :raises PackError: if the script has no ``#!`` line
+    """
+    first_line = script.split('\n', 1)[0]
+    if not first_line.startswith('#!') or not first_line[2:].strip():
+        raise PackError('script has no #! line')
+    return first_line[2:].split()
+
+
+def exec_script(script):
+    """Replace the current process with the interpreter running a script,
+    without leaving the script behind in a file.
+
+    The script is written to an unlinked temporary file which the interpreter
+    reads through ``/dev/fd``, so this only works on systems which have it,
+    e.g., Linux.
+
+    :param script: the script
+    :type script: :class:`str`
+    """
+    args = interpreter_args(script)
+    with tempfile.TemporaryFile() as script_file:
+        script_file.write(script.encode('utf-8'))
+        script_file.flush()
+        script_file.seek(0)
+        fd = os.dup(script_file.fileno())
+    if hasattr(os, 'set_inheritable'):
+        os.set_inheritable(fd, True)
+    os.execv(args[0], args + ['/dev/fd/{0}'.format(fd)])
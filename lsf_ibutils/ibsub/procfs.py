@@ -0,0 +1,115 @@
+""":mod:`lsf_ibutils.ibsub.procfs` -- Process information from Linux /proc
+
+A small, fast subset of what psutil offers, read directly from the proc
+file system. Functions return ``None`` for processes which don't exist or
+can't be read, rather than raising.
+"""
+
+import os
+
+PROC_ROOT = '/proc'
+"""Where the proc file system is mounted."""
+
+
+def available(root=PROC_ROOT):
+    """Return whether process information can be read from ``root``.
+
+    :param root: mount point of the proc file system
+    :type root: :class:`str`
+    :rtype: :class:`bool`
+    """
+    return os.path.exists(os.path.join(root, str(os.getpid()), 'stat'))
+
+
+def read_stat(pid, root=PROC_ROOT):
+    """Read the name and parent of a process from ``/proc/<pid>/stat``.
+
+    :param pid: the process ID
+    :type pid: :class:`int`
+    :param root: mount point of the proc file system
+    :type root: :class:`str`
+    :return: tuple of (name, parent process ID), or ``None``
+    :rtype: :class:`tuple` of (:class:`str`, :class:`int`)
+    """
+    try:
+        with open(os.path.join(root, str(pid), 'stat')) as stat_file:
+            stat = stat_file.read()
+    except (IOError, OSError):
+        return None
+    # The name is in parentheses and may itself contain spaces and
+    # parentheses, so split around the last closing parenthesis. The fields
+    # after it are the state, then the parent process ID.
+    before, _, after = stat.rpartition(')')
+    try:
+        name = before.split('(', 1)[1]
+        parent_pid = int(after.split()[1])
+    except (IndexError, ValueError):
+        return None
+    return name, parent_pid
+
+
+def read_comm(pid, root=PROC_ROOT):
+    """Read the name of a process from ``/proc/<pid>/comm``, which is
+    cheaper to parse than :func:`read_stat`.
+
+    :param pid: the process ID
+    :type pid: :class:`int`
+    :param root: mount point of the proc file system
+    :type root: :class:`str`
+    :return: the name, truncated by the kernel to 15 characters, or ``None``
+    :rtype: :class:`str`
+    """
+    try:
+        with open(os.path.join(root, str(pid), 'comm')) as comm_file:
+            return comm_file.read().rstrip('\n')
+    except (IOError, OSError):
+        return None
+
+
+def read_exe(pid, root=PROC_ROOT):
+    """Read the path of the executable of a process.
+
+    :param pid: the process ID
+    :type pid: :class:`int`
+    :param root: mount point of the proc file system
+    :type root: :class:`str`
+    :return: the path, or ``None`` if it can't be read, e.g., for other \
+    users' processes
+    :rtype: :class:`str`
+    """
+    try:
+        return os.readlink(os.path.join(root, str(pid), 'exe'))
+    except (IOError, OSError):
+        return None
+
+
+def ancestors(max_depth, pid=None, root=PROC_ROOT):
+    """Yield the ancestors of a process, nearest first.
+
+    Each ancestor is named after the base name of its executable, like
+    psutil's ``exe``, or by its name in ``stat`` if the executable can't be
+    read.
+
+    :param max_depth: maximum number of ancestors to yield
+    :type max_depth: :class:`int`
+    :param pid: the process whose ancestors to yield (default: this one)
+    :type pid: :class:`int`
+    :param root: mount point of the proc file system
+    :type root: :class:`str`
+    :return: iterator of (depth, pid, name) tuples, the parent having \
+    depth 1
+    :rtype: iterator of :class:`tuple`
+    """
+    if pid is None:
+        pid = os.getpid()
+    stat = read_stat(pid, root)
+    for depth in range(1, max_depth + 1):
+        # PID 0 is the parent of init and kernel threads; it has no entry.
+        if stat is None or stat[1] <= 0:
+            return
+        pid = stat[1]
+        stat = read_stat(pid, root)
+        if stat is None:
+            return
+        exe = read_exe(pid, root)
+        yield depth, pid, stat[0] if exe is None else os.path.basename(exe)
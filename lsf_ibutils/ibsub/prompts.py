@@ -3,11 +3,13 @@
 
 from __future__ import print_function
 
+import inspect
+
 import pinject
 
-from lsf_ibutils import ibsub
 # Import completers module for the sake of pinject being able to find it.
 from lsf_ibutils.ibsub import completers  # NOQA
+from lsf_ibutils.ibsub import hosts, queues
 
 # The two options for specifying flags are declarative and imperative. After
 # trying the declarative approach initially, we made the decision that no
@@ -17,6 +19,13 @@ from lsf_ibutils.ibsub import completers  # NOQA
 # library functions.
 
 
+class PromptError(Exception):
+    """Raised when no answer to a prompt can be valid, e.g., when no queue
+    can run the job.
+    """
+    pass
+
+
 class Prompt(object):
     """Class from which other prompts should inherit."""
     @pinject.copy_args_to_internal_fields
@@ -30,6 +39,7 @@ class Prompt(object):
         :type values: :class:`dict`
         :return: a tuple of (value, flags)
         :rtype: :class:`tuple` of (:class:`str`, :class:`list` of :class:`str`)
+        :raises PromptError: if no answer can be valid
         """
         raise NotImplementedError()
 
@@ -50,7 +60,10 @@ class ProjectCode(Prompt):
     def __call__(self, values):
         text = self._simple_prompt(
             'Project code',
-            completions=self._get_group_completions())
+            completions=self._get_group_completions(),
+            # Project codes are long and alike, e.g., SCSG0001, so match
+            # what the user remembers of them anywhere.
+            fuzzy=True)
         return (text, ['-P', text])
 
 
@@ -70,15 +83,47 @@ class TasksPerJob(Prompt):
 
 
 class TasksPerNode(Prompt):
-    """Prompt for the number of MPI tasks to run on each node."""
-    def __init__(self, simple_prompt, validate_positive_integer):
+    """Prompt for the number of MPI tasks to run on each node. The hint
+    suggests the number packing the job's tasks onto the fewest full nodes.
+    It is only a hint: a blank answer still leaves the placement to LSF, so
+    that piped answers and batch rows mean the same whether or not the
+    hosts are known. The queue isn't known yet, so nodes are assumed to be
+    the most common size among the queues available to the user;
+    :class:`QueueName` then only accepts queues with nodes large enough.
+    """
+    def __init__(self, simple_prompt, validate_positive_integer,
+                 get_queue_completions, get_queue_topology):
         self._simple_prompt = simple_prompt
         self._validator = validate_positive_integer
+        self._get_queue_completions = get_queue_completions
+        self._get_queue_topology = get_queue_topology
+        self._slots_cache = (None, None, None)
+
+    def _slots_per_host(self):
+        queue_names = self._get_queue_completions()
+        topology = self._get_queue_topology()
+        cached_names, cached_topology, slots_per_host = self._slots_cache
+        # The completers return the same objects until they are refreshed,
+        # so only count hosts again when that happens.
+        if queue_names is not cached_names or topology is not cached_topology:
+            slots_per_host = hosts.typical_slots(
+                topology[name] for name in queue_names if name in topology)
+            self._slots_cache = (queue_names, topology, slots_per_host)
+        return slots_per_host
 
     def __call__(self, values):
+        format_ = 'positive number'
+        tasks = values.get(TasksPerJob)
+        if tasks is not None:
+            slots_per_host = self._slots_per_host()
+            if slots_per_host is not None:
+                format_ = ('positive number, nodes have {0} slots, {1} uses '
+                           'the fewest').format(
+                               slots_per_host,
+                               hosts.suggest_ptile(int(tasks), slots_per_host))
         text = self._simple_prompt(
             'Tasks per node',
-            format_='positive number',
+            format_=format_,
             validator=self._validator)
         return (text, ['-R', 'span[ptile={0}]'.format(text)])
 
@@ -99,28 +144,86 @@ class WallClockTime(Prompt):
 
 
 class QueueName(Prompt):
-    """Prompt for the job queue name."""
+    """Prompt for the job queue name. The queue must accept the number of
+    tasks and wall clock time already answered, and have nodes with enough
+    slots for the tasks per node, so that jobs LSF would reject or never
+    dispatch are caught before any output is produced.
+    """
     @pinject.copy_args_to_internal_fields
-    def __init__(self, simple_prompt, get_queue_completions):
+    def __init__(self, simple_prompt, get_queue_completions, get_queue_limits,
+                 get_queue_loads, get_queue_topology, validate_queue_limits):
         pass
 
-    def _validator(self, text):
-        # TODO Remove this validator from inside this class
-        return text in self._get_queue_completions()
-
-    def __call__(self, args_thus_far):
+    def __call__(self, values):
+        queue_names = self._get_queue_completions()
+        queue_limits = self._get_queue_limits()
+        tasks = values.get(TasksPerJob)
+        wall_clock_time = values.get(WallClockTime)
+        ptile = values.get(TasksPerNode)
+        # Only look up hosts when the job asks for a number per node.
+        topology = {} if ptile is None else self._get_queue_topology()
+
+        def fits_hosts(text):
+            return text not in topology or topology[text].allows_ptile(
+                int(ptile))
+
+        def validator(text):
+            return (text in queue_names and not self._validate_queue_limits(
+                queue_limits.get(text), tasks, wall_clock_time) and
+                fits_hosts(text))
+
+        message = 'Queue'
+        format_ = None
+        # This is hard-coded to our particular machine, but it seems like a
+        # reasonable default everywhere.
+        default = 'regular'
+        if queue_limits or topology:
+            # Only offer the queues which can run the job, and say why.
+            queue_names = [name for name in queue_names if validator(name)]
+            job_size = _describe_job_size(tasks, ptile, wall_clock_time)
+            if not queue_names:
+                raise PromptError('no queue allows {0}'.format(
+                    job_size or 'this job'))
+            if job_size is not None:
+                format_ = 'one allowing {0}'.format(job_size)
+            if default not in queue_names:
+                # The default is taken without validation, so it must be
+                # one of the queues which fit.
+                default = None
+            # Only recommend queues whose limits are known to fit the job.
+            recommended = queues.recommend_queue(
+                [name for name in queue_names if name in queue_limits],
+                self._get_queue_loads(), default=default)
+            if recommended is not None:
+                default = recommended.name
+                message = 'Queue, {0} is least busy with {1}'.format(
+                    recommended.name, recommended.describe())
         text = self._simple_prompt(
-            'Queue',
+            message,
+            format_=format_,
             required=True,
-            validator=self._validator,
-            # This is hard-coded to our particular machine, but it seems like a
-            # reasonable default everywhere.
-            default='regular',
-            completions=self._get_queue_completions(),
+            validator=validator,
+            default=default,
+            completions=queue_names,
         )
         return (text, ['-q', text])
 
 
+def _describe_job_size(tasks, ptile, wall_clock_time):
+    parts = []
+    if tasks is not None:
+        parts.append('{0} tasks'.format(tasks))
+    if ptile is not None:
+        parts.append(('at {0} per node' if parts else
+                      '{0} tasks per node').format(ptile))
+    if wall_clock_time is not None:
+        parts.append('for {0}'.format(queues.format_minutes(
+            queues.duration_minutes(wall_clock_time))))
+    if not parts:
+        return None
+    return ' '.join(parts)
+
+
 class OutputFileName(Prompt):
     def __call__(self, values):
         try:
@@ -219,10 +322,60 @@ class PromptCommand(object):
         return self._simple_prompt('Command to run', required=True)
 
 
-class ExecPrompts(object):
-    @pinject.copy_args_to_internal_fields
-    def __init__(self, prompt_class_list, simple_prompt):
-        pass
+def _init_arg_names(class_):
+    try:
+        getargspec = inspect.getfullargspec
+    except AttributeError:
+        # Python 2
+        getargspec = inspect.getargspec
+    # Skip `self'.
+    return getargspec(class_.__init__).args[1:]
+
+
+class PromptPipeline(object):
+    """The prompts to execute, in order, each already constructed with its
+    dependencies.
+
+    Compiling the pipeline once lets every run skip dependency resolution,
+    which costs more than answering the prompts when they aren't interactive.
+    """
+    def __init__(self, prompts):
+        """
+        :param prompts: list of (prompt class, prompt) tuples in order
+        :type prompts: :class:`list` of :class:`tuple`
+        """
+        self.prompts = prompts
+
+    @classmethod
+    def compile(cls, prompt_classes, dependencies):
+        """Construct each prompt, passing constructor arguments by name from
+        ``dependencies``. This is the same convention pinject uses, but
+        without going through the object graph.
+
+        :param prompt_classes: prompt classes in order
+        :type prompt_classes: :class:`list` of :class:`type`
+        :param dependencies: map of constructor argument name to value
+        :type dependencies: :class:`dict`
+        :rtype: :class:`PromptPipeline`
+        :raises ValueError: if a constructor needs a missing dependency
+        """
+        prompts = []
+        for prompt_class in prompt_classes:
+            kwargs = {}
+            for name in _init_arg_names(prompt_class):
+                try:
+                    kwargs[name] = dependencies[name]
+                except KeyError:
+                    raise ValueError('{0} needs missing dependency {1}'.format(
+                        prompt_class.__name__, repr(name)))
+            prompts.append((prompt_class, prompt_class(**kwargs)))
+        return cls(prompts)
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def __iter__(self):
+        return iter(self.prompts)
 
     def __call__(self):
         """Execute all prompts.
@@ -230,14 +383,26 @@ class ExecPrompts(object):
         :return: nested list of flags for each prompt
         :rtype: :class:`list` of :class:`list` of :class:`str`
         """
-        # XXX TODO Untested
         values = {}
         flags_list = []
-        for prompt_class in self._prompt_class_list:
-            prompt = ibsub.obj_graph.provide(prompt_class)
+        for prompt_class, prompt in self.prompts:
             value, flags = prompt(values)
             if value is None:
                 continue
             values[prompt_class] = value
             flags_list.append(flags)
         return flags_list
+
+
+class ExecPrompts(object):
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, prompt_pipeline):
+        pass
+
+    def __call__(self):
+        """Execute all prompts.
+
+        :return: nested list of flags for each prompt
+        :rtype: :class:`list` of :class:`list` of :class:`str`
+        """
+        return self._prompt_pipeline()
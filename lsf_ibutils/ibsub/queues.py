@@ -0,0 +1,350 @@
+""":mod:`lsf_ibutils.ibsub.queues` -- Queue limits and load from `bqueues'
+"""
+
+import bisect
+import re
+
+_MEMORY_UNITS_MB = {
+    'K': 1.0 / 1024,
+    'KB': 1.0 / 1024,
+    'M': 1,
+    'MB': 1,
+    'G': 1024,
+    'GB': 1024,
+    'T': 1024 * 1024,
+    'TB': 1024 * 1024,
+}
+
+# Limits are given as a line naming one or more limits, e.g.,
+# ``CPULIMIT  RUNLIMIT``, followed by a line of values aligned below them.
+_LIMIT_SUFFIX = 'LIMIT'
+
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+_TOKEN_RE = re.compile(r'\S+')
+
+
+class QueueLimits(object):
+    """Limits of an LSF queue on the jobs it accepts. Limits are ``None`` if
+    the queue doesn't set them.
+
+    Run limits are in minutes and the memory limit in megabytes. ``hosts``
+    is ``None`` if all hosts are allowed; host group names in it end in a
+    slash.
+    """
+    def __init__(self, name, run_limit=None, default_run_limit=None,
+                 min_tasks=None, default_tasks=None, max_tasks=None,
+                 mem_limit=None, max_slots=None, max_slots_per_user=None,
+                 hosts=None):
+        self.name = name
+        self.run_limit = run_limit
+        self.default_run_limit = default_run_limit
+        self.min_tasks = min_tasks
+        self.default_tasks = default_tasks
+        self.max_tasks = max_tasks
+        self.mem_limit = mem_limit
+        self.max_slots = max_slots
+        self.max_slots_per_user = max_slots_per_user
+        self.hosts = hosts
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Create limits from the result of :meth:`to_dict`. Fields this
+        version doesn't know, e.g., from a cache written by another version,
+        are ignored.
+
+        :param fields: the limits
+        :type fields: :class:`dict`
+        :rtype: :class:`QueueLimits`
+        """
+        limits = cls(fields['name'])
+        for key in vars(limits):
+            if key in fields:
+                setattr(limits, key, fields[key])
+        return limits
+
+    def to_dict(self):
+        """Return the limits as a JSON-serializable dictionary.
+
+        :rtype: :class:`dict`
+        """
+        return dict(vars(self))
+
+    @property
+    def task_limit(self):
+        """The most tasks a job in this queue can have, taking slot limits
+        into account, or ``None`` if unlimited.
+        """
+        limits = [limit for limit in (
+            self.max_tasks, self.max_slots, self.max_slots_per_user)
+            if limit is not None]
+        return min(limits) if limits else None
+
+    def problems(self, tasks=None, wall_clock_time=None):
+        """Check a job's answers against the limits. See
+        :func:`validate_answers`.
+        """
+        problems = []
+        if tasks is not None:
+            tasks = int(tasks)
+            task_limit = self.task_limit
+            if task_limit is not None and tasks > task_limit:
+                problems.append('{0} allows at most {1} tasks'.format(
+                    self.name, task_limit))
+            if self.min_tasks is not None and tasks < self.min_tasks:
+                problems.append('{0} needs at least {1} tasks'.format(
+                    self.name, self.min_tasks))
+        if (wall_clock_time is not None and self.run_limit is not None and
+                duration_minutes(wall_clock_time) > self.run_limit):
+            problems.append('{0} allows at most {1} of wall clock '
+                            'time'.format(
+                                self.name, format_minutes(self.run_limit)))
+        return problems
+
+
+class QueueLoad(object):
+    """Jobs in an LSF queue, as counted by `bqueues'."""
+    def __init__(self, name, status='Open:Active', jobs=0, pending=0,
+                 running=0, suspended=0):
+        self.name = name
+        self.status = status
+        self.jobs = jobs
+        self.pending = pending
+        self.running = running
+        self.suspended = suspended
+
+    @property
+    def is_open(self):
+        """Whether the queue accepts and dispatches jobs."""
+        return self.status == 'Open:Active'
+
+    @property
+    def expected_wait(self):
+        """Rough measure of how long a new job waits: the number of pending
+        jobs ahead of it per running job, which approximates how many rounds
+        of running jobs must finish first.
+        """
+        return float(self.pending) / max(self.running, 1)
+
+    def describe(self):
+        """Describe the load, e.g., ``'3000 pending, 2000 running'``.
+
+        :rtype: :class:`str`
+        """
+        return '{0} pending, {1} running'.format(self.pending, self.running)
+
+
+def recommend_queue(candidates, queue_loads, default=None):
+    """Recommend the queue in which a job is expected to wait least. This
+    only compares numbers already fetched, so it is cheap enough to run for
+    every prompt.
+
+    :param candidates: names of the queues able to run the job
+    :type candidates: iterable of :class:`str`
+    :param queue_loads: mapping of queue name to load
+    :type queue_loads: :class:`dict` of :class:`str` to :class:`QueueLoad`
+    :param default: queue to prefer when the expected waits are equal
+    :type default: :class:`str`
+    :return: load of the recommended queue, or ``None`` if no candidate is \
+    open
+    :rtype: :class:`QueueLoad`
+    """
+    best_key = best = None
+    for name in candidates:
+        load = queue_loads.get(name)
+        if load is None or not load.is_open:
+            continue
+        key = (load.expected_wait, name != default, name)
+        if best is None or key < best_key:
+            best_key, best = key, load
+    return best
+
+
+def validate_answers(limits, tasks=None, wall_clock_time=None):
+    """Check a job's answers against the limits of its queue.
+
+    :param limits: limits of the queue, or ``None`` if they aren't known
+    :type limits: :class:`QueueLimits`
+    :param tasks: number of tasks, as answered to ``TasksPerJob``
+    :type tasks: :class:`str`
+    :param wall_clock_time: wall clock time limit, as answered to \
+    ``WallClockTime``
+    :type wall_clock_time: :class:`str`
+    :return: descriptions of the limits the job exceeds
+    :rtype: :class:`list` of :class:`str`
+    """
+    if limits is None:
+        # Without limits, leave it to bsub to decide.
+        return []
+    return limits.problems(tasks, wall_clock_time)
+
+
+def duration_minutes(text):
+    """Convert a duration in the format accepted by ``bsub -W`` to minutes.
+
+    :param text: ``hours:minutes`` or ``minutes``
+    :type text: :class:`str`
+    :rtype: :class:`int`
+    """
+    hours, _, minutes = text.rpartition(':')
+    return int(hours or 0) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    """Format minutes in the format accepted by ``bsub -W``.
+
+    :param minutes: the duration
+    :type minutes: :class:`float`
+    :rtype: :class:`str`
+    """
+    return '{0}:{1:02d}'.format(*divmod(int(minutes), 60))
+
+
+def _numbers(text):
+    return [float(number) for number in _NUMBER_RE.findall(text)]
+
+
+def _parse_memory(text):
+    tokens = text.split()
+    if not tokens:
+        return None
+    try:
+        amount = float(tokens[0])
+    except ValueError:
+        return None
+    # Without a unit, LSF defaults to kilobytes.
+    unit = tokens[1].upper() if len(tokens) > 1 else 'K'
+    return int(amount * _MEMORY_UNITS_MB.get(unit, 1.0 / 1024))
+
+
+def _parse_slot_limit(text):
+    return None if text == '-' else int(float(text))
+
+
+def _parse_names(text):
+    names = text.split()
+    return None if names in ([], ['all']) else names
+
+
+def _set_limit(fields, name, values, is_default):
+    if name == 'RUNLIMIT':
+        numbers = _numbers(values)
+        if numbers:
+            key = 'default_run_limit' if is_default else 'run_limit'
+            fields[key] = numbers[0]
+    elif name in ('PROCLIMIT', 'TASKLIMIT'):
+        numbers = [int(number) for number in _numbers(values)]
+        if is_default:
+            if numbers:
+                fields['default_tasks'] = numbers[0]
+        elif len(numbers) == 1:
+            fields['max_tasks'] = numbers[0]
+        elif len(numbers) == 2:
+            fields['min_tasks'], fields['max_tasks'] = numbers
+        elif len(numbers) >= 3:
+            (fields['min_tasks'], fields['default_tasks'],
+             fields['max_tasks']) = numbers[:3]
+    elif name == 'MEMLIMIT' and not is_default:
+        fields['mem_limit'] = _parse_memory(values)
+
+
+class _QueueLimitsParser(object):
+    """Limits of each queue, read from `bqueues -l' output a line at a
+    time.
+    """
+    def __init__(self):
+        self.queues = {}
+        # Fields of the queue being read.
+        self._fields = None
+        self._table_header = None
+        # Start column and name of each limit in the last header line.
+        self._limit_columns = None
+        self._is_default = False
+        self._prefix_handlers = [
+            ('DEFAULT LIMITS', self._start_default_limits),
+            ('MAXIMUM LIMITS', self._start_maximum_limits),
+            ('PRIO ', self._start_table),
+            ('HOSTS:', self._set_hosts),
+        ]
+
+    def add_line(self, line):
+        stripped = line.strip()
+        if stripped.startswith('QUEUE:'):
+            self._start_queue(stripped[len('QUEUE:'):].strip())
+        elif self._fields is not None and stripped:
+            self._add_queue_line(line.expandtabs(), stripped)
+
+    def _start_queue(self, name):
+        self._fields = self.queues[name] = QueueLimits(name).to_dict()
+        self._table_header = self._limit_columns = None
+        self._is_default = False
+
+    def _add_queue_line(self, line, stripped):
+        if self._limit_columns is not None:
+            self._set_limits(line)
+            self._limit_columns = None
+            return
+        columns = [(match.start(), match.group())
+                   for match in _TOKEN_RE.finditer(line)]
+        if all(name.endswith(_LIMIT_SUFFIX) for _, name in columns):
+            self._limit_columns = columns
+            return
+        for prefix, handler in self._prefix_handlers:
+            if stripped.startswith(prefix):
+                handler(stripped)
+                return
+        if self._table_header is not None:
+            self._set_slot_limits(stripped)
+
+    def _set_limits(self, line):
+        starts = [start for start, _ in self._limit_columns]
+        values = [[] for _ in starts]
+        for match in _TOKEN_RE.finditer(line):
+            # Each value belongs to the limit named at or before its start.
+            column = max(bisect.bisect_right(starts, match.start()) - 1, 0)
+            values[column].append(match.group())
+        for (_, name), tokens in zip(self._limit_columns, values):
+            if tokens:
+                _set_limit(self._fields, name, ' '.join(tokens),
+                           self._is_default)
+
+    def _start_default_limits(self, stripped):
+        self._is_default = True
+
+    def _start_maximum_limits(self, stripped):
+        self._is_default = False
+
+    def _start_table(self, stripped):
+        self._table_header = stripped.split()
+
+    def _set_slot_limits(self, stripped):
+        row = dict(zip(self._table_header, stripped.split()))
+        self._table_header = None
+        try:
+            self._fields['max_slots'] = _parse_slot_limit(row.get('MAX', '-'))
+            self._fields['max_slots_per_user'] = _parse_slot_limit(
+                row.get('JL/U', '-'))
+        except ValueError:
+            pass
+
+    def _set_hosts(self, stripped):
+        self._fields['hosts'] = _parse_names(stripped[len('HOSTS:'):])
+
+
+def parse_queue_limits(lines):
+    """Parse the limits of every queue from the output of `bqueues -l'.
+
+    Lines are consumed one at a time. The result only contains dictionaries
+    of numbers and strings, so it can be cached as JSON; use
+    :meth:`QueueLimits.from_dict` to turn an entry into :class:`QueueLimits`.
+
+    :param lines: output lines
+    :type lines: iterator of :class:`str`
+    :return: mapping of queue name to the result of \
+    :meth:`QueueLimits.to_dict`
+    :rtype: :class:`dict`
+    """
+    parser = _QueueLimitsParser()
+    for line in lines:
+        parser.add_line(line)
+    return parser.queues
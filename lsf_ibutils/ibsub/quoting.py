@@ -0,0 +1,111 @@
+""":mod:`lsf_ibutils.ibsub.quoting` -- Shell quoting
+"""
+
+import collections
+import re
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2
+    lru_cache = None
+
+DEFAULT_MAXSIZE = 1024
+"""Default number of quoted strings remembered by :func:`make_quoter`."""
+
+# The same characters that pipes.quote and shlex.quote leave unquoted.
+_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_@%+=:,./-]')
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+"""Statistics of a quoter, as returned by its ``cache_info`` method."""
+
+
+def quote_uncached(string):
+    """Quote a string for use as one word in a POSIX shell command line. The
+    result is the same as that of :func:`pipes.quote`, which is removed in
+    Python 3.13. Strings made only of safe characters are returned as is.
+
+    :param string: the string to quote
+    :type string: :class:`str`
+    :return: the quoted string
+    :rtype: :class:`str`
+    """
+    if not string:
+        return "''"
+    if _UNSAFE_RE.search(string) is None:
+        return string
+    # Close the single quotes, put the single quote itself in double quotes,
+    # then reopen them.
+    return "'" + string.replace("'", "'\"'\"'") + "'"
+
+
+def _lru_quoter(maxsize):
+    # Python 2 equivalent of lru_cache(maxsize)(quote_uncached).
+    quoted_strings = collections.OrderedDict()
+    stats = {'hits': 0, 'misses': 0}
+
+    def quote(string):
+        quoted = quoted_strings.pop(string, None)
+        if quoted is None:
+            stats['misses'] += 1
+            quoted = quote_uncached(string)
+            if len(quoted_strings) >= maxsize:
+                # Evict the least recently used string.
+                quoted_strings.popitem(last=False)
+        else:
+            stats['hits'] += 1
+        # Reinserting marks the string as most recently used.
+        quoted_strings[string] = quoted
+        return quoted
+
+    def cache_info():
+        return CacheInfo(stats['hits'], stats['misses'], maxsize,
+                         len(quoted_strings))
+
+    def cache_clear():
+        quoted_strings.clear()
+        stats.update(hits=0, misses=0)
+
+    quote.cache_info = cache_info
+    quote.cache_clear = cache_clear
+    return quote
+
+
+def make_quoter(maxsize=DEFAULT_MAXSIZE):
+    """Return a function quoting strings like :func:`quote_uncached` which
+    remembers the ``maxsize`` most recently used results.
+
+    Flag values such as queues, projects and output file patterns repeat for
+    every job in a batch, so most of them are quoted many times. Looking them
+    up is faster than even checking whether they need quotes, so every string
+    goes through the cache.
+
+    The function has ``cache_info`` and ``cache_clear`` methods, as if made by
+    :func:`functools.lru_cache`.
+
+    :param maxsize: number of strings to remember
+    :type maxsize: :class:`int`
+    :rtype: :class:`function`
+    """
+    if lru_cache is None:
+        return _lru_quoter(maxsize)
+    return lru_cache(maxsize)(quote_uncached)
+
+
+def format_cache_info(cache_info):
+    """Format the statistics of a quoter on one line.
+
+    :param cache_info: result of the quoter's ``cache_info`` method
+    :type cache_info: :class:`CacheInfo`
+    :rtype: :class:`str`
+    """
+    lookups = cache_info.hits + cache_info.misses
+    return 'hits={0} misses={1} size={2}/{3} hit_rate={4}'.format(
+        cache_info.hits, cache_info.misses, cache_info.currsize,
+        cache_info.maxsize,
+        '{0:.1%}'.format(float(cache_info.hits) / lookups)
+        if lookups else '-')
+
+
+quote = make_quoter()
+"""Quoter shared by everything rendering shell commands and scripts."""
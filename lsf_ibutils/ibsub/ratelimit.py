@@ -0,0 +1,127 @@
+""":mod:`lsf_ibutils.ibsub.ratelimit` -- Adaptive concurrency for LSF commands
+"""
+
+import collections
+import threading
+import time
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at the given fraction of a sorted list, using the
+    nearest-rank method.
+
+    :param sorted_values: values in ascending order
+    :type sorted_values: :class:`list`
+    :param fraction: between 0 and 1, e.g., 0.9 for the 90th percentile
+    :type fraction: :class:`float`
+    :return: the percentile, or ``None`` for an empty list
+    """
+    if not sorted_values:
+        return None
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def format_metrics(metrics):
+    """Format the result of :meth:`AdaptiveLimiter.metrics` on one line.
+
+    :param metrics: the metrics
+    :type metrics: :class:`dict`
+    :rtype: :class:`str`
+    """
+    def seconds(value):
+        return '-' if value is None else '{0:.3f}s'.format(value)
+    return ('concurrency {limit}, {rate:.2f} commands/s, '
+            '{error_rate:.1%} errors, latency p50 {p50} p90 {p90} '
+            'p99 {p99}'.format(
+                p50=seconds(metrics['latency_p50']),
+                p90=seconds(metrics['latency_p90']),
+                p99=seconds(metrics['latency_p99']),
+                **metrics))
+
+
+class AdaptiveLimiter(object):
+    """Limits the number of concurrent LSF commands using additive-increase,
+    multiplicative-decrease (AIMD) control.
+
+    Each command which finishes under the target latency without error
+    raises the limit by ``1 / limit``, i.e., by about one for every ``limit``
+    commands. A slow or failed command multiplies the limit by ``decrease``,
+    at most once per ``limit`` completions so that a burst of slow commands
+    which were all started at the old limit only backs off once.
+    """
+    def __init__(self, initial=2, minimum=1, maximum=16, target_latency=1.0,
+                 decrease=0.5, window=200, clock=time.time):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._errors = collections.deque(maxlen=window)
+        self._completed = 0
+        self._completed_at_decrease = 0
+        self._clock = clock
+        self._start = clock()
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """The current maximum number of concurrent commands."""
+        return int(self._limit)
+
+    def acquire(self):
+        """Block until another command may be started."""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency, error=False):
+        """Record the outcome of a command started after :meth:`acquire`.
+
+        :param latency: seconds the command took
+        :type latency: :class:`float`
+        :param error: whether the command failed in a way that suggests LSF \
+        is overloaded
+        :type error: :class:`bool`
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._completed += 1
+            self._latencies.append(latency)
+            self._errors.append(error)
+            if error or latency > self.target_latency:
+                if (self._completed - self._completed_at_decrease >=
+                        self.limit):
+                    self._limit = max(
+                        self.minimum, self._limit * self.decrease)
+                    self._completed_at_decrease = self._completed
+            else:
+                self._limit = min(
+                    self.maximum, self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+    def metrics(self):
+        """Return a snapshot of the limiter's state: the current limit,
+        commands in flight, overall completion rate per second, error rate
+        and latency percentiles over the recent window.
+
+        :rtype: :class:`dict`
+        """
+        with self._condition:
+            latencies = sorted(self._latencies)
+            errors = list(self._errors)
+            elapsed = self._clock() - self._start
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rate': self._completed / elapsed if elapsed > 0 else 0.0,
+                'error_rate': (float(sum(errors)) / len(errors)
+                               if errors else 0.0),
+                'latency_p50': percentile(latencies, 0.5),
+                'latency_p90': percentile(latencies, 0.9),
+                'latency_p99': percentile(latencies, 0.99),
+            }
@@ -0,0 +1,206 @@
+""":mod:`lsf_ibutils.ibsub.runner` -- Running LSF commands
+"""
+
+import collections
+import hashlib
+import os
+import subprocess
+import threading
+import time
+
+DEFAULT_TIMEOUT = 30
+"""Seconds after which a query to LSF is abandoned. LSF commands hang for as
+long as mbatchd is unresponsive, which can be forever.
+"""
+
+
+class CommandError(Exception):
+    """Raised when an LSF command cannot be run, fails or times out."""
+    pass
+
+
+class CommandResult(object):
+    """Outcome of running an LSF command.
+
+    ``returncode`` is ``None`` if the command could not be started at all, in
+    which case ``output`` holds the reason.
+    """
+    def __init__(self, args, returncode, output, seconds, timed_out=False):
+        self.args = args
+        self.returncode = returncode
+        self.output = output
+        self.seconds = seconds
+        self.timed_out = timed_out
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+
+class _Timeout(object):
+    """Kills a process if it is still running after a number of seconds."""
+    def __init__(self, proc, seconds):
+        self.expired = False
+        self._timer = None
+        if seconds is not None:
+            self._proc = proc
+            self._timer = threading.Timer(seconds, self._kill)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _kill(self):
+        self.expired = True
+        try:
+            self._proc.kill()
+        except OSError:
+            # Already exited.
+            pass
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+def run(args, input=None, shell=False, timeout=None):
+    """Run an LSF command, collecting its combined standard output and
+    standard error and measuring how long it took.
+
+    :param args: command arguments, or a command line if ``shell`` is true
+    :type args: :class:`list` of :class:`str`
+    :param input: text to pass to the command on standard input
+    :type input: :class:`str`
+    :param shell: whether to run ``args`` through the shell
+    :type shell: :class:`bool`
+    :param timeout: seconds after which the command is killed, or ``None``
+    :type timeout: :class:`float`
+    :return: the result
+    :rtype: :class:`CommandResult`
+    """
+    start = time.time()
+    try:
+        proc = subprocess.Popen(
+            args, shell=shell, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as error:
+        # Most likely the LSF commands are not installed.
+        return CommandResult(args, None, str(error), time.time() - start)
+    timer = _Timeout(proc, timeout)
+    try:
+        output, _ = proc.communicate(
+            None if input is None else input.encode('utf-8'))
+    finally:
+        timer.cancel()
+    return CommandResult(args, proc.returncode,
+                         output.decode('utf-8', 'replace'),
+                         time.time() - start, timed_out=timer.expired)
+
+
+def stream_lines(args, timeout=None):
+    """Run an LSF command and lazily yield the lines of its standard output
+    as they are read from a pipe. Standard error is discarded.
+
+    The exit status is checked once all lines have been read, so consumers
+    must exhaust the iterator to detect failures.
+
+    :param args: command arguments
+    :type args: :class:`list` of :class:`str`
+    :param timeout: seconds after which the command is killed, or ``None``
+    :type timeout: :class:`float`
+    :return: iterator of lines, without trailing newlines
+    :rtype: iterator of :class:`str`
+    :raises CommandError: if the command can't be run, fails or times out
+    """
+    with open(os.devnull, 'w') as devnull:
+        try:
+            proc = subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=devnull)
+        except OSError as error:
+            raise CommandError('{0}: {1}'.format(args[0], error))
+    timer = _Timeout(proc, timeout)
+    try:
+        for line in iter(proc.stdout.readline, b''):
+            yield line.decode('utf-8', 'replace').rstrip('\r\n')
+        proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            # The consumer stopped early.
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    if timer.expired:
+        raise CommandError('{0}: timed out after {1} seconds'.format(
+            args[0], timeout))
+    if proc.returncode != 0:
+        raise CommandError('{0}: exited with status {1}'.format(
+            args[0], proc.returncode))
+
+
+class CommandTiming(object):
+    """How long an LSF command took and how it ended."""
+    def __init__(self, args, seconds, error):
+        self.args = args
+        self.seconds = seconds
+        self.error = error
+
+
+class CommandRunner(object):
+    """Runs LSF queries for the whole program. Parsed results are cached on
+    disk per user and command line, and every command run is timed.
+    """
+    def __init__(self, completion_cache):
+        self._completion_cache = completion_cache
+        self.timeout = DEFAULT_TIMEOUT
+        self.timings = collections.deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def query(self, args, parse, use_cache=True, refresh=False):
+        """Run an LSF command and parse its output.
+
+        :param args: command arguments
+        :type args: :class:`list` of :class:`str`
+        :param parse: function taking an iterator of output lines, as \
+        produced by :func:`stream_lines`, and returning a JSON-serializable \
+        value; it must consume all lines
+        :type parse: :class:`function`
+        :param use_cache: whether the result may come from the cache
+        :type use_cache: :class:`bool`
+        :param refresh: whether to run the command even if the cache holds a \
+        fresh result, storing the new result in the cache
+        :type refresh: :class:`bool`
+        :return: the parsed value, or ``None`` if the command failed
+        """
+        def compute():
+            return self._run_and_parse(args, parse)
+        if not use_cache:
+            return compute()
+        if refresh:
+            return self._completion_cache.refresh(
+                self.cache_key(args), compute)
+        return self._completion_cache.get(self.cache_key(args), compute)
+
+    @staticmethod
+    def cache_key(args):
+        """Return the cache key for a command run by the current user.
+
+        :param args: command arguments
+        :type args: :class:`list` of :class:`str`
+        :rtype: :class:`str`
+        """
+        digest = hashlib.sha1(
+            '\0'.join(args).encode('utf-8')).hexdigest()[:16]
+        return 'cmd-{0}-{1}-{2}'.format(os.getenv('USER'), args[0], digest)
+
+    def _run_and_parse(self, args, parse):
+        start = time.time()
+        error = None
+        try:
+            value = parse(stream_lines(args, timeout=self.timeout))
+        except CommandError as command_error:
+            # The program can be useful even without LSF. Don't crash.
+            error = str(command_error)
+            value = None
+        with self._lock:
+            self.timings.append(
+                CommandTiming(args, time.time() - start, error))
+        return value
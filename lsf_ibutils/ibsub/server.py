@@ -0,0 +1,183 @@
+""":mod:`lsf_ibutils.ibsub.server` -- Serving requests over a Unix socket
+
+See :mod:`lsf_ibutils.ibsub.client` for the protocol.
+"""
+
+import errno
+import json
+import os
+import socket
+import threading
+import time
+try:
+    import socketserver
+except ImportError:
+    # Python 2
+    import SocketServer as socketserver
+
+import pinject
+
+from lsf_ibutils.ibsub import output
+# Import batch module for the sake of pinject being able to find ExecRow.
+from lsf_ibutils.ibsub import batch  # NOQA
+
+
+class ServerError(Exception):
+    """Raised when the server can't be started."""
+    pass
+
+
+class RenderRequest(object):
+    """Render the job described by a request, answering the prompts from the
+    request as ``ibsub batch`` answers them from a row.
+    """
+    @pinject.copy_args_to_internal_fields
+    def __init__(self, exec_row, build_script, build_command):
+        pass
+
+    def __call__(self, request):
+        """
+        :param request: the decoded request
+        :type request: :class:`dict`
+        :return: the response
+        :rtype: :class:`dict`
+        """
+        if not isinstance(request, dict):
+            return {'errors': ['request must be a JSON object']}
+        errors = []
+        output_type = request.get('type', output.TYPES[0])
+        if output_type not in output.TYPES:
+            errors.append('type: expected one of {0}'.format(
+                ', '.join(output.TYPES)))
+        syntax = request.get('syntax', 'bash')
+        if syntax not in output.SYNTAXES:
+            errors.append('syntax: expected one of {0}'.format(
+                ', '.join(output.SYNTAXES)))
+        answers = request.get('answers', {})
+        if not isinstance(answers, dict):
+            errors.append('answers: expected a JSON object')
+            answers = {}
+        flags, command, row_errors = self._exec_row(answers)
+        errors += row_errors
+        if errors:
+            return {'errors': errors}
+        if output_type == 'script':
+            out = self._build_script(flags, command, syntax)
+        else:
+            out = self._build_command(flags, command)
+        return {'output': out}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # A client may send any number of requests on one connection. Each
+        # connection has its own thread, so idle clients don't block others.
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as error:
+                response = {'errors': ['invalid JSON: {0}'.format(error)]}
+            else:
+                response = self.server.render(request)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves each connection in its own thread, but renders one request at
+    a time, which is plenty: rendering takes microseconds, and the prompts
+    answering each request share state.
+
+    If ``refresh`` is given, it is called every ``refresh_interval`` seconds
+    while serving, to keep completions from going stale.
+    """
+    # Don't wait for connected clients to hang up before exiting.
+    daemon_threads = True
+
+    def __init__(self, socket_path, render_request, refresh=None,
+                 refresh_interval=None, clock=time.time):
+        self.render_request = render_request
+        self._render_lock = threading.Lock()
+        self._refresh = refresh
+        self._refresh_interval = refresh_interval
+        self._clock = clock
+        self._last_refresh = clock()
+        self._stopping = threading.Event()
+        _remove_stale_socket(socket_path)
+        directory = os.path.dirname(socket_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Other users have no business reading our answers.
+        old_umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(
+                self, socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def render(self, request):
+        """Render a request, one at a time.
+
+        :param request: the decoded request
+        :return: the response
+        :rtype: :class:`dict`
+        """
+        with self._render_lock:
+            return self.render_request(request)
+
+    def refresh_if_due(self):
+        """Call ``refresh`` if ``refresh_interval`` seconds have passed since
+        the last call.
+        """
+        if self._refresh is None:
+            return
+        now = self._clock()
+        if now - self._last_refresh >= self._refresh_interval:
+            self._last_refresh = now
+            self._refresh()
+
+    def serve_forever(self, poll_interval=0.5):
+        # Python 2's serve_forever() has no hook between requests, so
+        # refresh from a thread of our own.
+        refresher = None
+        if self._refresh is not None:
+            refresher = threading.Thread(
+                target=self._refresh_periodically, args=(poll_interval,))
+            refresher.daemon = True
+            refresher.start()
+        try:
+            socketserver.UnixStreamServer.serve_forever(self, poll_interval)
+        finally:
+            self._stopping.set()
+            if refresher is not None:
+                refresher.join()
+
+    def _refresh_periodically(self, poll_interval):
+        while not self._stopping.is_set():
+            self.refresh_if_due()
+            self._stopping.wait(poll_interval)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as error:
+        if error.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+        # Left behind by a server which didn't exit cleanly.
+        os.remove(socket_path)
+    else:
+        raise ServerError('{0}: a server is already running'.format(
+            socket_path))
+    finally:
+        sock.close()
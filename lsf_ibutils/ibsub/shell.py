@@ -5,8 +5,10 @@
 
 from __future__ import print_function
 import os
+import sys
 
-from psutil import Process
+from lsf_ibutils.ibsub import cache
+from lsf_ibutils.ibsub import procfs
 
 
 SHELLS = [
@@ -17,11 +19,149 @@ SHELLS = [
 ]
 """Shells detected by this module."""
 
+MAX_DEPTH = 8
+"""Maximum number of ancestor processes examined when looking for a shell.
+Wrappers such as tmux, screen, sshd or workflow managers can put many
+processes between a shell and `ibsub', but a shell further away than this is
+unlikely to be the one the user is typing into.
+"""
+
+SESSION_TTL = 24 * 60 * 60
+"""Seconds for which a detection is remembered for a session."""
+
+
+class Detection(object):
+    """The detected shell and how it was decided."""
+    def __init__(self, shell, reason):
+        #: Short name of the shell, or ``None`` if none was detected.
+        self.shell = shell
+        #: Human-readable explanation of how the shell was decided.
+        self.reason = reason
+
+    def __str__(self):
+        return '{0} ({1})'.format(self.shell, self.reason)
+
+
+def _match(name):
+    for shell in SHELLS:
+        # Some shells can be called by name and version
+        # e.g. `bash-4.1'. This code handles that kind of call.
+        if shell in name:
+            return shell
+    return None
+
+
+def _psutil_value(proc, attribute):
+    # psutil 2.0 turned these properties into methods.
+    value = getattr(proc, attribute)
+    return value() if callable(value) else value
+
+
+def _ancestors(max_depth):
+    """Yield (depth, pid, name) for each ancestor of this process, starting
+    with the parent at depth 1.
+    """
+    if procfs.available():
+        return procfs.ancestors(max_depth)
+    return _psutil_ancestors(max_depth)
+
+
+def _psutil_ancestors(max_depth):
+    # psutil is slow to import, so it is only used where there is no /proc,
+    # e.g., on Mac OS X.
+    import psutil
+    proc = psutil.Process(os.getpid())
+    for depth in range(1, max_depth + 1):
+        try:
+            proc = _psutil_value(proc, 'parent')
+            if proc is None:
+                return
+            try:
+                name = os.path.basename(_psutil_value(proc, 'exe'))
+            except psutil.AccessDenied:
+                # Reading the executable of another user's process, e.g.,
+                # sshd, isn't allowed. Its name is.
+                name = _psutil_value(proc, 'name')
+        except psutil.Error:
+            return
+        yield depth, proc.pid, name
+
+
+def _walk_and_fall_back():
+    # Keep going up the hierarchy to try to detect a shell. When running from
+    # source code, this should be the next process up. Frozen PyInstaller
+    # bundles will insert one extra process in there. This also supports
+    # auto-detection of the shell from scripts.
+    try:
+        for depth, pid, name in _ancestors(MAX_DEPTH):
+            shell = _match(name)
+            if shell is not None:
+                return [shell, 'ancestor process {0} (pid {1}) at depth {2}'
+                        .format(name, pid, depth)]
+    except ImportError:
+        # psutil isn't installed.
+        pass
+
+    # $SHELL is the login shell, which is not necessarily the one running,
+    # so it is the last resort.
+    login_shell = os.getenv('SHELL')
+    if login_shell:
+        shell = _match(os.path.basename(login_shell))
+        if shell is not None:
+            return [shell, '$SHELL is {0}'.format(login_shell)]
+    return [None, 'no shell among the nearest {0} ancestor processes or in '
+            '$SHELL'.format(MAX_DEPTH)]
+
+
+def detect_with_reason(session_cache=None):
+    """Detect the currently running shell and explain how.
+
+    The parent process is checked first, cheaply, by reading its name from
+    ``/proc`` if there is one. Failing that, the result is remembered per
+    session, since walking up the process tree is slow: the nearest
+    :data:`MAX_DEPTH` ancestors are examined, then ``$SHELL``.
+
+    :param session_cache: cache in which to remember the result (default: \
+    a :class:`~lsf_ibutils.ibsub.cache.DiskCache` in the default directory)
+    :type session_cache: :class:`~lsf_ibutils.ibsub.cache.DiskCache`
+    :rtype: :class:`Detection`
+    """
+    parent_pid = os.getppid()
+    parent_name = procfs.read_comm(parent_pid)
+    if parent_name is not None:
+        shell = _match(parent_name)
+        if shell is not None:
+            return Detection(shell, 'parent process {0} (pid {1})'.format(
+                parent_name, parent_pid))
+
+    if not hasattr(os, 'getsid'):
+        # No sessions to key the cache by, e.g., on Windows.
+        return Detection(*_walk_and_fall_back())
+    if session_cache is None:
+        session_cache = cache.DiskCache(ttl=SESSION_TTL)
+    computed = []
+
+    def compute():
+        computed.append(True)
+        return _walk_and_fall_back()
+    # The parent is part of the key because a session can contain several
+    # shells, e.g., zsh started from a bash login shell.
+    entry = session_cache.get(
+        'shell-{0}-{1}'.format(os.getsid(0), parent_pid), compute)
+    try:
+        shell, reason = entry
+    except (TypeError, ValueError):
+        # Written by something else.
+        shell, reason = compute()
+    if not computed:
+        reason = 'remembered for this session: {0}'.format(reason)
+    return Detection(shell, reason)
+
 
 def detect():
     """Detect the currently running shell.
 
-    Shells tested are listed in :data:`SUPPORTED_SHELLS`
+    Shells tested are listed in :data:`SHELLS`
 
     If the shell cannot be detected, ``None`` is returned.
 
@@ -32,30 +172,10 @@ def detect():
     # covered. Ignore it, because this function is covered by launching a
     # subprocess and there is no way the coverage plugin would be able to
     # detect that.
-
-    # Keep going up the hierarchy to try to detect a shell. When running from
-    # source code, this should be the next process up. Frozen PyInstaller
-    # bundles will insert one extra process in there. This also supports
-    # auto-detection of the shell from scripts. If any of this errors at any
-    # point just return None.
-    proc = Process(os.getpid())
-    if proc is None:
-        return None
-
-    while True:
-        proc = proc.parent
-        if proc is None:
-            break
-
-        proc_basename = os.path.basename(proc.exe)
-        for shell in SHELLS:
-            # Some shells can be called by name and version
-            # e.g. `bash-4.1'. This code handles that kind of call.
-            if shell in proc_basename:
-                return shell
-
-    return None
+    return detect_with_reason().shell
 
 
 if __name__ == '__main__':
-    print(detect())
+    detection = detect_with_reason()
+    print(detection.shell)
+    print(detection.reason, file=sys.stderr)
@@ -0,0 +1,247 @@
+""":mod:`lsf_ibutils.ibsub.submit` -- Concurrent job submission
+"""
+
+import json
+import random
+import re
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from lsf_ibutils.ibsub import runner
+
+JOB_SUBMITTED_RE = re.compile(
+    r'Job <(?P<job_id>\d+)> is submitted to (?:default )?'
+    r'queue <(?P<queue>[^>]+)>')
+"""Matches the reply printed by `bsub' on successful submission."""
+
+BUSY_RE = re.compile(
+    r'too busy|not responding|try again|please wait|cannot connect',
+    re.IGNORECASE)
+"""Matches `bsub' errors which mean mbatchd is overloaded, not that the job
+was rejected. Submissions failing with these errors are retried.
+"""
+
+SUBMIT_TIMEOUT = 300
+"""Seconds after which a `bsub' run is abandoned, so that one hung call
+doesn't stall a whole batch.
+"""
+
+_DONE = object()
+
+
+class SubmitResult(object):
+    """Outcome of submitting one job.
+
+    ``job_id`` and ``queue`` are ``None`` if the submission failed, in which
+    case ``error`` holds the reason.
+    """
+    def __init__(self, key, command):
+        self.key = key
+        self.command = command
+        self.job_id = None
+        self.queue = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.output = ''
+        self.error = None
+
+    @property
+    def succeeded(self):
+        return self.job_id is not None
+
+    def to_dict(self):
+        """Return the result as a JSON-serializable dictionary, as written to
+        the manifest.
+
+        :rtype: :class:`dict`
+        """
+        return {
+            'key': self.key,
+            'command': self.command,
+            'job_id': self.job_id,
+            'queue': self.queue,
+            'attempts': self.attempts,
+            'seconds': round(self.seconds, 6),
+            'error': self.error,
+        }
+
+
+class Submitter(object):
+    """Submits jobs to LSF by running `bsub', retrying with exponential
+    backoff and jitter when mbatchd is too busy.
+
+    A job is either a complete `bsub' command line, as returned by
+    :func:`~lsf_ibutils.ibsub.output.build_command`, or a script which is
+    passed to `bsub' on standard input.
+
+    If a limiter is given, every `bsub' run is gated by it, so that fewer
+    than ``workers`` submissions may be in flight when LSF is slow.
+
+    A `bsub' run which takes longer than ``timeout`` seconds is killed and
+    the submission fails without a retry, as the job may have been submitted
+    anyway.
+    """
+    def __init__(self, workers=4, retries=5, backoff=0.5, max_backoff=30.0,
+                 sleep=time.sleep, random=random.random, limiter=None,
+                 timeout=SUBMIT_TIMEOUT):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        self.timeout = timeout
+        self._sleep = sleep
+        self._random = random
+
+    def submit(self, command=None, script=None, key=None):
+        """Submit one job.
+
+        :param command: shell command line running `bsub'
+        :type command: :class:`str`
+        :param script: job script to submit, instead of a command
+        :type script: :class:`str`
+        :param key: identifier for the job, copied to the result
+        :return: the result of the submission
+        :rtype: :class:`SubmitResult`
+        """
+        result = SubmitResult(key, command)
+        start = time.time()
+        while True:
+            result.attempts += 1
+            command_result = self._run(command, script)
+            output = command_result.output
+            result.output = output
+            match = JOB_SUBMITTED_RE.search(output)
+            if match is not None:
+                result.job_id = match.group('job_id')
+                result.queue = match.group('queue')
+                result.error = None
+                break
+            if command_result.timed_out:
+                result.error = 'bsub timed out after {0} seconds'.format(
+                    self.timeout)
+                break
+            result.error = output.strip() or (
+                'bsub exited with status {0}'.format(
+                    command_result.returncode))
+            if (not BUSY_RE.search(output) or
+                    result.attempts > self.retries):
+                break
+            self._sleep(self._retry_delay(result.attempts))
+        result.seconds = time.time() - start
+        return result
+
+    def submit_all(self, jobs):
+        """Submit many jobs using a bounded pool of worker threads. Jobs are
+        consumed lazily, so ``jobs`` may be a generator of any length.
+
+        :param jobs: iterable of (key, command) tuples
+        :return: iterator of results, in order of completion
+        :rtype: iterator of :class:`SubmitResult`
+        """
+        # Bounding the job queue keeps memory constant for huge inputs.
+        job_queue = queue.Queue(maxsize=2 * self.workers)
+        result_queue = queue.Queue()
+        feed_errors = []
+
+        threads = [threading.Thread(
+            target=self._feed, args=(jobs, job_queue, feed_errors))]
+        threads += [
+            threading.Thread(target=self._work, args=(job_queue, result_queue))
+            for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        finished_workers = 0
+        while finished_workers < self.workers:
+            result = result_queue.get()
+            if result is _DONE:
+                finished_workers += 1
+            else:
+                yield result
+        if feed_errors:
+            raise feed_errors[0]
+
+    def _feed(self, jobs, job_queue, feed_errors):
+        try:
+            for job in jobs:
+                job_queue.put(job)
+        except Exception as error:
+            feed_errors.append(error)
+        finally:
+            for _ in range(self.workers):
+                job_queue.put(_DONE)
+
+    def _work(self, job_queue, result_queue):
+        while True:
+            job = job_queue.get()
+            if job is _DONE:
+                result_queue.put(_DONE)
+                return
+            key, command = job
+            try:
+                result = self.submit(command, key=key)
+            except Exception as error:
+                # Keep going, so that the other jobs are still submitted.
+                result = SubmitResult(key, command)
+                result.error = str(error)
+            result_queue.put(result)
+
+    def _retry_delay(self, attempts):
+        # "Full jitter": a random delay up to the exponential backoff, which
+        # keeps many clients from retrying in lockstep.
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return ceiling * self._random()
+
+    def _run(self, command, script):
+        if self.limiter is None:
+            return self._run_bsub(command, script)
+        self.limiter.acquire()
+        start = time.time()
+        command_result = None
+        try:
+            command_result = self._run_bsub(command, script)
+        finally:
+            # Always give the slot back, or the remaining submissions could
+            # wait for it forever.
+            if command_result is None:
+                self.limiter.release(time.time() - start, error=True)
+            else:
+                self.limiter.release(
+                    command_result.seconds,
+                    error=command_result.timed_out or (
+                        not command_result.succeeded and
+                        bool(BUSY_RE.search(command_result.output))))
+        return command_result
+
+    def _run_bsub(self, command, script):
+        if script is not None:
+            return runner.run(['bsub'], input=script, timeout=self.timeout)
+        return runner.run(command, shell=True, timeout=self.timeout)
+
+
+def write_manifest(results, stream):
+    """Write each result as a line of JSON, as soon as it is available.
+
+    :param results: iterable of results
+    :type results: iterable of :class:`SubmitResult`
+    :param stream: stream to which to write the manifest
+    :type stream: :class:`file`
+    :return: tuple of (number submitted, number failed)
+    :rtype: :class:`tuple` of (:class:`int`, :class:`int`)
+    """
+    submitted = failed = 0
+    for result in results:
+        if result.succeeded:
+            submitted += 1
+        else:
+            failed += 1
+        stream.write(json.dumps(result.to_dict(), sort_keys=True) + '\n')
+        stream.flush()
+    return submitted, failed
@@ -0,0 +1,252 @@
+""":mod:`lsf_ibutils.ibsub.sweep` -- Parameter sweeps rendered as job arrays
+"""
+
+import itertools
+import json
+import re
+
+from lsf_ibutils.ibsub.quoting import quote
+
+# Parameters become shell variables, so their names must be valid ones.
+_NAME_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class SweepError(ValueError):
+    """Raised when a sweep specification is invalid."""
+    pass
+
+
+def _check_name(name):
+    try:
+        valid = _NAME_RE.match(name) is not None
+    except TypeError:
+        valid = False
+    if not valid:
+        raise SweepError(
+            'invalid parameter name {0}: expected letters, digits and '
+            'underscores, not starting with a digit'.format(repr(name)))
+
+
+class Values(object):
+    """A single parameter taking each of a list of values in turn."""
+    def __init__(self, name, values):
+        _check_name(name)
+        self.names = [name]
+        self._values = [str(value) for value in values]
+        if not self._values:
+            raise SweepError('parameter {0} has no values'.format(
+                repr(name)))
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        for value in self._values:
+            yield (value,)
+
+
+class Range(Values):
+    """A single integer parameter, with the same meaning of arguments as
+    :func:`range` except that ``stop`` is inclusive.
+    """
+    def __init__(self, name, start, stop, step=1):
+        if step == 0:
+            raise SweepError('range for {0}: step must not be zero'.format(
+                repr(name)))
+        stop += 1 if step > 0 else -1
+        super(Range, self).__init__(name, range(start, stop, step))
+
+
+class Product(object):
+    """Every combination of the points of the child sweeps."""
+    def __init__(self, *children):
+        self._children = children
+        self.names = _joined_names(children)
+
+    def __len__(self):
+        length = 1
+        for child in self._children:
+            length *= len(child)
+        return length
+
+    def __iter__(self):
+        for points in itertools.product(*self._children):
+            yield sum(points, ())
+
+
+class Zip(object):
+    """The child sweeps advanced in lockstep. They must have equal lengths."""
+    def __init__(self, *children):
+        lengths = set(len(child) for child in children)
+        if len(lengths) > 1:
+            raise SweepError(
+                'zipped parameters {0} have different lengths'.format(
+                    ', '.join(repr(name)
+                              for name in _joined_names(children))))
+        self._children = children
+        self.names = _joined_names(children)
+
+    def __len__(self):
+        return len(self._children[0]) if self._children else 0
+
+    def __iter__(self):
+        for points in zip(*self._children):
+            yield sum(points, ())
+
+
+def _joined_names(children):
+    names = []
+    for child in children:
+        for name in child.names:
+            if name in names:
+                raise SweepError('parameter {0} appears twice'.format(
+                    repr(name)))
+            names.append(name)
+    return names
+
+
+def parse(spec):
+    """Build a sweep from its JSON-compatible specification. A specification
+    is one of::
+
+        {"name": "tasks", "values": [16, 32, 64]}
+        {"name": "seed", "range": [1, 100]}       # or [start, stop, step]
+        {"product": [spec, ...]}
+        {"zip": [spec, ...]}
+
+    :param spec: the specification
+    :type spec: :class:`dict`
+    :return: the sweep
+    :raises SweepError: if the specification is invalid
+    """
+    if not isinstance(spec, dict):
+        raise SweepError('expected an object, got {0}'.format(repr(spec)))
+    for combinator, class_ in (('product', Product), ('zip', Zip)):
+        if combinator in spec:
+            children = spec[combinator]
+            if not isinstance(children, list) or not children:
+                raise SweepError('{0} needs a non-empty list'.format(
+                    repr(combinator)))
+            return class_(*[parse(child) for child in children])
+    if 'name' not in spec:
+        raise SweepError(
+            "expected one of 'name', 'product' or 'zip' in {0}".format(
+                repr(spec)))
+    return _parse_parameter(spec)
+
+
+def _parse_parameter(spec):
+    name = spec['name']
+    if 'values' in spec:
+        if not isinstance(spec['values'], list):
+            raise SweepError('values for {0} must be a list'.format(
+                repr(name)))
+        return Values(name, spec['values'])
+    if 'range' in spec:
+        try:
+            args = [int(arg) for arg in spec['range']]
+        except (TypeError, ValueError):
+            args = None
+        if args is None or len(args) not in (2, 3):
+            raise SweepError('range for {0} needs 2 or 3 integers'.format(
+                repr(name)))
+        return Range(name, *args)
+    raise SweepError("parameter {0} needs 'values' or 'range'".format(
+        repr(name)))
+
+
+def load(spec_file):
+    """Read a sweep specification from a JSON file.
+
+    :param spec_file: open specification file
+    :type spec_file: :class:`file`
+    :return: the sweep
+    :raises SweepError: if the specification is invalid
+    """
+    try:
+        spec = json.load(spec_file)
+    except ValueError as error:
+        raise SweepError('invalid JSON: {0}'.format(error))
+    return parse(spec)
+
+
+def array_flags(flags, size):
+    """Turn flags for a single job into flags for a job array with ``size``
+    elements. The job name gets an index range and output and error files
+    get the array index so elements don't overwrite each other.
+
+    :param flags: a list of flags
+    :type flags: :class:`list` of :class:`tuple`
+    :param size: number of array elements
+    :type size: :class:`int`
+    :return: new list of flags
+    :rtype: :class:`list` of :class:`list`
+    """
+    index_range = '[1-{0}]'.format(size)
+    array_flags = []
+    has_name = False
+    for flag_tuple in flags:
+        flag_tuple = list(flag_tuple)
+        if flag_tuple[:1] == ['-J']:
+            flag_tuple[1] += index_range
+            has_name = True
+        elif (flag_tuple[:1] in (['-o'], ['-e']) and
+                '%J' in flag_tuple[1] and '%I' not in flag_tuple[1]):
+            flag_tuple[1] = flag_tuple[1].replace('%J', '%J.%I')
+        array_flags.append(flag_tuple)
+    if not has_name:
+        array_flags.insert(0, ['-J', 'ibsub' + index_range])
+    return array_flags
+
+
+def lookup_table(sweep, syntax):
+    """Render lines which set one variable per sweep parameter to its value
+    for the current array element, selected by ``$LSB_JOBINDEX``. Shell
+    variables are exported so the command and its children see them.
+
+    :param sweep: the sweep
+    :param syntax: shell syntax, one of \
+    :data:`lsf_ibutils.ibsub.output.SYNTAXES`
+    :type syntax: :class:`str`
+    :return: the lines of the table
+    :rtype: :class:`list` of :class:`str`
+    """
+    if syntax == 'python':
+        lines = ['import os', '_sweep = [']
+        lines += ['    {0!r},'.format(point) for point in sweep]
+        lines += [
+            ']',
+            "for _name, _value in zip({0!r}, _sweep[int(os.environ["
+            "'LSB_JOBINDEX']) - 1]):".format(tuple(sweep.names)),
+            '    os.environ[_name] = _value',
+        ]
+        return lines
+
+    # Transpose the points into one column per parameter.
+    columns = [[] for _ in sweep.names]
+    for point in sweep:
+        for column, value in zip(columns, point):
+            column.append(quote(value))
+    lines = []
+    for name, column in zip(sweep.names, columns):
+        table = 'sweep_' + name
+        values = ' '.join(column)
+        if syntax == 'tcsh':
+            lines.append('set {0} = ( {1} )'.format(table, values))
+            lines.append('setenv {0} "${1}[$LSB_JOBINDEX]"'.format(
+                name, table))
+        elif syntax == 'zsh':
+            # zsh arrays start at 1, like $LSB_JOBINDEX.
+            lines.append('{0}=({1})'.format(table, values))
+            lines.append('export {0}="${{{1}[$LSB_JOBINDEX]}}"'.format(
+                name, table))
+        else:
+            # `set -A' works in every ksh, `name=(...)' only in ksh93.
+            if syntax == 'ksh':
+                lines.append('set -A {0} {1}'.format(table, values))
+            else:
+                lines.append('{0}=({1})'.format(table, values))
+            lines.append(
+                'export {0}="${{{1}[$((LSB_JOBINDEX - 1))]}}"'.format(
+                    name, table))
+    return lines
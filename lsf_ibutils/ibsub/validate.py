@@ -1,10 +1,34 @@
 """:mod:`lsf_ibutils.ibsub.validate` -- User input validator functions
+
+Each validator checks one answer at a time. For batch input, each also has a
+column-wise counterpart, e.g., :func:`positive_integer_column`, which checks
+a whole column of answers at once and returns a tuple of (mask, error
+indices). The mask holds whether each answer was valid and the error indices
+are the positions of the invalid answers. If the column is a NumPy array, the
+mask and error indices are too.
+
+Column validators join chunks of the column into one string which is checked
+by a few string methods or a single regular expression match, without
+calling a Python function per answer. Such a check only proves that a whole
+chunk is valid; chunks which fail it are checked again answer by answer, so
+column and single-answer validators always agree.
 """
 
 import re
 
 TIME_DURATION_RE = re.compile(r'(?:\d\d?:)?\d\d?$')
 
+COLUMN_CHUNK_SIZE = 256
+"""Number of answers checked at once by column validators."""
+
+# Size below which chunks with invalid answers are checked answer by answer.
+_COLUMN_MIN_SPLIT = 32
+
+# A column of times with the digits restricted to ASCII, which implies each
+# answer matches TIME_DURATION_RE.
+_TIME_DURATION_COLUMN_RE = re.compile(
+    r'(?:[0-9]{1,2}:)?[0-9]{1,2}(?:\n(?:[0-9]{1,2}:)?[0-9]{1,2})*\Z')
+
 
 def positive_integer(text):
     """Validate a positive integer.
@@ -41,3 +65,101 @@ def yes_no(text):
     :rtype: :class:`bool`
     """
     return text == 'y' or text == 'n'
+
+
+def _validate_column(all_valid, validator, texts):
+    if hasattr(texts, 'tolist'):
+        # NumPy array
+        mask, errors = _validate_column(all_valid, validator, texts.tolist())
+        import numpy
+        return numpy.array(mask, dtype=bool), numpy.array(errors, dtype=int)
+    texts = list(texts)
+    mask = [True] * len(texts)
+    errors = []
+    for start in range(0, len(texts), COLUMN_CHUNK_SIZE):
+        _validate_chunk(all_valid, validator, texts, start,
+                        min(start + COLUMN_CHUNK_SIZE, len(texts)),
+                        mask, errors)
+    return mask, errors
+
+
+def _validate_chunk(all_valid, validator, texts, start, stop, mask, errors):
+    chunk = texts[start:stop]
+    joined = '\n'.join(chunk)
+    # An answer containing a newline would pass for two answers.
+    if joined.count('\n') == len(chunk) - 1 and all_valid(joined):
+        return
+    if len(chunk) <= _COLUMN_MIN_SPLIT:
+        for index, text in enumerate(chunk, start):
+            if not validator(text):
+                mask[index] = False
+                errors.append(index)
+        return
+    # Invalid answers are usually rare, so split the chunk in half to find
+    # them, rather than checking every answer in it.
+    middle = (start + stop) // 2
+    _validate_chunk(all_valid, validator, texts, start, middle, mask, errors)
+    _validate_chunk(all_valid, validator, texts, middle, stop, mask, errors)
+
+
+def _all_positive_integers(joined):
+    # No empty answers or answers starting with zero, which are checked
+    # individually to rule out zero.
+    padded = '\n' + joined + '\n'
+    digits = joined.replace('\n', '')
+    # Byte strings in Python 2 have no isdecimal(), but their isdigit() only
+    # accepts ASCII digits.
+    return (getattr(digits, 'isdecimal', digits.isdigit)() and
+            '\n0' not in padded and '\n\n' not in padded)
+
+
+def positive_integer_column(texts):
+    """Validate a column of positive integers. See :func:`positive_integer`.
+
+    :param texts: texts to validate
+    :type texts: :class:`list` of :class:`str`, or NumPy array of strings
+    :return: tuple of (mask, error indices)
+    :rtype: :class:`tuple` of (:class:`list` of :class:`bool`, \
+    :class:`list` of :class:`int`)
+    """
+    return _validate_column(_all_positive_integers, positive_integer, texts)
+
+
+def time_duration_column(texts):
+    """Validate a column of durations of time. See :func:`time_duration`.
+
+    :param texts: texts to validate
+    :type texts: :class:`list` of :class:`str`, or NumPy array of strings
+    :return: tuple of (mask, error indices)
+    :rtype: :class:`tuple` of (:class:`list` of :class:`bool`, \
+    :class:`list` of :class:`int`)
+    """
+    return _validate_column(
+        _TIME_DURATION_COLUMN_RE.match, time_duration, texts)
+
+
+def _all_yes_no(joined):
+    # Answers of one character each, alternating with newlines.
+    return (len(joined) == 2 * joined.count('\n') + 1 and
+            not joined[::2].strip('yn') and not joined[1::2].strip('\n'))
+
+
+def yes_no_column(texts):
+    """Validate a column of answers to yes or no questions. See
+    :func:`yes_no`.
+
+    :param texts: texts to validate
+    :type texts: :class:`list` of :class:`str`, or NumPy array of strings
+    :return: tuple of (mask, error indices)
+    :rtype: :class:`tuple` of (:class:`list` of :class:`bool`, \
+    :class:`list` of :class:`int`)
+    """
+    return _validate_column(_all_yes_no, yes_no, texts)
+
+
+COLUMN_VALIDATORS = {
+    positive_integer: positive_integer_column,
+    time_duration: time_duration_column,
+    yes_no: yes_no_column,
+}
+"""Column-wise counterpart of each single-answer validator which has one."""
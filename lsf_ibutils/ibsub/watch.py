@@ -0,0 +1,356 @@
+""":mod:`lsf_ibutils.ibsub.watch` -- Monitoring submitted jobs
+
+Polling each job with its own `bjobs' call costs one process and one mbatchd
+query per job per refresh. Instead, :class:`JobWatcher` asks `bjobs' for all
+of a user's jobs once per poll and picks out the tracked ones as the output
+streams by. Only the latest state of each tracked job is kept, and it is
+updated in place, so a poll reports just the jobs whose state changed without
+holding two snapshots or the whole output in memory.
+
+Where `lsb.events' is readable, :class:`EventWatcher` follows it instead,
+so that watching jobs doesn't query mbatchd at all.
+"""
+
+import collections
+import json
+import re
+import time
+
+from lsf_ibutils.ibsub import events, runner
+from lsf_ibutils.ibsub.submit import JOB_SUBMITTED_RE
+
+DEFAULT_INTERVAL = 30
+"""Default number of seconds between polls."""
+
+MISSING = 'MISSING'
+"""State of a job which `bjobs' no longer reports, e.g., because it finished
+longer ago than mbatchd's CLEAN_PERIOD.
+"""
+
+FINISHED_STATES = frozenset(['DONE', 'EXIT', MISSING])
+"""States from which a job doesn't change by itself."""
+
+# Separates the fields of `bjobs -o'. Job states and IDs never contain it.
+_DELIMITER = ';'
+
+BJOBS_FIELDS = 'jobid jobindex stat exit_code delimiter=\'{0}\''.format(
+    _DELIMITER)
+"""Output format requested from `bjobs -o'."""
+
+_JOB_ID_RE = re.compile(r'\d+(?:\[\d+\])?$')
+
+
+class Transition(object):
+    """Change in the state of a job between two polls. ``old_state`` is
+    ``None`` if the job wasn't seen before.
+    """
+    def __init__(self, job_id, old_state, new_state, exit_code=None):
+        self.job_id = job_id
+        self.old_state = old_state
+        self.new_state = new_state
+        self.exit_code = exit_code
+
+    def __str__(self):
+        line = '{0}\t{1} -> {2}'.format(
+            self.job_id, self.old_state or '-', self.new_state)
+        if self.exit_code is not None:
+            line += ' (exit code {0})'.format(self.exit_code)
+        return line
+
+
+def is_job_id(text):
+    """Return whether text is a job ID, e.g., ``123`` or ``123[4]`` for an
+    element of a job array.
+
+    :param text: the text
+    :type text: :class:`str`
+    :rtype: :class:`bool`
+    """
+    return _JOB_ID_RE.match(text) is not None
+
+
+def read_job_ids(lines):
+    """Read job IDs from a manifest written by ``ibsub batch --submit``,
+    the output of `bsub', or a list of IDs, one per line. Lines with no job
+    ID, e.g., of failed submissions, are skipped.
+
+    :param lines: lines of the file
+    :type lines: iterable of :class:`str`
+    :return: iterator of job IDs
+    :rtype: iterator of :class:`str`
+    """
+    for line in lines:
+        line = line.strip()
+        if line.startswith('{'):
+            try:
+                job_id = json.loads(line).get('job_id')
+            except ValueError:
+                continue
+            if job_id is not None:
+                yield str(job_id)
+        elif is_job_id(line):
+            yield line
+        else:
+            match = JOB_SUBMITTED_RE.search(line)
+            if match is not None:
+                yield match.group('job_id')
+
+
+def bjobs_args(user=None):
+    """Return the arguments of the `bjobs' call made for each poll.
+
+    :param user: user whose jobs to list, ``'all'``, or ``None`` for the \
+    current user
+    :type user: :class:`str`
+    :rtype: :class:`list` of :class:`str`
+    """
+    args = ['bjobs', '-a', '-noheader', '-o', BJOBS_FIELDS]
+    if user is not None:
+        args += ['-u', user]
+    return args
+
+
+def parse_bjobs(lines):
+    """Parse the output of `bjobs' called with :func:`bjobs_args`.
+
+    :param lines: output lines
+    :type lines: iterator of :class:`str`
+    :return: iterator of (job ID, array job ID or ``None``, state, exit code \
+    or ``None``) tuples
+    :rtype: iterator of :class:`tuple`
+    """
+    # Polls read every job of the user, so keep the work per line small.
+    # Fields aren't padded when a delimiter is given.
+    for line in lines:
+        fields = line.split(_DELIMITER)
+        if len(fields) != 4:
+            # E.g., "No unfinished job found".
+            continue
+        job_id, index, state, exit_code = fields
+        if exit_code == '-' or not exit_code:
+            exit_code = None
+        if index == '0' or index == '-' or not index:
+            yield job_id, None, state, exit_code
+        else:
+            yield ('{0}[{1}]'.format(job_id, index), job_id, state,
+                   exit_code)
+
+
+class JobTracker(object):
+    """Latest states of a set of jobs, updated from reports of their states.
+
+    Tracking a job array tracks each of its elements once they are reported.
+    Memory use is proportional to the number of tracked jobs; reports of jobs
+    which aren't tracked are skipped.
+    """
+    def __init__(self, job_ids):
+        # Latest state of each tracked job, None until first seen.
+        self.states = dict((job_id, None) for job_id in job_ids)
+        self.exit_codes = {}
+        self.polls = 0
+        self.error = None
+        # Job arrays whose elements are tracked in place of the array.
+        self._arrays = set()
+
+    @property
+    def finished(self):
+        """Whether no tracked job can change state any more."""
+        return all(state in FINISHED_STATES
+                   for state in self.states.values())
+
+    def counts(self):
+        """Return the number of tracked jobs in each state.
+
+        :rtype: :class:`collections.Counter`
+        """
+        return collections.Counter(
+            state or 'UNSEEN' for state in self.states.values())
+
+    def poll(self):
+        """Update the state of every tracked job.
+
+        :return: the changes, in the order they were reported
+        :rtype: :class:`list` of :class:`Transition`
+        """
+        raise NotImplementedError()
+
+    def _update(self, reports, transitions, seen=None):
+        """Apply reports of job states, as yielded by :func:`parse_bjobs`,
+        appending the changes to ``transitions`` and adding the tracked jobs
+        reported to ``seen``, if given.
+        """
+        states = self.states
+        arrays = self._arrays
+        for job_id, array_id, state, exit_code in reports:
+            if job_id not in states:
+                if array_id is None or not (
+                        array_id in arrays or array_id in states):
+                    # Not tracked.
+                    continue
+                if array_id not in arrays:
+                    del states[array_id]
+                    arrays.add(array_id)
+                states[job_id] = None
+            if seen is not None:
+                seen.add(job_id)
+            old_state = states[job_id]
+            if state != old_state:
+                states[job_id] = state
+                if exit_code is not None:
+                    self.exit_codes[job_id] = exit_code
+                transitions.append(
+                    Transition(job_id, old_state, state, exit_code))
+
+    def watch(self, interval=DEFAULT_INTERVAL, sleep=time.sleep):
+        """Poll until all tracked jobs have finished.
+
+        :param interval: seconds between polls
+        :type interval: :class:`float`
+        :param sleep: function to wait a number of seconds
+        :type sleep: :class:`function`
+        :return: iterator of the transitions of each poll
+        :rtype: iterator of :class:`list` of :class:`Transition`
+        """
+        while True:
+            yield self.poll()
+            if self.finished:
+                return
+            sleep(interval)
+
+
+class JobWatcher(JobTracker):
+    """Tracks the states of a set of jobs with one `bjobs' call per poll.
+    Jobs of the user which aren't tracked are skipped as the output is read.
+    """
+    def __init__(self, job_ids, user=None, timeout=runner.DEFAULT_TIMEOUT,
+                 stream_lines=runner.stream_lines):
+        super(JobWatcher, self).__init__(job_ids)
+        self._args = bjobs_args(user)
+        self._timeout = timeout
+        self._stream_lines = stream_lines
+
+    def poll(self):
+        """Query `bjobs' once and update the state of every tracked job.
+
+        Tracked jobs which the query doesn't report become :data:`MISSING`.
+        If the query fails, :attr:`error` says why; jobs it did report are
+        still updated, but no job is considered missing.
+
+        :return: the changes, in the order `bjobs' reported the jobs
+        :rtype: :class:`list` of :class:`Transition`
+        """
+        seen = set()
+        transitions = []
+        self.polls += 1
+        self.error = None
+        lines = self._stream_lines(self._args, timeout=self._timeout)
+        try:
+            self._update(parse_bjobs(lines), transitions, seen)
+        except runner.CommandError as error:
+            self.error = str(error)
+            return transitions
+        states = self.states
+        for job_id, state in states.items():
+            if job_id not in seen and state != MISSING:
+                states[job_id] = MISSING
+                transitions.append(Transition(job_id, state, MISSING))
+        return transitions
+
+
+class EventWatcher(JobTracker):
+    """Tracks the states of a set of jobs by following `lsb.events', without
+    querying mbatchd.
+
+    Each poll reads only the records appended since the last one, and only
+    records of tracked jobs are decoded. If a state file is given, the
+    position in the event file and the states of the jobs are saved there
+    after each poll, so that watching the same jobs again resumes where it
+    stopped rather than reading the whole file again.
+
+    Elements of a job array are only known once they have been dispatched,
+    and jobs which finished before the event file was last rotated are never
+    seen. Jobs never drop out of the event file, so none become
+    :data:`MISSING`.
+    """
+    def __init__(self, job_ids, events_path, state_path=None):
+        job_ids = list(job_ids)
+        super(EventWatcher, self).__init__(job_ids)
+        self._state_path = state_path
+        self._log = events.EventLog(events_path)
+        if state_path is not None:
+            self._resume(events.load_state(state_path), job_ids)
+
+    def _resume(self, state, job_ids):
+        if state is None or state.get('path') != self._log.path:
+            return
+        states = state['states']
+        arrays = set(state['arrays'])
+        # Resuming would miss earlier events of jobs tracked for the first
+        # time, so only resume watching the same jobs, or fewer.
+        if not all(job_id in states or job_id in arrays
+                   for job_id in job_ids):
+            return
+        wanted = set(job_ids)
+        self.states = dict(
+            (job_id, job_state) for job_id, job_state in states.items()
+            if job_id in wanted or job_id.split('[')[0] in wanted)
+        self.exit_codes = dict(
+            (job_id, exit_code)
+            for job_id, exit_code in state['exit_codes'].items()
+            if job_id in self.states)
+        self._arrays = arrays & wanted
+        self._log = events.EventLog.from_dict(state)
+
+    def _records(self):
+        # Records carry the job ID and the array index separately.
+        tracked = set(job_id.split('[')[0].encode('ascii')
+                      for job_id in self.states)
+        tracked.update(job_id.encode('ascii') for job_id in self._arrays)
+        for line in self._log.read_job_records():
+            if events.record_job_id(line) in tracked:
+                record = events.parse_record(line)
+                if record is not None:
+                    yield record
+
+    def poll(self):
+        """Read the records appended to the event file since the last poll
+        and update the state of every tracked job. If the file can't be
+        read, :attr:`error` says why.
+
+        :return: the changes, in the order the records were logged
+        :rtype: :class:`list` of :class:`Transition`
+        """
+        transitions = []
+        self.polls += 1
+        self.error = None
+        try:
+            self._update(self._records(), transitions)
+        except events.EventLogError as error:
+            self.error = str(error)
+            return transitions
+        if self._state_path is not None:
+            self._save()
+        return transitions
+
+    def _save(self):
+        state = self._log.to_dict()
+        state.update(
+            states=self.states,
+            exit_codes=self.exit_codes,
+            arrays=sorted(self._arrays))
+        try:
+            events.save_state(self._state_path, state)
+        except (IOError, OSError) as error:
+            self.error = 'cannot save state: {0}'.format(error)
+
+
+def format_counts(counts):
+    """Format the number of jobs in each state on one line, e.g.,
+    ``'DONE=3 PEND=10 RUN=2'``.
+
+    :param counts: result of :meth:`JobWatcher.counts`
+    :type counts: :class:`collections.Counter`
+    :rtype: :class:`str`
+    """
+    return ' '.join('{0}={1}'.format(state, counts[state])
+                    for state in sorted(counts))
@@ -194,6 +194,19 @@ def test():
     raise SystemExit(_test())
 
 
+@task
+def benchmark():
+    """Run the benchmarks."""
+    import glob
+    retcode = 0
+    for path in sorted(glob.glob(os.path.join('benchmarks', '*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name != '__init__':
+            retcode += subprocess.call(
+                [sys.executable, '-m', 'benchmarks.' + name])
+    raise SystemExit(retcode)
+
+
 @task
 def lint():
     # This refuses to format properly when running `paver help' unless
@@ -20,6 +20,10 @@ python_version_specific_requires = []
 if sys.version_info < (2, 7) or (3, 0) <= sys.version_info < (3, 3):
     python_version_specific_requires.append('argparse')
 
+# psutil is only needed to detect the shell where there is no /proc
+if not sys.platform.startswith('linux'):
+    python_version_specific_requires.append('psutil>=1.0.1')
+
 
 # See here for more options:
 # <http://pythonhosted.org/setuptools/setuptools.html>
@@ -54,7 +58,6 @@ setup_dict = dict(
     packages=['lsf_ibutils', 'lsf_ibutils.ibsub'],
     install_requires=[
         'pinject>=0.10',
-        'psutil>=1.0.1',
     ] + python_version_specific_requires,
     zip_safe=False,  # don't use eggs
     entry_points={
@@ -0,0 +1,333 @@
+from datetime import datetime
+import json
+import io
+from io import StringIO
+
+import pinject
+from mock import MagicMock
+from pytest import fixture, raises
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import batch, pack, queues, validate
+from lsf_ibutils.ibsub.batch import (
+    AnswerError, AnswerPrompt, BatchBindingSpec, BatchError, ExecRow,
+    RunBatch)
+from lsf_ibutils.ibsub.output import (
+    BuildScript, build_command, render_command_to)
+from lsf_ibutils.ibsub.queues import QueueLimits
+from lsf_ibutils.ibsub.submit import SubmitResult
+from lsf_ibutils.ibsub.prompts import (
+    JobName, TasksPerJob, QueueName, OutputFileName, PromptCommand,
+    PromptPipeline)
+from tests.helpers import assert_exc_info_msg
+
+
+QUEUE_LIMITS = {'economy': QueueLimits('economy', max_tasks=16)}
+
+
+class FakeBindingSpec(pinject.BindingSpec):
+    def provide_prompt_pipeline(self, simple_prompt):
+        return PromptPipeline.compile(
+            [JobName, TasksPerJob, QueueName, OutputFileName], {
+                'simple_prompt': simple_prompt,
+                'get_queue_completions': lambda: ['regular', 'economy'],
+                'get_queue_limits': lambda: QUEUE_LIMITS,
+                'get_queue_loads': lambda: {},
+                'get_queue_topology': lambda: {},
+                'validate_positive_integer': validate.positive_integer,
+                'validate_queue_limits': queues.validate_answers,
+            })
+
+    def provide_prompt_command(self, simple_prompt):
+        return PromptCommand(simple_prompt)
+
+
+@fixture
+def obj_graph():
+    return pinject.new_object_graph(
+        modules=None, binding_specs=[BatchBindingSpec(), FakeBindingSpec()])
+
+
+@parametrize(('file_name', 'format_'), [
+    ('params.csv', 'csv'),
+    ('params.CSV', 'csv'),
+    ('params.jsonl', 'jsonl'),
+    ('params.json', 'jsonl'),
+    ('-', 'csv'),
+])
+def test_detect_format(file_name, format_):
+    assert batch.detect_format(file_name) == format_
+
+
+class TestReadRows(object):
+    def test_csv(self):
+        rows = batch.read_rows(
+            StringIO(u'JobName,TasksPerJob\na,1\nb,2\n'), 'csv')
+        assert [dict(row) for row in rows] == [
+            {'JobName': 'a', 'TasksPerJob': '1'},
+            {'JobName': 'b', 'TasksPerJob': '2'},
+        ]
+
+    def test_jsonl(self):
+        rows = batch.read_rows(StringIO(
+            u'{"JobName": "a", "TasksPerJob": 1}\n\n{"JobName": "b"}\n'),
+            'jsonl')
+        assert list(rows) == [
+            {'JobName': 'a', 'TasksPerJob': 1},
+            {'JobName': 'b'},
+        ]
+
+    def test_jsonl_invalid(self):
+        rows = batch.read_rows(StringIO(u'{"JobName": "a"}\n[1]\n'), 'jsonl')
+        with raises(BatchError) as exc_info:
+            list(rows)
+        assert_exc_info_msg(exc_info, 'line 2: expected a JSON object')
+
+    def test_invalid_format(self):
+        with raises(BatchError) as exc_info:
+            batch.read_rows(StringIO(u''), 'xml')
+        assert_exc_info_msg(
+            exc_info,
+            "invalid parameter file format 'xml', valid formats are "
+            "'csv', 'jsonl'")
+
+
+class TestAnswerPrompt(object):
+    @fixture
+    def answer_prompt(self):
+        answer_prompt = AnswerPrompt()
+        answer_prompt.field = 'Field'
+        return answer_prompt
+
+    def test_returns_answer(self, answer_prompt):
+        answer_prompt.answer = 'value'
+        assert answer_prompt('not used') == 'value'
+
+    @parametrize('answer', [None, ''])
+    def test_default(self, answer_prompt, answer):
+        answer_prompt.answer = answer
+        assert answer_prompt('not used', default='dflt') == 'dflt'
+
+    def test_not_required(self, answer_prompt):
+        assert answer_prompt('not used') is None
+
+    def test_required(self, answer_prompt):
+        with raises(AnswerError) as exc_info:
+            answer_prompt('not used', required=True)
+        assert_exc_info_msg(exc_info, 'Field: a value is required')
+
+    def test_invalid(self, answer_prompt):
+        answer_prompt.answer = 'bad'
+        with raises(AnswerError) as exc_info:
+            answer_prompt('not used', format_='number',
+                          validator=lambda text: False)
+        assert_exc_info_msg(
+            exc_info, "Field: invalid value 'bad', expected number")
+
+
+class TestExecRow(object):
+    @fixture
+    def exec_row(self, obj_graph):
+        return obj_graph.provide(ExecRow)
+
+    def test_field_names(self, exec_row):
+        assert exec_row.field_names == [
+            'JobName', 'TasksPerJob', 'QueueName', 'OutputFileName',
+            'Command']
+
+    def test_valid_row(self, exec_row):
+        assert exec_row({
+            'JobName': 'job',
+            'TasksPerJob': 4,
+            'QueueName': 'economy',
+            'Command': 'run it',
+        }) == ([
+            ['-J', 'job'],
+            ['-n', '4'],
+            ['-q', 'economy'],
+            ['-o', 'job.%J.out'],
+        ], 'run it', [])
+
+    def test_reports_all_errors(self, exec_row):
+        flags, command, errors = exec_row({
+            'TasksPerJob': '-1',
+            'QueueName': 'nosuchqueue',
+            'Bogus': 'x',
+        })
+        assert errors == [
+            'Bogus: unknown column',
+            'JobName: a value is required',
+            "TasksPerJob: invalid value '-1', expected positive number",
+            "QueueName: invalid value 'nosuchqueue'",
+            'Command: a value is required',
+        ]
+
+    def test_rejects_non_scalar_answers(self, exec_row):
+        _, _, errors = exec_row({
+            'JobName': ['a'],
+            'TasksPerJob': {'n': 4},
+            'Command': 'run it',
+        })
+        assert errors == [
+            'JobName: expected text, a number or a boolean, got ["a"]',
+            'TasksPerJob: expected text, a number or a boolean, got '
+            '{"n": 4}',
+        ]
+
+    @parametrize(('answer', 'job_name'), [
+        (True, 'y'),
+        (False, 'n'),
+        (2.5, '2.5'),
+        (u'caf\xe9', u'caf\xe9'),
+    ])
+    def test_converts_scalar_answers(self, exec_row, answer, job_name):
+        flags, _, errors = exec_row(
+            {'JobName': answer, 'TasksPerJob': 1, 'Command': 'run it'})
+        assert errors == []
+        assert flags[0] == ['-J', job_name]
+
+    def test_checks_queue_limits(self, exec_row):
+        _, _, errors = exec_row({
+            'JobName': 'job',
+            'TasksPerJob': '32',
+            'QueueName': 'economy',
+            'Command': 'run it',
+        })
+        assert errors == [
+            "QueueName: invalid value 'economy', expected one allowing "
+            "32 tasks",
+        ]
+
+    def test_no_queue_fits(self, exec_row, monkeypatch):
+        monkeypatch.setitem(QUEUE_LIMITS, 'regular',
+                            QueueLimits('regular', max_tasks=16))
+        _, _, errors = exec_row({
+            'JobName': 'job',
+            'TasksPerJob': '32',
+            'Command': 'run it',
+        })
+        assert errors == ['QueueName: no queue allows 32 tasks']
+
+    def test_exec_rows(self, exec_row, monkeypatch):
+        monkeypatch.setattr(validate, 'COLUMN_CHUNK_SIZE', 2)
+        rows = [{'JobName': 'job', 'TasksPerJob': tasks, 'Command': 'run it'}
+                for tasks in ['4', '-1', 8, '0', 'x']]
+        assert list(exec_row.exec_rows(rows)) == [exec_row(row)
+                                                  for row in rows]
+
+    def test_exec_rows_checks_columns(self, exec_row, monkeypatch):
+        checked = []
+        column_validator = validate.positive_integer_column
+
+        def record(texts):
+            checked.append(texts)
+            return column_validator(texts)
+        monkeypatch.setitem(validate.COLUMN_VALIDATORS,
+                            validate.positive_integer, record)
+        rows = [{'JobName': 'job', 'TasksPerJob': tasks, 'Command': 'run it'}
+                for tasks in ['4', '-1', 8, '']]
+        # The first row teaches which validator checks each column.
+        exec_row(rows[0])
+        results = list(exec_row.exec_rows(rows))
+        assert checked == [['4', '-1', '8']]
+        assert [errors for _, _, errors in results] == [
+            [],
+            ["TasksPerJob: invalid value '-1', expected positive number"],
+            [],
+            ['TasksPerJob: a value is required'],
+        ]
+
+
+class TestRunBatch(object):
+    @fixture
+    def mock_exec_row(self):
+        mock = MagicMock(side_effect=lambda row: row)
+        mock.exec_rows.side_effect = lambda rows: (mock(row) for row in rows)
+        return mock
+
+    @fixture
+    def run_batch(self, mock_exec_row):
+        return RunBatch(
+            mock_exec_row, BuildScript(lambda: datetime(2013, 9, 12, 15, 24, 11)),
+            build_command, render_command_to)
+
+    def test_commands(self, run_batch):
+        out = StringIO()
+        err = StringIO()
+        assert run_batch([
+            ([['-J', 'a']], 'cmd a', []),
+            (None, None, ['JobName: a value is required']),
+            ([['-J', 'c']], 'cmd c', []),
+        ], 'command', 'bash', out, err) == (2, 1)
+        assert out.getvalue() == 'bsub -J a cmd a\nbsub -J c cmd c\n'
+        assert err.getvalue() == 'row 2: JobName: a value is required\n'
+
+    def test_scripts(self, run_batch, tmpdir):
+        assert run_batch([
+            ([['-J', 'a']], 'cmd a', []),
+            ([['-J', 'b']], 'cmd b', []),
+        ], 'script', 'bash', StringIO(), StringIO(),
+            output_directory=str(tmpdir)) == (2, 0)
+        assert sorted(tmpdir.listdir()) == [
+            tmpdir.join('job-00000001.lsf'), tmpdir.join('job-00000002.lsf')]
+        assert tmpdir.join('job-00000002.lsf').read().endswith(
+            '#BSUB -J b\n\ncmd b\n')
+
+    @parametrize('jobs', [1, 2])
+    def test_shards(self, run_batch, tmpdir, monkeypatch, jobs):
+        monkeypatch.setattr(batch, 'SHARD_SIZE', 2)
+        err = StringIO()
+        assert run_batch([
+            ([['-J', 'a']], 'cmd a', []),
+            (None, None, ['JobName: a value is required', 'Command: bad']),
+            ([['-J', 'c']], 'cmd c', []),
+            ([['-J', 'd']], 'cmd d', []),
+            ([['-J', 'e']], 'cmd e', []),
+        ], 'script', 'bash', StringIO(), err,
+            output_directory=str(tmpdir), jobs=jobs) == (4, 1)
+        assert err.getvalue() == ('row 2: JobName: a value is required\n'
+                                  'row 2: Command: bad\n')
+        manifest = [json.loads(line) for line in
+                    tmpdir.join('manifest.jsonl').readlines()]
+        assert manifest == [
+            {'row': 1, 'script': 'shard-00000/job-00000001.lsf'},
+            {'row': 3, 'script': 'shard-00001/job-00000003.lsf'},
+            {'row': 4, 'script': 'shard-00001/job-00000004.lsf'},
+            {'row': 5, 'script': 'shard-00002/job-00000005.lsf'},
+        ]
+        assert tmpdir.join('shard-00002', 'job-00000005.lsf').read().endswith(
+            '#BSUB -J e\n\ncmd e\n')
+
+    def test_archive(self, run_batch):
+        stream = io.BytesIO()
+        archive = pack.PackWriter(stream)
+        assert run_batch([
+            (None, None, ['JobName: a value is required']),
+            ([['-J', 'b']], 'cmd b', []),
+        ], 'script', 'bash', StringIO(), StringIO(), archive=archive) == (
+            1, 1)
+        archive.close()
+        stream.seek(0)
+        row_number, script = pack.PackReader(stream).entry(1)
+        assert row_number == 2
+        assert script.endswith('#BSUB -J b\n\ncmd b\n')
+
+    def test_submit(self, run_batch):
+        mock_submitter = MagicMock()
+
+        def submit_all(jobs):
+            for key, command in jobs:
+                result = SubmitResult(key, command)
+                result.job_id = str(key)
+                yield result
+        mock_submitter.submit_all.side_effect = submit_all
+        out = StringIO()
+        assert run_batch([
+            ([['-J', 'a']], 'cmd a', []),
+            (None, None, ['JobName: a value is required']),
+        ], 'command', 'bash', out, StringIO(),
+            submitter=mock_submitter) == (1, 1)
+        manifest = json.loads(out.getvalue())
+        assert manifest['key'] == 1
+        assert manifest['command'] == 'bsub -J a cmd a'
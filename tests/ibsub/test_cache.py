@@ -0,0 +1,118 @@
+import os
+import threading
+
+from mock import MagicMock
+from pytest import fixture
+
+from lsf_ibutils.ibsub import cache
+from lsf_ibutils.ibsub.cache import DiskCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@fixture
+def clock():
+    return FakeClock()
+
+
+@fixture
+def disk_cache(tmpdir, clock):
+    return DiskCache(str(tmpdir.join('cache')), ttl=60, clock=clock)
+
+
+def test_default_directory_uses_xdg(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', '/xdg/cache')
+    assert cache.default_directory() == '/xdg/cache/lsf-ibutils'
+
+
+def test_default_directory_without_xdg(monkeypatch):
+    monkeypatch.delenv('XDG_CACHE_HOME', raising=False)
+    monkeypatch.setenv('HOME', '/home/user')
+    assert cache.default_directory() == '/home/user/.cache/lsf-ibutils'
+
+
+class TestDiskCache(object):
+    def test_miss_computes_and_stores(self, disk_cache):
+        compute = MagicMock(return_value=['a', 'b'])
+        assert disk_cache.get('key', compute) == ['a', 'b']
+        compute.assert_called_once_with()
+        assert os.path.exists(disk_cache.path('key'))
+        assert disk_cache.stats.misses == 1
+        assert disk_cache.stats.refreshes == 1
+
+    def test_fresh_hit(self, disk_cache):
+        disk_cache.get('key', lambda: ['a'])
+        compute = MagicMock()
+        assert disk_cache.get('key', compute) == ['a']
+        assert compute.call_count == 0
+        assert disk_cache.stats.hits == 1
+
+    def test_persists_across_instances(self, disk_cache, clock):
+        disk_cache.get('key', lambda: ['a'])
+        other = DiskCache(disk_cache.directory, clock=clock)
+        assert other.get('key', MagicMock()) == ['a']
+
+    def test_stale_returns_old_value_and_refreshes(self, disk_cache, clock):
+        disk_cache.get('key', lambda: ['old'])
+        clock.now += 61
+        assert disk_cache.get('key', lambda: ['new']) == ['old']
+        disk_cache.wait()
+        assert disk_cache.stats.stale_hits == 1
+        assert disk_cache.stats.refreshes == 2
+        assert disk_cache.get('key', MagicMock()) == ['new']
+
+    def test_wait_times_out(self, disk_cache, clock):
+        disk_cache.get('key', lambda: ['old'])
+        clock.now += 61
+        release = threading.Event()
+
+        def compute():
+            release.wait()
+            return ['new']
+        disk_cache.get('key', compute)
+        assert not disk_cache.wait(timeout=0.01)
+        release.set()
+        assert disk_cache.wait(timeout=5)
+
+    def test_refresh_ignores_fresh_entry(self, disk_cache):
+        disk_cache.get('key', lambda: ['old'])
+        assert disk_cache.refresh('key', lambda: ['new']) == ['new']
+        assert disk_cache.get('key', MagicMock()) == ['new']
+
+    def test_failed_compute_is_not_stored(self, disk_cache):
+        assert disk_cache.get('key', lambda: None) is None
+        assert not os.path.exists(disk_cache.path('key'))
+
+    def test_disabled(self, disk_cache):
+        disk_cache.configure(enabled=False)
+        assert disk_cache.get('key', lambda: ['a']) == ['a']
+        assert not os.path.exists(disk_cache.path('key'))
+        assert disk_cache.get('key', lambda: ['b']) == ['b']
+
+    def test_force_refresh(self, disk_cache):
+        disk_cache.get('key', lambda: ['old'])
+        disk_cache.configure(force_refresh=True)
+        assert disk_cache.get('key', lambda: ['new']) == ['new']
+        disk_cache.configure(force_refresh=False)
+        assert disk_cache.get('key', MagicMock()) == ['new']
+
+    def test_corrupt_entry_is_a_miss(self, disk_cache):
+        disk_cache.get('key', lambda: ['a'])
+        with open(disk_cache.path('key'), 'w') as cache_file:
+            cache_file.write('{not json')
+        assert disk_cache.get('key', lambda: ['b']) == ['b']
+
+    def test_unsafe_key_characters(self, disk_cache):
+        path = disk_cache.path('../queues user')
+        assert os.path.dirname(path) == disk_cache.directory
+        assert os.path.basename(path) == '.._queues_user.json'
+
+    def test_no_temporary_files_left(self, disk_cache):
+        disk_cache.get('key', lambda: ['a'])
+        assert os.listdir(disk_cache.directory) == ['key.json']
@@ -0,0 +1,294 @@
+import threading
+
+from mock import MagicMock
+from pytest import fixture
+
+from lsf_ibutils.ibsub import completers
+from lsf_ibutils.ibsub.completers import (
+    GetQueueCompletions, GetQueueLimits, GetQueueLoads, GetQueueTopology,
+    GetGroupCompletions, PrefetchCompletions)
+from lsf_ibutils.ibsub.queues import QueueLimits
+
+
+@fixture
+def mock_command_runner():
+    return MagicMock()
+
+
+def _queue_table(*names):
+    return [[name, 'Open:Active', 0, 0, 0, 0] for name in names]
+
+
+def test_parse_queue_names():
+    assert completers.parse_queue_names(iter([
+        'QUEUE_NAME      PRIO STATUS          MAX JL/U JL/P JL/H NJOBS',
+        'regular          30  Open:Active       -    -    -    -  3000',
+        '',
+        'economy          20  Open:Active       -    -    -    -    10',
+    ])) == ['regular', 'economy']
+
+
+def test_parse_queue_table():
+    assert completers.parse_queue_table(iter([
+        'QUEUE_NAME      PRIO STATUS          MAX JL/U JL/P JL/H NJOBS  PEND'
+        '   RUN  SUSP',
+        'regular          30  Open:Active       -    -    -    -  3000  2990'
+        '    10     0',
+        '',
+        'economy          20  Closed:Inact      -    -    -    -    12     0'
+        '    10     2',
+    ])) == [
+        ['regular', 'Open:Active', 3000, 2990, 10, 0],
+        ['economy', 'Closed:Inact', 12, 0, 10, 2],
+    ]
+
+
+def test_parse_queue_table_split_suspended():
+    assert completers.parse_queue_table(iter([
+        'QUEUE_NAME PRIO STATUS MAX NJOBS PEND RUN SSUSP USUSP RSV',
+        'regular    30   Open:Active - 10 1 6 2 1 0',
+    ])) == [['regular', 'Open:Active', 10, 1, 6, 3]]
+
+
+class TestParseGroupIndex(object):
+    def test_subgroups(self):
+        assert completers.parse_group_index(iter([
+            'GROUP_NAME    USERS',
+            'physics       alice bob',
+            'scsg          carol physics/',
+            'cisl          scsg/ dave',
+            'everyone      all',
+        ])) == {
+            'alice': 'physics scsg cisl',
+            'bob': 'physics scsg cisl',
+            'carol': 'scsg cisl',
+            'dave': 'cisl',
+        }
+
+    def test_cycles(self):
+        assert completers.parse_group_index(iter([
+            'GROUP_NAME    USERS',
+            'a             alice b/',
+            'b             bob a/',
+            'c             c/ carol',
+        ])) == {
+            'alice': 'a b',
+            'bob': 'a b',
+            'carol': 'c',
+        }
+
+    def test_subgroup_defined_later(self):
+        assert completers.parse_group_index(iter([
+            'GROUP_NAME    USERS',
+            'b             bob',
+            'a             alice',
+            'outer         inner/',
+            'inner         b/',
+        ]))['bob'] == 'b outer inner'
+
+
+def test_parse_empty_output():
+    assert completers.parse_queue_names(iter([])) == []
+
+
+class TestGetQueueCompletions(object):
+    @fixture
+    def get_queue_completions(self, mock_command_runner):
+        return GetQueueCompletions(mock_command_runner)
+
+    def test_queries_for_user(
+            self, get_queue_completions, mock_command_runner, monkeypatch):
+        monkeypatch.setenv('USER', 'alice')
+        mock_command_runner.query.return_value = _queue_table('regular')
+        assert get_queue_completions() == ['regular']
+        mock_command_runner.query.assert_called_once_with(
+            ['bqueues', '-w', '-u', 'alice'], completers.parse_queue_table,
+            refresh=False)
+
+    def test_memoizes(self, get_queue_completions, mock_command_runner):
+        mock_command_runner.query.return_value = _queue_table(
+            'regular', 'economy')
+        assert get_queue_completions() == ['regular', 'economy']
+        assert get_queue_completions() == ['regular', 'economy']
+        assert mock_command_runner.query.call_count == 1
+
+    def test_loads(self, get_queue_completions, mock_command_runner):
+        mock_command_runner.query.return_value = [
+            ['regular', 'Open:Active', 3000, 2990, 10, 0]]
+        loads = get_queue_completions.loads()
+        assert list(loads) == ['regular']
+        assert loads['regular'].pending == 2990
+        assert loads['regular'].running == 10
+        # The loads come from the same query as the completions.
+        assert get_queue_completions() == ['regular']
+        assert GetQueueLoads(get_queue_completions)() is loads
+        assert mock_command_runner.query.call_count == 1
+
+    def test_failed_query_gives_no_completions(
+            self, get_queue_completions, mock_command_runner):
+        mock_command_runner.query.return_value = None
+        assert get_queue_completions() == []
+
+    def test_prefetch_blocks_until_ready(
+            self, get_queue_completions, mock_command_runner):
+        release = threading.Event()
+
+        def slow_query(args, parse, refresh):
+            release.wait()
+            return _queue_table('regular')
+        mock_command_runner.query.side_effect = slow_query
+        get_queue_completions.prefetch()
+        # Prefetching twice doesn't start another query.
+        get_queue_completions.prefetch()
+        release.set()
+        assert get_queue_completions() == ['regular']
+        assert mock_command_runner.query.call_count == 1
+
+    def test_refresh_queries_again(
+            self, get_queue_completions, mock_command_runner):
+        mock_command_runner.query.return_value = _queue_table('regular')
+        assert get_queue_completions() == ['regular']
+        mock_command_runner.query.return_value = _queue_table(
+            'regular', 'economy')
+        get_queue_completions.refresh()
+        get_queue_completions._refresh_thread.join()
+        assert get_queue_completions() == ['regular', 'economy']
+        assert mock_command_runner.query.call_count == 2
+        # The disk cache would still hold the first result.
+        assert mock_command_runner.query.call_args[1] == {'refresh': True}
+
+    def test_serves_old_completions_while_refreshing(
+            self, get_queue_completions, mock_command_runner):
+        mock_command_runner.query.return_value = _queue_table('regular')
+        assert get_queue_completions() == ['regular']
+        release = threading.Event()
+
+        def slow_query(args, parse, refresh):
+            release.wait()
+            return _queue_table('economy')
+        mock_command_runner.query.side_effect = slow_query
+        get_queue_completions.refresh()
+        # Neither waits for the refresh nor queries LSF itself.
+        assert get_queue_completions() == ['regular']
+        assert list(get_queue_completions.loads()) == ['regular']
+        release.set()
+        get_queue_completions._refresh_thread.join()
+        assert get_queue_completions() == ['economy']
+        assert list(get_queue_completions.loads()) == ['economy']
+        assert mock_command_runner.query.call_count == 2
+
+
+class TestGetGroupCompletions(object):
+    @fixture
+    def get_group_completions(self, mock_command_runner):
+        return GetGroupCompletions(mock_command_runner)
+
+    def test_no_user(
+            self, get_group_completions, mock_command_runner, monkeypatch):
+        monkeypatch.delenv('USER', raising=False)
+        assert get_group_completions() == []
+        assert mock_command_runner.query.call_count == 0
+
+    def test_parses_for_user(
+            self, get_group_completions, mock_command_runner, monkeypatch):
+        monkeypatch.setenv('USER', 'alice')
+        mock_command_runner.query.side_effect = (
+            lambda args, parse, refresh: parse(
+                iter(['GROUP_NAME USERS', 'g alice'])))
+        assert get_group_completions() == ['g']
+
+    def test_index_serves_any_user(
+            self, get_group_completions, mock_command_runner):
+        mock_command_runner.query.side_effect = (
+            lambda args, parse, refresh: parse(iter(
+                ['GROUP_NAME USERS', 'g alice', 'h bob g/'])))
+        assert get_group_completions.groups_of('alice') == ['g', 'h']
+        assert get_group_completions.groups_of('bob') == ['h']
+        assert get_group_completions.groups_of('nobody') == []
+        assert mock_command_runner.query.call_count == 1
+
+
+class TestGetQueueLimits(object):
+    @fixture
+    def get_queue_limits(self, mock_command_runner):
+        return GetQueueLimits(mock_command_runner)
+
+    def test_parses_limits(self, get_queue_limits, mock_command_runner):
+        mock_command_runner.query.side_effect = (
+            lambda args, parse, refresh: parse(iter(
+                ['QUEUE: regular', ' PROCLIMIT', ' 64'])))
+        limits = get_queue_limits()
+        assert list(limits) == ['regular']
+        assert limits['regular'].max_tasks == 64
+        mock_command_runner.query.assert_called_once_with(
+            ['bqueues', '-l'], mock_command_runner.query.call_args[0][1],
+            refresh=False)
+        # Memoized.
+        assert get_queue_limits() is limits
+
+    def test_failed_query(self, get_queue_limits, mock_command_runner):
+        mock_command_runner.query.return_value = None
+        assert get_queue_limits() == {}
+
+
+class TestGetQueueTopology(object):
+    OUTPUTS = {
+        'lshosts': [
+            'HOST_NAME type model cpuf ncpus maxmem maxswp server RESOURCES',
+            'ys0101 X86_64 Intel_EM 60.0 16 31.9G 15.9G Yes (mg)',
+            'ys0102 X86_64 Intel_EM 60.0 16 31.9G 15.9G Yes (mg)',
+            'login1 X86_64 Intel_EM 60.0 8 15.9G 15.9G Yes ()',
+        ],
+        'bhosts': [
+            'HOST_NAME STATUS JL/U MAX NJOBS RUN SSUSP USUSP RSV',
+            'ys0101 ok - 16 0 0 0 0 0',
+            'ys0102 ok - - 0 0 0 0 0',
+            'login1 closed - 2 0 0 0 0 0',
+        ],
+        'bmgroup': [
+            'GROUP_NAME HOSTS',
+            'ys01 ys0101 ys0102',
+        ],
+    }
+
+    @fixture
+    def get_queue_topology(self, mock_command_runner):
+        mock_command_runner.query.side_effect = (
+            lambda args, parse, refresh: parse(iter(self.OUTPUTS[args[0]])))
+        return GetQueueTopology(mock_command_runner, lambda: {
+            'regular': QueueLimits('regular', hosts=['ys01/']),
+            'login': QueueLimits('login', hosts=['login1']),
+        })
+
+    def test_indexes_by_queue(self, get_queue_topology):
+        topology = get_queue_topology()
+        assert sorted(topology) == ['login', 'regular']
+        assert [host.name for host in topology['regular'].hosts] == [
+            'ys0101', 'ys0102']
+        # ys0102 has no slot limit, so has a slot per core.
+        assert topology['regular'].slots_per_host == 16
+        assert topology['login'].slots_per_host == 2
+        assert topology['regular'].hosts[0].memory == 32665
+
+    def test_failed_queries(self, get_queue_topology, mock_command_runner):
+        mock_command_runner.query.side_effect = None
+        mock_command_runner.query.return_value = None
+        topology = get_queue_topology()
+        assert topology['regular'].hosts == []
+        assert topology['regular'].slots_per_host is None
+
+
+class TestPrefetchCompletions(object):
+    @fixture
+    def completers(self):
+        return [MagicMock(), MagicMock(), MagicMock(), MagicMock()]
+
+    def test_prefetches_all(self, completers):
+        PrefetchCompletions(*completers)()
+        for completer in completers:
+            completer.prefetch.assert_called_once_with()
+
+    def test_refreshes_all(self, completers):
+        PrefetchCompletions(*completers).refresh()
+        for completer in completers:
+            completer.refresh.assert_called_once_with()
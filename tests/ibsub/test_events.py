@@ -0,0 +1,282 @@
+import os
+
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import events
+from lsf_ibutils.ibsub.events import EventLog
+from lsf_ibutils.ibsub.main import WatchMain
+from lsf_ibutils.ibsub.watch import EventWatcher
+
+
+# Records laid out as LSF writes them, with only the fields which matter set.
+def job_new(job_id, name='job'):
+    return ('"JOB_NEW" "10.1" 1369000000 {0} 1000 33554434 1 1369000000 0 '
+            '0 -65535 -1 0 "user" -1 -1 -1 -1 -1 -1 -1 -1 -1 -1 -1 "" 1.00 '
+            '18 "normal" "" "login1" "/home/user" "" "" "" "" "" "" '
+            '"/home/user" "1369000000.{0}" 0 "" "" "{1}" "./run"\n').format(
+                job_id, name)
+
+
+def job_start(job_id, hosts=('node1',), index=0):
+    return ('"JOB_START" "10.1" 1369000100 {0} 4 0 0 1.00 {1} {2} "" "" 0 '
+            '"" {3} "" 0 0\n').format(
+                job_id, len(hosts), ' '.join('"{0}"'.format(host)
+                                             for host in hosts), index)
+
+
+def job_status(job_id, status, exit_status=0, index=0, rusage=False):
+    fields = ['"JOB_STATUS"', '"10.1"', '1369000200', str(job_id),
+              str(status), '0', '0', '12.5', '1369000200']
+    if rusage:
+        fields += ['1'] + ['0'] * 19
+    else:
+        fields += ['0']
+    fields += ['0', str(exit_status), str(index), '0', '-1', '0']
+    return ' '.join(fields) + '\n'
+
+
+def job_signal(job_id):
+    return '"JOB_SIGNAL" "10.1" 1369000300 {0} 1000 0 "KILL" 0 0 -1\n'.format(
+        job_id)
+
+
+@parametrize(('status', 'state'), [
+    (0x01, 'PEND'),
+    (0x02, 'PSUSP'),
+    (0x04, 'RUN'),
+    (0x08 | 0x04, 'SSUSP'),
+    (0x20, 'EXIT'),
+    (0x40, 'DONE'),
+    (0x40 | 0x80, 'DONE'),
+    (0x20 | 0x100, 'EXIT'),
+    (0, 'UNKWN'),
+])
+def test_job_state(status, state):
+    assert events.job_state(status) == state
+
+
+@parametrize(('line', 'record'), [
+    (job_new(7), ('7', None, 'PEND', None)),
+    (job_start(7, hosts=['node1', 'node2']), ('7', None, 'RUN', None)),
+    (job_start(7, index=3), ('7[3]', '7', 'RUN', None)),
+    (job_status(7, 0x40), ('7', None, 'DONE', None)),
+    (job_status(7, 0x20, exit_status=2 << 8), ('7', None, 'EXIT', '2')),
+    (job_status(7, 0x20, exit_status=9), ('7', None, 'EXIT', '9')),
+    (job_status(7, 0x20, exit_status=3 << 8, index=4, rusage=True),
+     ('7[4]', '7', 'EXIT', '3')),
+    (b'"JOB_STATUS" "10.1" 1369000200 7 x\n', None),
+    (b'"JOB_START" "10.1" 1369000200 7 4 0 0\n', None),
+])
+def test_parse_record(line, record):
+    if not isinstance(line, bytes):
+        line = line.encode('ascii')
+    assert events.parse_record(line) == record
+
+
+def test_parse_record_quoted_fields():
+    line = job_new(7, name='say ""hi"" [1]').encode('ascii')
+    assert events.parse_record(line) == ('7', None, 'PEND', None)
+
+
+def test_record_job_id():
+    assert events.record_job_id(job_status(12, 0x40).encode('ascii')) == b'12'
+
+
+class TestEventLog(object):
+    @pytest.fixture
+    def events_file(self, tmpdir):
+        path = tmpdir.join('lsb.events')
+        path.write('#1\n')
+        return path
+
+    def read(self, log):
+        return [events.record_job_id(line).decode('ascii')
+                for line in log.read_job_records()]
+
+    def test_reads_only_job_records(self, events_file):
+        events_file.write(job_new(1) + job_signal(1) + job_start(1), 'a')
+        log = EventLog(str(events_file))
+        assert self.read(log) == ['1', '1']
+        assert log.offset == events_file.size()
+        assert log.inode == os.stat(str(events_file)).st_ino
+
+    def test_reads_only_appended_records(self, events_file):
+        events_file.write(job_new(1), 'a')
+        log = EventLog(str(events_file))
+        assert self.read(log) == ['1']
+        assert self.read(log) == []
+        events_file.write(job_new(2), 'a')
+        assert self.read(log) == ['2']
+
+    def test_leaves_partial_record(self, events_file):
+        record = job_new(1)
+        events_file.write(record[:20], 'a')
+        log = EventLog(str(events_file))
+        assert self.read(log) == []
+        events_file.write(record[20:], 'a')
+        assert self.read(log) == ['1']
+
+    def test_reads_in_chunks(self, events_file, monkeypatch):
+        monkeypatch.setattr(events, 'READ_SIZE', 7)
+        events_file.write(''.join(job_new(job_id) for job_id in range(5)),
+                          'a')
+        log = EventLog(str(events_file))
+        assert self.read(log) == ['0', '1', '2', '3', '4']
+        assert log.offset == events_file.size()
+
+    def test_resumes_from_saved_position(self, events_file):
+        events_file.write(job_new(1), 'a')
+        log = EventLog(str(events_file))
+        self.read(log)
+        events_file.write(job_new(2), 'a')
+        assert self.read(EventLog.from_dict(log.to_dict())) == ['2']
+
+    def test_finishes_rotated_file(self, events_file, tmpdir):
+        events_file.write(job_new(1), 'a')
+        log = EventLog(str(events_file))
+        self.read(log)
+        events_file.write(job_start(1), 'a')
+        # mbatchd renames the file and starts a new one.
+        events_file.rename(tmpdir.join('lsb.events.1'))
+        tmpdir.join('lsb.events').write('#2\n' + job_status(1, 0x40))
+        assert self.read(log) == ['1', '1']
+        assert log.inode == os.stat(str(events_file)).st_ino
+
+    def test_rotated_file_gone(self, events_file, tmpdir):
+        log = EventLog(str(events_file))
+        self.read(log)
+        events_file.remove()
+        tmpdir.join('lsb.events').write('#2\n' + job_new(2))
+        assert self.read(log) == ['2']
+
+    def test_truncated_file(self, events_file):
+        events_file.write(job_new(1) + job_new(2), 'a')
+        log = EventLog(str(events_file))
+        self.read(log)
+        events_file.write('#1\n' + job_new(3))
+        assert self.read(log) == ['3']
+
+    def test_missing_file(self, tmpdir):
+        log = EventLog(str(tmpdir.join('lsb.events')))
+        with pytest.raises(events.EventLogError):
+            self.read(log)
+
+
+def test_save_and_load_state(tmpdir):
+    path = str(tmpdir.join('state', 'watch.json'))
+    assert events.load_state(path) is None
+    events.save_state(path, {'offset': 3})
+    assert events.load_state(path) == {'offset': 3}
+    assert os.listdir(str(tmpdir.join('state'))) == ['watch.json']
+
+
+def test_default_state_path(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    path = events.default_state_path('lsb.events', ['2', '1'])
+    assert path.startswith(str(tmpdir.join('lsf-ibutils', 'events')))
+    assert path == events.default_state_path('lsb.events', ['1', '2', '1'])
+    assert path != events.default_state_path('lsb.events', ['1'])
+
+
+class TestEventWatcher(object):
+    @pytest.fixture
+    def events_file(self, tmpdir):
+        path = tmpdir.join('lsb.events')
+        path.write('#1\n')
+        return path
+
+    def test_reports_changes_of_tracked_jobs(self, events_file):
+        events_file.write(job_new(1) + job_new(2) + job_new(3), 'a')
+        watcher = EventWatcher(['1', '2'], str(events_file))
+        assert [str(t) for t in watcher.poll()] == [
+            '1\t- -> PEND', '2\t- -> PEND']
+        events_file.write(job_start(1) + job_start(3) + job_start(2), 'a')
+        assert [str(t) for t in watcher.poll()] == [
+            '1\tPEND -> RUN', '2\tPEND -> RUN']
+        assert watcher.poll() == []
+        events_file.write(
+            job_status(2, 0x40) + job_status(1, 0x20, exit_status=1 << 8),
+            'a')
+        assert [str(t) for t in watcher.poll()] == [
+            '2\tRUN -> DONE', '1\tRUN -> EXIT (exit code 1)']
+        assert watcher.finished
+        assert watcher.exit_codes == {'1': '1'}
+
+    def test_unseen_jobs_are_not_missing(self, events_file):
+        watcher = EventWatcher(['1'], str(events_file))
+        assert watcher.poll() == []
+        assert watcher.counts() == {'UNSEEN': 1}
+        assert not watcher.finished
+
+    def test_tracks_array_elements(self, events_file):
+        events_file.write(job_new(5) + job_start(5, index=1) +
+                          job_start(5, index=2) + job_status(5, 0x40, index=1),
+                          'a')
+        watcher = EventWatcher(['5'], str(events_file))
+        watcher.poll()
+        assert watcher.states == {'5[1]': 'DONE', '5[2]': 'RUN'}
+
+    def test_tracks_one_array_element(self, events_file):
+        events_file.write(job_start(5, index=1) + job_start(5, index=2), 'a')
+        watcher = EventWatcher(['5[2]'], str(events_file))
+        watcher.poll()
+        assert watcher.states == {'5[2]': 'RUN'}
+
+    def test_unreadable_file(self, tmpdir):
+        watcher = EventWatcher(['1'], str(tmpdir.join('lsb.events')))
+        assert watcher.poll() == []
+        assert 'lsb.events' in watcher.error
+
+    def test_resumes_from_state_file(self, events_file, tmpdir):
+        state_path = str(tmpdir.join('state.json'))
+        events_file.write(job_new(1) + job_new(2), 'a')
+        EventWatcher(['1', '2'], str(events_file), state_path).poll()
+        events_file.write(job_start(1), 'a')
+        watcher = EventWatcher(['1', '2'], str(events_file), state_path)
+        assert watcher.states == {'1': 'PEND', '2': 'PEND'}
+        assert [str(t) for t in watcher.poll()] == ['1\tPEND -> RUN']
+        # Watching fewer of the jobs resumes too.
+        watcher = EventWatcher(['2'], str(events_file), state_path)
+        assert watcher.states == {'2': 'PEND'}
+
+    def test_resumes_array_elements(self, events_file, tmpdir):
+        state_path = str(tmpdir.join('state.json'))
+        events_file.write(job_start(5, index=1), 'a')
+        EventWatcher(['5'], str(events_file), state_path).poll()
+        events_file.write(job_status(5, 0x40, index=1), 'a')
+        watcher = EventWatcher(['5'], str(events_file), state_path)
+        assert [str(t) for t in watcher.poll()] == ['5[1]\tRUN -> DONE']
+
+    def test_new_jobs_rescan(self, events_file, tmpdir):
+        state_path = str(tmpdir.join('state.json'))
+        events_file.write(job_new(1) + job_new(2), 'a')
+        EventWatcher(['1'], str(events_file), state_path).poll()
+        # Job 2's records were skipped, so read the file again.
+        watcher = EventWatcher(['1', '2'], str(events_file), state_path)
+        assert watcher.states == {'1': None, '2': None}
+        assert len(watcher.poll()) == 2
+
+
+class TestWatchMainEvents(object):
+    def test_prints_changes(self, tmpdir, capsys):
+        events_file = tmpdir.join('lsb.events')
+        events_file.write(job_new(1) + job_start(1))
+        args = WatchMain.parse_args([
+            'progname', '-j', '1', '--events', str(events_file),
+            '--state-file', str(tmpdir.join('state.json'))])
+        assert WatchMain().run(
+            args, sleep=lambda seconds: events_file.write(
+                job_status(1, 0x40), 'a')) == 0
+        out, err = capsys.readouterr()
+        assert out == '1\tRUN -> DONE\n'
+        assert err.splitlines()[-1].endswith(' DONE=1')
+        assert tmpdir.join('state.json').check()
+
+    @parametrize('argv', [
+        ['progname', '-j', '1', '--state-file', 'state.json'],
+        ['progname', '-j', '1', '--events', 'lsb.events', '-u', 'all'],
+    ])
+    def test_invalid_args(self, argv):
+        with pytest.raises(SystemExit):
+            WatchMain.parse_args(argv)
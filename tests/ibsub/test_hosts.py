@@ -0,0 +1,105 @@
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import hosts
+from lsf_ibutils.ibsub.hosts import Host, QueueTopology
+
+
+def test_parse_lshosts():
+    assert hosts.parse_lshosts(iter([
+        'HOST_NAME type model cpuf ncpus maxmem maxswp server RESOURCES',
+        'ys0101 X86_64 Intel_EM 60.0 16 31.9G 15.9G Yes (mg)',
+        'login1 X86_64 Intel_EM 60.0 - 512M - Yes ()',
+        '',
+    ])) == {
+        'ys0101': [16, None, 32665],
+        'login1': [None, None, 512],
+    }
+
+
+def test_parse_lshosts_sockets():
+    assert hosts.parse_lshosts(iter([
+        'HOST_NAME type model cpuf ncpus nprocs ncores nthreads maxmem '
+        'maxswp server RESOURCES',
+        'ys0101 X86_64 Intel_EM 60.0 32 2 8 2 64G 16G Yes (mg)',
+    ])) == {'ys0101': [16, 2, 65536]}
+
+
+def test_parse_bhosts():
+    assert hosts.parse_bhosts(iter([
+        'HOST_NAME STATUS JL/U MAX NJOBS RUN SSUSP USUSP RSV',
+        'ys0101 ok - 16 0 0 0 0 0',
+        'ys0102 unavail - - 0 0 0 0 0',
+    ])) == {'ys0101': 16, 'ys0102': None}
+
+
+def test_parse_host_groups():
+    assert hosts.parse_host_groups(iter([
+        'GROUP_NAME HOSTS',
+        'ys01 ys0101 ys0102',
+        'yellowstone ys01/ ys02/',
+    ])) == {
+        'ys01': ['ys0101', 'ys0102'],
+        'yellowstone': ['ys01/', 'ys02/'],
+    }
+
+
+class TestExpandHosts(object):
+    GROUPS = {
+        'ys01': ['ys0101', 'ys0102'],
+        'ys02': ['ys0201'],
+        'yellowstone': ['ys01/', 'ys02/'],
+        'loop': ['loop/', 'ys0201'],
+    }
+    ALL = ['ys0101', 'ys0102', 'ys0201', 'login1']
+
+    @parametrize(('names', 'expanded'), [
+        (None, ALL),
+        (['all'], ALL),
+        (['yellowstone/'], ['ys0101', 'ys0102', 'ys0201']),
+        (['ys01/+2', 'login1'], ['ys0101', 'ys0102', 'login1']),
+        (['all', '~ys01/'], ['ys0201', 'login1']),
+        (['loop/'], ['ys0201']),
+    ])
+    def test_expand(self, names, expanded):
+        assert hosts.expand_hosts(names, self.GROUPS, self.ALL) == set(
+            expanded)
+
+
+def test_index_topology():
+    topology = hosts.index_topology(
+        {'a': [16, 2, 32768], 'b': [16, 2, 32768], 'c': [4, 1, 8192]},
+        {'a': 16, 'b': None},
+        {'big': ['a', 'b']},
+        {'regular': ['big/'], 'everything': None})
+    assert [host.name for host in topology['regular'].hosts] == ['a', 'b']
+    assert topology['regular'].slots_per_host == 16
+    assert len(topology['everything'].hosts) == 3
+
+
+def test_typical_slots():
+    small = QueueTopology('small', [Host('a', slots=8), Host('b', slots=8)])
+    big = QueueTopology('big', [Host('c', slots=32), Host('d', slots=32)])
+    assert hosts.typical_slots([small]) == 8
+    # Ties go to the larger hosts.
+    assert hosts.typical_slots([small, big]) == 32
+    assert hosts.typical_slots([]) is None
+
+
+def test_allows_ptile():
+    topology = QueueTopology('mixed', [Host('a', slots=8),
+                                       Host('b', slots=16)])
+    assert topology.allows_ptile(16)
+    assert not topology.allows_ptile(17)
+    # Without slot counts, leave it to LSF to decide.
+    assert QueueTopology('unknown', [Host('c')]).allows_ptile(64)
+
+
+@parametrize(('tasks', 'ptile'), [
+    (1, 1),
+    (16, 16),
+    (40, 16),
+    (1000, 16),
+])
+def test_suggest_ptile(tasks, ptile):
+    assert hosts.suggest_ptile(tasks, 16) == ptile
@@ -1,6 +1,7 @@
 from mock import create_autospec, call, MagicMock
 from pytest import fixture
 
+from lsf_ibutils.ibsub import input as input_module
 from lsf_ibutils.ibsub.input import (
     SimplePrompt, prompt_for_line, set_completions)
 from tests.helpers import ConsecutiveRetvalMock
@@ -92,4 +93,37 @@ class TestSimplePrompt(object):
     def test_sets_completions(self, simple_prompt, mock_set_completions):
         completions = ['abc', 'def', 'ghi']
         simple_prompt('not used', completions=completions)
-        mock_set_completions.assert_called_once_with(completions)
+        mock_set_completions.assert_called_once_with(completions, fuzzy=False)
+
+    def test_sets_fuzzy_completions(
+            self, simple_prompt, mock_set_completions):
+        completions = ['abc', 'def', 'ghi']
+        simple_prompt('not used', completions=completions, fuzzy=True)
+        mock_set_completions.assert_called_once_with(completions, fuzzy=True)
+
+
+def test_readline_completer(monkeypatch):
+    monkeypatch.setattr(input_module, '_matcher', None)
+    set_completions(['regular', 'economy', 'Reserved'])
+    completions = []
+    state = 0
+    while True:
+        completion = input_module._readline_completer('re', state)
+        if completion is None:
+            break
+        completions.append(completion)
+        state += 1
+    assert completions == ['regular', 'Reserved']
+
+
+def test_set_completions_reuses_index(monkeypatch):
+    monkeypatch.setattr(input_module, '_matcher', None)
+    completions = ['SCSG0001', 'ABCD0001']
+    set_completions(completions, fuzzy=True)
+    matcher = input_module._matcher
+    assert input_module._readline_completer('sg01', 0) == 'SCSG0001'
+    set_completions(completions, fuzzy=True)
+    assert input_module._matcher is matcher
+    set_completions(completions)
+    assert input_module._matcher is not matcher
+    assert input_module._readline_completer('sg01', 0) is None
@@ -8,8 +8,11 @@ parametrize = pytest.mark.parametrize
 from mock import MagicMock, create_autospec
 
 from lsf_ibutils import metadata
-from lsf_ibutils.ibsub.main import Main
+from lsf_ibutils.ibsub import cache, client, pack, shell
+from lsf_ibutils.ibsub.main import BatchMain, Main, RequestMain, UnpackMain
+from lsf_ibutils.ibsub.cache import DiskCache
 from lsf_ibutils.ibsub.output import build_command
+from lsf_ibutils.ibsub.prompts import PromptError
 
 
 @fixture
@@ -32,11 +35,23 @@ def mock_prompt_command():
     return MagicMock()
 
 
+@fixture
+def mock_completion_cache():
+    return create_autospec(DiskCache, spec_set=True, instance=True)
+
+
+@fixture
+def mock_prefetch_completions():
+    return MagicMock()
+
+
 @fixture
 def main(mock_exec_prompts, mock_prompt_command,
-         mock_build_script, mock_build_command):
+         mock_build_script, mock_build_command, mock_completion_cache,
+         mock_prefetch_completions):
     return Main(mock_exec_prompts, mock_prompt_command,
-                mock_build_script, mock_build_command)
+                mock_build_script, mock_build_command, mock_completion_cache,
+                mock_prefetch_completions)
 
 
 class TestMain(object):
@@ -71,3 +86,197 @@ class TestMain(object):
     def test_calls_exec_prompts(self, main, mock_exec_prompts):
         assert main(['progname']) == 0
         mock_exec_prompts.assert_called_once_with()
+
+    def test_prompt_error(self, main, mock_exec_prompts,
+                          mock_prompt_command, capsys):
+        mock_exec_prompts.side_effect = PromptError('no queue allows 8 tasks')
+        assert main(['progname']) == 1
+        assert capsys.readouterr()[1] == (
+            'progname: no queue allows 8 tasks\n')
+        assert mock_prompt_command.call_count == 0
+
+    def test_prefetches_completions(self, main, mock_prefetch_completions):
+        assert main(['progname']) == 0
+        mock_prefetch_completions.assert_called_once_with()
+
+    def test_cache_enabled_by_default(self, main, mock_completion_cache):
+        main(['progname'])
+        mock_completion_cache.configure.assert_called_once_with(
+            enabled=True, force_refresh=False, ttl=None)
+
+    def test_no_cache(self, main, mock_completion_cache):
+        main(['progname', '--no-cache'])
+        mock_completion_cache.configure.assert_called_once_with(
+            enabled=False, force_refresh=False, ttl=None)
+
+    def test_refresh_cache(self, main, mock_completion_cache):
+        main(['progname', '--refresh-cache', '--cache-ttl', '30'])
+        mock_completion_cache.configure.assert_called_once_with(
+            enabled=True, force_refresh=True, ttl=30)
+
+    def test_waits_for_cache_refreshes(self, main, mock_completion_cache):
+        main(['progname'])
+        mock_completion_cache.wait.assert_called_once_with(
+            timeout=cache.REFRESH_WAIT)
+
+    def test_sweep_requires_script(self, main, tmpdir, capsys):
+        spec = tmpdir.join('sweep.json')
+        spec.write('{"name": "n", "values": [1]}')
+        with raises(SystemExit) as exc_info:
+            main(['progname', '-t', 'command', '--sweep', str(spec)])
+        out, err = capsys.readouterr()
+        assert '--sweep requires --type script' in err
+        assert exc_info.value.code == 2
+
+
+class TestSyntaxDefault(object):
+    @fixture
+    def mock_detect(self, monkeypatch):
+        mock_detect = MagicMock(return_value='zsh')
+        monkeypatch.setattr(shell, 'detect', mock_detect)
+        return mock_detect
+
+    def test_detected_for_scripts(self, mock_detect):
+        assert Main.parse_args(['progname']).syntax == 'zsh'
+        mock_detect.assert_called_once_with()
+
+    def test_falls_back_to_bash(self, mock_detect):
+        mock_detect.return_value = None
+        assert Main.parse_args(['progname']).syntax == 'bash'
+
+    def test_not_detected_when_given(self, mock_detect):
+        assert Main.parse_args(['progname', '-s', 'tcsh']).syntax == 'tcsh'
+        assert mock_detect.call_count == 0
+
+    def test_not_detected_for_commands(self, mock_detect):
+        Main.parse_args(['progname', '-t', 'command'])
+        assert mock_detect.call_count == 0
+
+
+class TestBatchJobs(object):
+    def test_parsed(self):
+        assert BatchMain.parse_args(
+            ['progname', '-s', 'bash', '-o', 'out', '-j', '4',
+             'rows.csv']).jobs == 4
+
+    @parametrize(('argv', 'message'), [
+        (['-t', 'command', '-j', '2'], '--jobs only applies to scripts'),
+        (['-o', 'out', '-j', '0'], '--jobs must be at least 1'),
+    ])
+    def test_invalid(self, argv, message, capsys):
+        with raises(SystemExit) as exc_info:
+            BatchMain.parse_args(['progname', '-s', 'bash'] + argv +
+                                 ['rows.csv'])
+        out, err = capsys.readouterr()
+        assert message in err
+        assert exc_info.value.code == 2
+
+
+class TestSubmitArgs(object):
+    @parametrize(('argv', 'message'), [
+        (['--workers', '0'], '--workers: must be at least 1, got 0'),
+        (['--workers', 'x'], "--workers: invalid integer 'x'"),
+        (['--retries', '-1'], '--retries: must be at least 0, got -1'),
+    ])
+    def test_invalid(self, argv, message, capsys):
+        with raises(SystemExit) as exc_info:
+            BatchMain.parse_args(['progname', '--submit'] + argv +
+                                 ['rows.csv'])
+        out, err = capsys.readouterr()
+        assert message in err
+        assert exc_info.value.code == 2
+
+    def test_retries_may_be_zero(self):
+        assert BatchMain.parse_args(
+            ['progname', '--submit', '--retries', '0',
+             'rows.csv']).retries == 0
+
+    def test_manifest_requires_submit(self, tmpdir, capsys):
+        manifest = tmpdir.join('manifest.jsonl')
+        manifest.write('keep me')
+        with raises(SystemExit):
+            BatchMain.parse_args(['progname', '-t', 'command', '--manifest',
+                                  str(manifest), 'rows.csv'])
+        out, err = capsys.readouterr()
+        assert '--manifest only applies with --submit' in err
+        assert manifest.read() == 'keep me'
+
+    def test_manifest_not_opened_while_parsing(self, tmpdir):
+        manifest = tmpdir.join('manifest.jsonl')
+        assert BatchMain.parse_args(
+            ['progname', '--submit', '--manifest', str(manifest),
+             'rows.csv']).manifest == str(manifest)
+        assert not manifest.check()
+
+
+class TestRequestMain(object):
+    @fixture
+    def answers_file(self, tmpdir):
+        answers_file = tmpdir.join('answers.json')
+        answers_file.write('{"JobName": "a"}')
+        return str(answers_file)
+
+    @fixture
+    def mock_send(self, monkeypatch):
+        mock_send = MagicMock(return_value={'output': 'bsub -J a cmd'})
+        monkeypatch.setattr(client, 'send', mock_send)
+        return mock_send
+
+    def test_uses_server(self, answers_file, mock_send, capsys):
+        args = RequestMain.parse_args(
+            ['progname', '-t', 'command', '--socket', 'sock', answers_file])
+        assert RequestMain().run(args) == 0
+        mock_send.assert_called_once_with(
+            {'answers': {'JobName': 'a'}, 'type': 'command'}, 'sock')
+        assert capsys.readouterr()[0] == 'bsub -J a cmd\n'
+
+    def test_falls_back_to_in_process(
+            self, answers_file, mock_send, monkeypatch, capsys):
+        mock_send.side_effect = client.ServerUnavailable('not running')
+        render = MagicMock(return_value={'errors': ['JobName: bad']})
+        monkeypatch.setattr(
+            RequestMain, '_render_in_process', staticmethod(render))
+        args = RequestMain.parse_args(['progname', '-s', 'ksh', answers_file])
+        assert RequestMain().run(args) == 1
+        assert render.call_args[0][0] == {
+            'answers': {'JobName': 'a'}, 'type': 'script', 'syntax': 'ksh'}
+        assert capsys.readouterr()[1] == 'progname: JobName: bad\n'
+
+
+class TestUnpackMain(object):
+    @fixture
+    def archive(self, tmpdir):
+        path = tmpdir.join('jobs.pack')
+        with path.open('wb') as archive_file:
+            writer = pack.PackWriter(archive_file)
+            writer.add('job-00000001.lsf', 1, '#!/usr/bin/env bash\necho a\n')
+            writer.add('job-00000002.lsf', 2, '#!/usr/bin/env bash\necho b\n')
+            writer.close()
+        return str(path)
+
+    def test_uses_job_index(self, archive, monkeypatch, capsys):
+        monkeypatch.setenv('LSB_JOBINDEX', '2')
+        assert UnpackMain().run(
+            UnpackMain.parse_args(['progname', archive])) == 0
+        out, err = capsys.readouterr()
+        assert out == '#!/usr/bin/env bash\necho b\n'
+
+    def test_writes_executable(self, archive, tmpdir):
+        script = tmpdir.join('job.sh')
+        assert UnpackMain().run(UnpackMain.parse_args(
+            ['progname', '-i', '1', '-o', str(script), archive])) == 0
+        assert script.read() == '#!/usr/bin/env bash\necho a\n'
+        assert script.stat().mode & 0o111
+
+    def test_no_such_script(self, archive, capsys):
+        assert UnpackMain().run(UnpackMain.parse_args(
+            ['progname', '-i', '3', archive])) == 1
+        out, err = capsys.readouterr()
+        assert err == 'progname: no script 3, the archive has 2\n'
+
+    def test_index_required(self, archive, monkeypatch, capsys):
+        monkeypatch.delenv('LSB_JOBINDEX', raising=False)
+        with raises(SystemExit):
+            UnpackMain.parse_args(['progname', archive])
+        out, err = capsys.readouterr()
+        assert '--index is required outside a job array' in err
@@ -0,0 +1,74 @@
+from pytest import fixture
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub.matchers import FuzzyMatcher, PrefixMatcher
+
+
+class TestPrefixMatcher(object):
+    @fixture
+    def matcher(self):
+        return PrefixMatcher(['regular', 'Economy', 'REG', 'debug', 'econ'])
+
+    @parametrize(('text', 'matches'), [
+        ('', ['debug', 'econ', 'Economy', 'REG', 'regular']),
+        ('re', ['REG', 'regular']),
+        ('ECO', ['econ', 'Economy']),
+        ('economy', ['Economy']),
+        ('economyx', []),
+        ('z', []),
+        ('a', []),
+    ])
+    def test_matches(self, matcher, text, matches):
+        assert matcher.matches(text) == matches
+
+    def test_nth_match(self, matcher):
+        assert [matcher.nth_match('e', n) for n in range(3)] == [
+            'econ', 'Economy', None]
+        # A new text starts a new search.
+        assert matcher.nth_match('d', 0) == 'debug'
+        assert matcher.nth_match('d', 1) is None
+
+    def test_case_variants_keep_order(self):
+        matcher = PrefixMatcher(['ABC', 'abc', 'Abc'])
+        assert matcher.matches('a') == ['ABC', 'abc', 'Abc']
+
+    def test_empty(self):
+        matcher = PrefixMatcher([])
+        assert len(matcher) == 0
+        assert matcher.nth_match('', 0) is None
+        assert matcher.matches('') == []
+
+
+class TestFuzzyMatcher(object):
+    @fixture
+    def matcher(self):
+        return FuzzyMatcher([
+            'SCSG0010', 'ABCD0001', 'SCSG0001', 'sc', 'XSCS', 'S-C-S-G'])
+
+    @parametrize(('text', 'matches'), [
+        # Prefixes first, shortest first, then substrings, earliest first.
+        ('sc', ['sc', 'SCSG0001', 'SCSG0010', 'XSCS', 'S-C-S-G']),
+        # Then subsequences, most contiguous first.
+        ('scs', ['SCSG0001', 'SCSG0010', 'XSCS', 'S-C-S-G']),
+        ('sg01', ['SCSG0001', 'SCSG0010']),
+        ('0001', ['ABCD0001', 'SCSG0001']),
+        ('q', []),
+        # Repeated characters must occur as many times in the completion.
+        ('ss', ['S-C-S-G', 'SCSG0001', 'SCSG0010', 'XSCS']),
+        ('sss', []),
+        ('000', ['ABCD0001', 'SCSG0001', 'SCSG0010']),
+        ('0000', []),
+        ('', ['sc', 'XSCS', 'S-C-S-G', 'ABCD0001', 'SCSG0001', 'SCSG0010']),
+    ])
+    def test_matches(self, matcher, text, matches):
+        assert matcher.matches(text) == matches
+
+    def test_nth_match(self, matcher):
+        assert [matcher.nth_match('sg01', n) for n in range(3)] == [
+            'SCSG0001', 'SCSG0010', None]
+
+    def test_limit(self, matcher):
+        matcher.limit = 2
+        assert matcher.matches('s') == ['sc', 'S-C-S-G']
+        assert matcher.matches('0') == ['ABCD0001', 'SCSG0001']
@@ -1,8 +1,13 @@
 from datetime import datetime
+from io import StringIO
 
+from mock import MagicMock
 from pytest import fixture, raises
+import pytest
 
-from lsf_ibutils.ibsub.output import build_command, BuildScript
+from lsf_ibutils.ibsub.output import (
+    build_command, render_command_to, BuildScript, ScriptTemplate)
+from lsf_ibutils.ibsub.sweep import Values
 from tests.helpers import assert_exc_info_msg
 
 
@@ -46,7 +51,7 @@ class TestBuildCommand(object):
                     flags_spaces, "'command with spaces' 'arg with spaces'"))
 
     def test_special_chars(self):
-        # Mostly just a test that pipes.quote is working properly.
+        # Mostly just a test that quoting is working properly.
         # The comnand special characters should pass right through.
         assert (
             "bsub -J 'job'\"'\"' nam[e]' -P 'pr{oj n}ame \escape' "
@@ -58,10 +63,17 @@ class TestBuildCommand(object):
             ], 'run {abc,def}'))
 
 
+def test_render_command_to(flags_spaces):
+    stream = StringIO()
+    stream.write(u'> ')
+    render_command_to(stream, flags_spaces, 'cmd')
+    assert stream.getvalue() == '> ' + build_command(flags_spaces, 'cmd')
+
+
 class TestBuildScript(object):
     @fixture
     def build_script(self):
-        return BuildScript(datetime(2013, 9, 12, 15, 24, 11))
+        return BuildScript(lambda: datetime(2013, 9, 12, 15, 24, 11))
 
     def test_invalid_shell(self, build_script):
         with raises(ValueError) as exc_info:
@@ -108,6 +120,24 @@ command arg1 arg2
 'command with spaces'
 ''' == build_script(flags_spaces, "'command with spaces'", 'tcsh')
 
+    def test_formats_time_once_per_second(self, flags_simple):
+        now = MagicMock()
+        now.replace.return_value = now
+        now.strftime.return_value = '2013-09-12 15:24:11'
+        build_script = BuildScript(lambda: now)
+        for syntax in ['bash', 'bash', 'python', 'bash', 'python']:
+            build_script(flags_simple, 'command', syntax)
+        assert now.strftime.call_count == 1
+
+    def test_stamps_each_script(self, flags_simple):
+        times = iter([datetime(2013, 9, 12, 15, 24, 11, 5),
+                      datetime(2013, 9, 12, 15, 24, 13)])
+        build_script = BuildScript(lambda: next(times))
+        first = build_script(flags_simple, 'command', 'bash')
+        second = build_script(flags_simple, 'command', 'bash')
+        assert '# Generated by ibsub on 2013-09-12 15:24:11\n' in first
+        assert '# Generated by ibsub on 2013-09-12 15:24:13\n' in second
+
     class TestPython(object):
         def test_simple(self, build_script, flags_simple):
             assert '''#!/usr/bin/env python
@@ -123,3 +153,53 @@ command arg1 arg2
 import subprocess
 subprocess.call(['command', '--flag', 'flag arg', 'arg1'])
 ''' == build_script(flags_simple, "command --flag 'flag arg' arg1", 'python')
+
+    class TestSweep(object):
+        @fixture
+        def tasks_sweep(self):
+            return Values('tasks', [16, 32])
+
+        def test_shell(self, build_script, tasks_sweep):
+            assert '''#!/usr/bin/env bash
+#
+# LSF batch script
+# Generated by ibsub on 2013-09-12 15:24:11
+# Job array over parameters: tasks
+#
+#BSUB -J 'scale[1-2]'
+#BSUB -o scale.%J.%I.out
+
+sweep_tasks=(16 32)
+export tasks="${sweep_tasks[$((LSB_JOBINDEX - 1))]}"
+
+mpirun -np $tasks ./a.out
+''' == build_script(
+                [['-J', 'scale'], ['-o', 'scale.%J.out']],
+                'mpirun -np $tasks ./a.out', 'bash', sweep=tasks_sweep)
+
+        def test_python_expands_variables(self, build_script, tasks_sweep):
+            assert build_script(
+                [['-J', 'scale']], 'mpirun -np $tasks ./a.out', 'python',
+                sweep=tasks_sweep).endswith(
+                    "subprocess.call([os.path.expandvars(arg) for arg in "
+                    "['mpirun', '-np', '$tasks', './a.out']])\n")
+
+
+@pytest.mark.parametrize('syntax', ['bash', 'python'])
+def test_render_to(flags_simple, syntax):
+    build_script = BuildScript(lambda: datetime(2013, 9, 12, 15, 24, 11))
+    stream = StringIO()
+    build_script.render_to(
+        stream, flags_simple, 'cmd', syntax, sweep=Values('n', [1, 2]))
+    assert stream.getvalue() == build_script(
+        flags_simple, 'cmd', syntax, sweep=Values('n', [1, 2]))
+
+
+def test_script_template_comments():
+    template = ScriptTemplate('sh', comments=['Needs {braces}'])
+    assert template.header('now') == (
+        '#!/usr/bin/env sh\n'
+        '#\n'
+        '# LSF batch script\n'
+        '# Generated by ibsub on now\n'
+        '# Needs {braces}\n')
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+from pytest import fixture, raises
+
+from lsf_ibutils.ibsub import pack
+from lsf_ibutils.ibsub.pack import PackError
+from tests.helpers import assert_exc_info_msg
+
+SCRIPTS = [
+    (1, '#!/usr/bin/env bash\necho one\n'),
+    (3, u'#!/usr/bin/env python\nprint("caf\xe9")\n'),
+    (4, '#!/usr/bin/env tcsh\necho four\n'),
+]
+
+
+@fixture(params=['jobs.pack', 'jobs.tar'])
+def archive(request):
+    stream = io.BytesIO()
+    writer = pack.new_writer(request.param, stream)
+    for row_number, script in SCRIPTS:
+        writer.add('job-{0:08d}.lsf'.format(row_number), row_number, script)
+    writer.close()
+    stream.seek(0)
+    return pack.new_reader(request.param, stream)
+
+
+class TestRoundTrip(object):
+    def test_len(self, archive):
+        assert len(archive) == 3
+
+    def test_entries(self, archive):
+        for index, entry in enumerate(SCRIPTS, 1):
+            assert archive.entry(index) == entry
+
+    def test_entries_out_of_order(self, archive):
+        assert archive.entry(3) == SCRIPTS[2]
+        assert archive.entry(1) == SCRIPTS[0]
+
+    def test_rows(self, archive):
+        assert archive.rows() == [1, 3, 4]
+
+    @pytest.mark.parametrize('index', [0, 4])
+    def test_no_such_script(self, archive, index):
+        with raises(PackError) as exc_info:
+            archive.entry(index)
+        assert_exc_info_msg(
+            exc_info, 'no script {0}, the archive has 3'.format(index))
+
+
+def test_unknown_extension():
+    with raises(PackError) as exc_info:
+        pack.archive_format('jobs.zip')
+    assert_exc_info_msg(
+        exc_info, "unknown archive extension '.zip', valid extensions are "
+        "'.pack', '.tar'")
+
+
+class TestPackReader(object):
+    def test_not_a_pack(self):
+        with raises(PackError) as exc_info:
+            pack.PackReader(io.BytesIO(b'#!/bin/sh\n' * 10))
+        assert_exc_info_msg(exc_info, 'not an ibsub pack')
+
+    def test_truncated(self):
+        stream = io.BytesIO()
+        writer = pack.PackWriter(stream)
+        writer.add('a', 1, 'echo\n' * 10)
+        stream.seek(0)
+        with raises(PackError) as exc_info:
+            pack.PackReader(stream)
+        assert_exc_info_msg(exc_info, 'truncated ibsub pack')
+
+
+class TestInterpreterArgs(object):
+    def test_env(self):
+        assert pack.interpreter_args('#!/usr/bin/env bash\necho\n') == [
+            '/usr/bin/env', 'bash']
+
+    def test_missing(self):
+        with raises(PackError) as exc_info:
+            pack.interpreter_args('echo\n')
+        assert_exc_info_msg(exc_info, 'script has no #! line')
@@ -0,0 +1,77 @@
+import os
+
+from pytest import fixture
+
+from lsf_ibutils.ibsub import procfs
+
+
+def add_process(root, pid, name, parent_pid, exe=None):
+    process_dir = root.mkdir(str(pid))
+    process_dir.join('stat').write(
+        '{0} ({1}) S {2} {0} {0} 34816 {0} 4194560 0 0\n'.format(
+            pid, name, parent_pid))
+    process_dir.join('comm').write(name[:15] + '\n')
+    if exe is not None:
+        os.symlink(exe, str(process_dir.join('exe')))
+
+
+@fixture
+def proc_root(tmpdir):
+    """A fake /proc: init, sshd (whose executable can't be read), bash, an
+    oddly named wrapper, and python.
+    """
+    root = tmpdir.mkdir('proc')
+    add_process(root, 1, 'systemd', 0, '/usr/lib/systemd/systemd')
+    add_process(root, 20, 'sshd', 1)
+    add_process(root, 300, 'bash', 20, '/bin/bash-4.1')
+    add_process(root, 4000, 'my (odd) tool', 300, '/opt/bin/wrap')
+    add_process(root, 50000, 'python', 4000, '/usr/bin/python3')
+    return str(root)
+
+
+def test_read_stat(proc_root):
+    assert procfs.read_stat(4000, proc_root) == ('my (odd) tool', 300)
+
+
+def test_read_stat_missing(proc_root):
+    assert procfs.read_stat(12345, proc_root) is None
+
+
+def test_read_stat_garbage(proc_root, tmpdir):
+    tmpdir.join('proc', '20', 'stat').write('nonsense')
+    assert procfs.read_stat(20, proc_root) is None
+
+
+def test_read_comm(proc_root):
+    assert procfs.read_comm(300, proc_root) == 'bash'
+    assert procfs.read_comm(12345, proc_root) is None
+
+
+def test_read_exe(proc_root):
+    assert procfs.read_exe(300, proc_root) == '/bin/bash-4.1'
+    assert procfs.read_exe(20, proc_root) is None
+
+
+def test_ancestors(proc_root):
+    assert list(procfs.ancestors(10, 50000, proc_root)) == [
+        (1, 4000, 'wrap'),
+        (2, 300, 'bash-4.1'),
+        # No executable, so the name from stat.
+        (3, 20, 'sshd'),
+        (4, 1, 'systemd'),
+    ]
+
+
+def test_ancestors_max_depth(proc_root):
+    assert [pid for _, pid, _ in procfs.ancestors(2, 50000, proc_root)] == [
+        4000, 300]
+
+
+def test_ancestors_of_missing_process(proc_root):
+    assert list(procfs.ancestors(10, 12345, proc_root)) == []
+
+
+def test_available(proc_root, tmpdir):
+    assert not procfs.available(proc_root)
+    add_process(tmpdir.join('proc'), os.getpid(), 'python', 1)
+    assert procfs.available(proc_root)
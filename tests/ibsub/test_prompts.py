@@ -1,5 +1,6 @@
+import pinject
 from mock import MagicMock, sentinel
-from pytest import fixture
+from pytest import fixture, raises
 import pytest
 parametrize = pytest.mark.parametrize
 
@@ -14,7 +15,15 @@ from lsf_ibutils.ibsub.prompts import (
     EmailOnFinish,
     EmailOnBegin,
     PromptCommand,
+    PromptPipeline,
+    ExecPrompts,
+    PromptError,
 )
+from lsf_ibutils.ibsub.binding_specs import IbsubBindingSpec
+from lsf_ibutils.ibsub import queues
+from lsf_ibutils.ibsub.hosts import Host, QueueTopology
+from lsf_ibutils.ibsub.queues import QueueLimits, QueueLoad
+from tests.helpers import assert_exc_info_msg
 # For {Output,Error}FileName
 from lsf_ibutils.ibsub import prompts
 
@@ -58,7 +67,8 @@ class TestProjectCode(object):
         project_code({})
         mock_simple_prompt.assert_called_once_with(
             'Project code',
-            completions=sentinel.completions)
+            completions=sentinel.completions,
+            fuzzy=True)
 
 
 class TestTasksPerJob(object):
@@ -82,8 +92,16 @@ class TestTasksPerJob(object):
 
 class TestTasksPerNode(object):
     @fixture
-    def tasks_per_node(self, mock_simple_prompt):
-        return TasksPerNode(mock_simple_prompt, sentinel.validator)
+    def queue_topology(self):
+        return {}
+
+    @fixture
+    def tasks_per_node(self, mock_simple_prompt, queue_topology):
+        # Like the completers, return the same objects every time.
+        queue_names = ['regular', 'economy']
+        return TasksPerNode(
+            mock_simple_prompt, sentinel.validator,
+            lambda: queue_names, lambda: queue_topology)
 
     def test_return_value(self, tasks_per_node, mock_simple_prompt):
         mock_simple_prompt.return_value = '230'
@@ -97,6 +115,49 @@ class TestTasksPerNode(object):
             format_='positive number',
             validator=sentinel.validator)
 
+    @parametrize(('tasks', 'ptile'), [
+        ('40', '16'),
+        ('8', '8'),
+    ])
+    def test_suggests_ptile(
+            self, tasks_per_node, mock_simple_prompt, queue_topology,
+            tasks, ptile):
+        queue_topology['regular'] = QueueTopology('regular', [
+            Host('a', slots=16), Host('b', slots=16)])
+        queue_topology['economy'] = QueueTopology('economy', [
+            Host('c', slots=32)])
+        # Only the user's queues count.
+        queue_topology['special'] = QueueTopology('special', [
+            Host('d', slots=64), Host('e', slots=64), Host('f', slots=64)])
+        tasks_per_node({TasksPerJob: tasks})
+        mock_simple_prompt.assert_called_once_with(
+            'Tasks per node',
+            format_='positive number, nodes have 16 slots, {0} uses the '
+            'fewest'.format(ptile),
+            validator=sentinel.validator)
+
+    def test_blank_means_no_ptile(
+            self, tasks_per_node, mock_simple_prompt, queue_topology):
+        queue_topology['regular'] = QueueTopology(
+            'regular', [Host('a', slots=16)])
+        # The suggestion is only a hint, so a blank answer in piped input or
+        # a batch row still leaves the placement to LSF.
+        mock_simple_prompt.return_value = None
+        assert tasks_per_node({TasksPerJob: '40'})[0] is None
+        assert 'default' not in mock_simple_prompt.call_args[1]
+
+    def test_counts_hosts_once(
+            self, tasks_per_node, mock_simple_prompt, queue_topology):
+        queue_topology['regular'] = QueueTopology(
+            'regular', [Host('a', slots=16)])
+        tasks_per_node({TasksPerJob: '40'})
+        # The same topology object is assumed unchanged.
+        queue_topology['economy'] = QueueTopology(
+            'economy', [Host('b', slots=32), Host('c', slots=32)])
+        tasks_per_node({TasksPerJob: '40'})
+        assert mock_simple_prompt.call_args[1]['format_'] == (
+            'positive number, nodes have 16 slots, 16 uses the fewest')
+
 
 class TestWallClockTime(object):
     @fixture
@@ -120,11 +181,31 @@ class TestWallClockTime(object):
 class TestQueueName(object):
     @fixture
     def mock_get_queue_completions(self):
-        return MagicMock()
+        return MagicMock(return_value=['regular', 'economy'])
 
     @fixture
-    def queue_name(self, mock_simple_prompt, mock_get_queue_completions):
-        return QueueName(mock_simple_prompt, mock_get_queue_completions)
+    def queue_limits(self):
+        return {}
+
+    @fixture
+    def queue_loads(self):
+        return {}
+
+    @fixture
+    def queue_topology(self):
+        return {}
+
+    @fixture
+    def queue_name(
+            self, mock_simple_prompt, mock_get_queue_completions,
+            queue_limits, queue_loads, queue_topology):
+        return QueueName(
+            mock_simple_prompt, mock_get_queue_completions,
+            lambda: queue_limits, lambda: queue_loads,
+            lambda: queue_topology, queues.validate_answers)
+
+    def validator(self, mock_simple_prompt):
+        return mock_simple_prompt.call_args[1]['validator']
 
     def test_return_value(self, queue_name, mock_simple_prompt):
         mock_simple_prompt.return_value = sentinel.queue
@@ -136,8 +217,9 @@ class TestQueueName(object):
         queue_name({})
         mock_simple_prompt.assert_called_once_with(
             'Queue',
+            format_=None,
             required=True,
-            validator=queue_name._validator,
+            validator=self.validator(mock_simple_prompt),
             default='regular',
             completions=sentinel.completions)
         mock_get_queue_completions.assert_called_once_with()
@@ -151,9 +233,98 @@ class TestQueueName(object):
         ('notvalid', False),
     ])
     def test_validator(
-            self, queue_name, text, valid, mock_get_queue_completions):
+            self, queue_name, text, valid, mock_simple_prompt,
+            mock_get_queue_completions):
         mock_get_queue_completions.return_value = range(10)
-        assert queue_name._validator(text) == valid
+        queue_name({})
+        assert self.validator(mock_simple_prompt)(text) == valid
+
+    def test_checks_queue_limits(
+            self, queue_name, queue_limits, mock_simple_prompt):
+        queue_limits['regular'] = QueueLimits(
+            'regular', run_limit=720.0, max_tasks=64)
+        queue_limits['economy'] = QueueLimits(
+            'economy', run_limit=60.0, max_tasks=16)
+        queue_name({TasksPerJob: '32', WallClockTime: '2:00'})
+        kwargs = mock_simple_prompt.call_args[1]
+        assert kwargs['format_'] == (
+            'one allowing 32 tasks for 2:00')
+        assert kwargs['completions'] == ['regular']
+        assert kwargs['validator']('regular')
+        assert not kwargs['validator']('economy')
+
+    def test_queue_without_limits(
+            self, queue_name, queue_limits, mock_simple_prompt):
+        queue_limits['economy'] = QueueLimits('economy', max_tasks=16)
+        queue_name({TasksPerJob: '32'})
+        kwargs = mock_simple_prompt.call_args[1]
+        assert kwargs['format_'] == 'one allowing 32 tasks'
+        assert kwargs['completions'] == ['regular']
+
+    def test_recommends_least_busy_queue(
+            self, queue_name, queue_limits, queue_loads, mock_simple_prompt):
+        queue_limits['regular'] = QueueLimits('regular', max_tasks=64)
+        queue_limits['economy'] = QueueLimits('economy', max_tasks=64)
+        queue_loads['regular'] = QueueLoad(
+            'regular', pending=3000, running=2000)
+        queue_loads['economy'] = QueueLoad('economy', pending=0, running=10)
+        queue_name({TasksPerJob: '32'})
+        args, kwargs = mock_simple_prompt.call_args
+        assert args == (
+            'Queue, economy is least busy with 0 pending, 10 running',)
+        assert kwargs['default'] == 'economy'
+
+    def test_recommends_only_eligible_queues(
+            self, queue_name, queue_limits, queue_loads, mock_simple_prompt):
+        queue_limits['regular'] = QueueLimits('regular', max_tasks=64)
+        queue_limits['economy'] = QueueLimits('economy', max_tasks=16)
+        queue_loads['regular'] = QueueLoad(
+            'regular', pending=3000, running=2000)
+        queue_loads['economy'] = QueueLoad('economy')
+        queue_name({TasksPerJob: '32'})
+        assert mock_simple_prompt.call_args[1]['default'] == 'regular'
+
+    def test_default_must_fit(
+            self, queue_name, queue_limits, mock_simple_prompt):
+        queue_limits['regular'] = QueueLimits('regular', max_tasks=16)
+        queue_limits['economy'] = QueueLimits('economy', max_tasks=64)
+        queue_name({TasksPerJob: '32'})
+        kwargs = mock_simple_prompt.call_args[1]
+        assert kwargs['completions'] == ['economy']
+        assert kwargs['default'] is None
+
+    def test_checks_tasks_per_node(
+            self, queue_name, queue_topology, mock_simple_prompt):
+        queue_topology['regular'] = QueueTopology(
+            'regular', [Host('a', slots=16)])
+        queue_topology['economy'] = QueueTopology(
+            'economy', [Host('b', slots=32)])
+        queue_name({TasksPerJob: '64', TasksPerNode: '32'})
+        kwargs = mock_simple_prompt.call_args[1]
+        assert kwargs['format_'] == 'one allowing 64 tasks at 32 per node'
+        assert kwargs['completions'] == ['economy']
+        assert kwargs['default'] is None
+        assert not kwargs['validator']('regular')
+        assert kwargs['validator']('economy')
+
+    def test_no_queue_fits_tasks_per_node(
+            self, queue_name, queue_topology, mock_simple_prompt):
+        queue_topology['regular'] = QueueTopology(
+            'regular', [Host('a', slots=16)])
+        queue_topology['economy'] = QueueTopology(
+            'economy', [Host('b', slots=16)])
+        with raises(PromptError) as exc_info:
+            queue_name({TasksPerNode: '32'})
+        assert_exc_info_msg(exc_info, 'no queue allows 32 tasks per node')
+
+    def test_no_queue_fits(self, queue_name, queue_limits, mock_simple_prompt):
+        queue_limits['regular'] = QueueLimits('regular', max_tasks=16)
+        queue_limits['economy'] = QueueLimits('economy', run_limit=60.0)
+        with raises(PromptError) as exc_info:
+            queue_name({TasksPerJob: '32', WallClockTime: '2:00'})
+        assert_exc_info_msg(
+            exc_info, 'no queue allows 32 tasks for 2:00')
+        assert mock_simple_prompt.call_count == 0
 
 
 class TestOutputErrorFileName(object):
@@ -269,3 +440,42 @@ class TestPromptCommand(object):
         mock_simple_prompt.assert_called_once_with(
             'Command to run',
             required=True)
+
+
+class TestPromptPipeline(object):
+    @fixture
+    def pipeline(self, mock_simple_prompt):
+        return PromptPipeline.compile(
+            [JobName, prompts.OutputFileName, InteractiveShell],
+            {'simple_prompt': mock_simple_prompt,
+             'validate_yes_no': sentinel.validator})
+
+    def test_compile_binds_dependencies(self, pipeline, mock_simple_prompt):
+        assert [prompt_class for prompt_class, _ in pipeline] == [
+            JobName, prompts.OutputFileName, InteractiveShell]
+        _, interactive_shell = pipeline.prompts[2]
+        assert interactive_shell._simple_prompt is mock_simple_prompt
+        assert interactive_shell._validator is sentinel.validator
+
+    def test_compile_missing_dependency(self, mock_simple_prompt):
+        with raises(ValueError) as exc_info:
+            PromptPipeline.compile(
+                [QueueName], {'simple_prompt': mock_simple_prompt})
+        assert_exc_info_msg(
+            exc_info, "QueueName needs missing dependency "
+            "'get_queue_completions'")
+
+    def test_call(self, pipeline, mock_simple_prompt):
+        # Job name, default output file name, no interactive shell.
+        mock_simple_prompt.side_effect = ['job', 'job.%J.out', 'n']
+        assert pipeline() == [['-J', 'job'], ['-o', 'job.%J.out']]
+        # The output file name default comes from the job name.
+        assert mock_simple_prompt.call_args_list[1][1] == {
+            'default': 'job.%J.out'}
+
+    def test_binding_spec_compiles_all_prompts(self):
+        obj_graph = pinject.new_object_graph(
+            binding_specs=[IbsubBindingSpec()])
+        pipeline = obj_graph.provide(ExecPrompts)._prompt_pipeline
+        assert [prompt_class for prompt_class, _ in pipeline] == (
+            prompts.Prompt.__subclasses__())
@@ -0,0 +1,152 @@
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import queues
+from lsf_ibutils.ibsub.queues import QueueLimits, QueueLoad
+
+BQUEUES_L = '''
+QUEUE: regular
+  -- Parallel jobs of up to twelve hours.
+
+PARAMETERS/STATISTICS
+PRIO NICE STATUS          MAX JL/U JL/P JL/H NJOBS  PEND   RUN SSUSP USUSP  RSV
+ 30   0  Open:Active     4096  512    -    -  3000  1000  2000     0     0    0
+Interval for a host to accept two jobs is 0 seconds
+
+ DEFAULT LIMITS:
+ RUNLIMIT
+ 60.0 min of ys0101
+
+ MAXIMUM LIMITS:
+ CPULIMIT                RUNLIMIT
+ 1440.0 min of ys0101    720.0 min of ys0101
+
+ PROCLIMIT
+ 1   16   1024
+
+ FILELIMIT DATALIMIT STACKLIMIT CORELIMIT MEMLIMIT SWAPLIMIT PROCESSLIMIT
+ 20000 K   20 M      2048 K     20000 K   2 G      4 G       100
+
+SCHEDULING PARAMETERS
+           r15s   r1m  r15m   ut      pg    io   ls    it    tmp    swp    mem
+ loadSched   -     -     -     -       -     -    -     -     -      -      -
+ loadStop    -     -     -     -       -     -    -     -     -      -      -
+
+USERS: all
+HOSTS:  ys01/ ys02/
+------------------------------------------------------------------------------
+
+QUEUE: small
+  -- Small serial jobs.
+
+PARAMETERS/STATISTICS
+PRIO NICE STATUS          MAX JL/U JL/P JL/H NJOBS  PEND   RUN SSUSP USUSP  RSV
+ 20    0  Open:Active       -    -    -    -    10     0    10     0     0    0
+
+ TASKLIMIT
+ 4
+
+USERS: alice physics/
+HOSTS:  all
+------------------------------------------------------------------------------
+
+QUEUE: debug
+  -- Short test jobs.
+
+PARAMETERS/STATISTICS
+PRIO NICE STATUS          MAX JL/U JL/P JL/H NJOBS  PEND   RUN SSUSP USUSP  RSV
+ 40    0  Open:Active      64    -    -    -     0     0     0     0     0    0
+
+ MAXIMUM LIMITS:
+ RUNLIMIT                TASKLIMIT      MEMLIMIT
+ 30.0 min of ys0101      1   4   8      512 M
+
+USERS: all
+HOSTS:  all
+'''
+
+
+def test_parse_queue_limits():
+    limits = queues.parse_queue_limits(iter(BQUEUES_L.splitlines()))
+    assert sorted(limits) == ['debug', 'regular', 'small']
+    assert limits['regular'] == QueueLimits(
+        'regular', run_limit=720.0, default_run_limit=60.0, min_tasks=1,
+        default_tasks=16, max_tasks=1024, mem_limit=2048, max_slots=4096,
+        max_slots_per_user=512, hosts=['ys01/', 'ys02/']).to_dict()
+    assert limits['small'] == QueueLimits('small', max_tasks=4).to_dict()
+    assert limits['debug'] == QueueLimits(
+        'debug', run_limit=30.0, min_tasks=1, default_tasks=4, max_tasks=8,
+        mem_limit=512, max_slots=64).to_dict()
+
+
+def test_round_trip():
+    limits = QueueLimits('regular', run_limit=720.0, max_tasks=64)
+    assert QueueLimits.from_dict(limits.to_dict()).to_dict() == (
+        limits.to_dict())
+
+
+def test_from_dict_ignores_unknown_fields():
+    # Cached by a version which also parsed the allowed users.
+    fields = QueueLimits('regular', max_tasks=64).to_dict()
+    fields['users'] = ['alice']
+    assert QueueLimits.from_dict(fields).to_dict() == QueueLimits(
+        'regular', max_tasks=64).to_dict()
+
+
+def test_task_limit_includes_slot_limits():
+    assert QueueLimits('q').task_limit is None
+    assert QueueLimits(
+        'q', max_tasks=1024, max_slots=4096,
+        max_slots_per_user=512).task_limit == 512
+
+
+@parametrize(('tasks', 'wall_clock_time', 'problems'), [
+    ('16', '12:00', []),
+    ('1', '30', ['regular needs at least 2 tasks']),
+    ('128', '1:00', ['regular allows at most 64 tasks']),
+    ('16', '12:01', ['regular allows at most 12:00 of wall clock time']),
+    (None, None, []),
+])
+def test_validate_answers(tasks, wall_clock_time, problems):
+    limits = QueueLimits('regular', run_limit=720.0, min_tasks=2,
+                         max_tasks=64)
+    assert queues.validate_answers(
+        limits, tasks, wall_clock_time) == problems
+
+
+def test_validate_answers_unknown_queue():
+    assert queues.validate_answers(None, '1000000', '1000:00') == []
+
+
+@parametrize(('text', 'minutes'), [
+    ('45', 45),
+    ('2:30', 150),
+    ('100:00', 6000),
+])
+def test_duration_minutes(text, minutes):
+    assert queues.duration_minutes(text) == minutes
+    assert queues.duration_minutes(queues.format_minutes(minutes)) == minutes
+
+
+class TestRecommendQueue(object):
+    def test_least_expected_wait(self):
+        loads = {
+            'regular': QueueLoad('regular', pending=3000, running=2000),
+            'economy': QueueLoad('economy', pending=10, running=100),
+            'premium': QueueLoad('premium', pending=5, running=0),
+        }
+        assert queues.recommend_queue(
+            ['regular', 'economy', 'premium'], loads).name == 'economy'
+
+    def test_prefers_default_on_ties(self):
+        loads = {
+            'economy': QueueLoad('economy'),
+            'regular': QueueLoad('regular'),
+        }
+        assert queues.recommend_queue(
+            ['economy', 'regular'], loads, default='regular').name == (
+            'regular')
+
+    def test_skips_closed_and_unknown_queues(self):
+        loads = {'economy': QueueLoad('economy', status='Closed:Inact')}
+        assert queues.recommend_queue(['economy', 'small'], loads) is None
@@ -0,0 +1,69 @@
+import shlex
+
+import pytest
+
+from lsf_ibutils.ibsub import quoting
+from lsf_ibutils.ibsub.quoting import (
+    quote_uncached, make_quoter, format_cache_info)
+
+STRINGS = [
+    '',
+    'simple',
+    'span[ptile=16]',
+    'job name',
+    "it's",
+    'out.%J.%I',
+    '`tick` $(param sub)',
+    'pr{oj n}ame \\escape',
+    u'caf\xe9',
+]
+
+
+@pytest.fixture(params=['lru_cache', 'python2'])
+def make(request):
+    if request.param == 'lru_cache':
+        return make_quoter
+    return quoting._lru_quoter
+
+
+@pytest.mark.parametrize('string', STRINGS)
+def test_quote_uncached_matches_shlex(string):
+    # shlex.quote only exists in Python 3.
+    assert quote_uncached(string) == getattr(shlex, 'quote', quote_uncached)(
+        string)
+
+
+@pytest.mark.parametrize('string', STRINGS)
+def test_quoter_matches_uncached(make, string):
+    quote = make(16)
+    assert quote(string) == quote(string) == quote_uncached(string)
+
+
+class TestQuoter(object):
+    def test_cache_info(self, make):
+        quote = make(16)
+        for _ in range(3):
+            quote('job name')
+        quote('regular')
+        assert quote.cache_info() == (2, 2, 16, 2)
+        assert (format_cache_info(quote.cache_info()) ==
+                'hits=2 misses=2 size=2/16 hit_rate=50.0%')
+
+    def test_evicts_least_recently_used(self, make):
+        quote = make(2)
+        quote('a b')
+        quote('c d')
+        quote('a b')
+        quote('e f')
+        assert quote.cache_info().currsize == 2
+        quote('a b')
+        assert quote.cache_info().misses == 3
+        quote('c d')
+        assert quote.cache_info().misses == 4
+
+    def test_cache_clear(self, make):
+        quote = make(16)
+        quote('a b')
+        quote.cache_clear()
+        assert quote.cache_info() == (0, 0, 16, 0)
+        assert format_cache_info(quote.cache_info()).endswith('hit_rate=-')
@@ -0,0 +1,113 @@
+import threading
+
+from pytest import fixture
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import ratelimit
+from lsf_ibutils.ibsub.ratelimit import AdaptiveLimiter
+
+
+@parametrize(('fraction', 'expected'), [
+    (0.0, 1),
+    (0.5, 3),
+    (0.9, 5),
+    (1.0, 5),
+])
+def test_percentile(fraction, expected):
+    assert ratelimit.percentile([1, 2, 3, 4, 5], fraction) == expected
+
+
+def test_percentile_empty():
+    assert ratelimit.percentile([], 0.5) is None
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveLimiter(object):
+    @fixture
+    def clock(self):
+        return FakeClock()
+
+    @fixture
+    def limiter(self, clock):
+        return AdaptiveLimiter(initial=2, minimum=1, maximum=8,
+                               target_latency=1.0, clock=clock)
+
+    def run(self, limiter, latency, error=False):
+        limiter.acquire()
+        limiter.release(latency, error=error)
+
+    def test_increases_additively(self, limiter):
+        # About one more slot per `limit' fast commands.
+        for _ in range(2):
+            self.run(limiter, 0.1)
+        assert limiter.limit == 2
+        self.run(limiter, 0.1)
+        assert limiter.limit == 3
+
+    def test_never_exceeds_maximum(self, limiter):
+        for _ in range(1000):
+            self.run(limiter, 0.1)
+        assert limiter.limit == 8
+
+    def test_decreases_multiplicatively(self, limiter):
+        for _ in range(100):
+            self.run(limiter, 0.1)
+        self.run(limiter, 5.0)
+        assert limiter.limit == 4
+
+    def test_backs_off_once_per_window(self, limiter):
+        for _ in range(100):
+            self.run(limiter, 0.1)
+        for _ in range(3):
+            self.run(limiter, 5.0)
+        assert limiter.limit == 4
+
+    def test_errors_back_off(self, limiter):
+        for _ in range(100):
+            self.run(limiter, 0.1)
+        self.run(limiter, 0.1, error=True)
+        assert limiter.limit == 4
+
+    def test_never_below_minimum(self, limiter):
+        for _ in range(100):
+            self.run(limiter, 5.0)
+        assert limiter.limit == 1
+
+    def test_acquire_blocks_at_limit(self, limiter):
+        limiter.acquire()
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            limiter.acquire()
+            acquired.set()
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.05)
+        limiter.release(0.1)
+        assert acquired.wait(5)
+        thread.join()
+
+    def test_metrics(self, limiter, clock):
+        for latency in [0.1, 0.2, 0.3, 0.4]:
+            self.run(limiter, latency)
+        self.run(limiter, 0.5, error=True)
+        clock.now = 10.0
+        metrics = limiter.metrics()
+        assert metrics['completed'] == 5
+        assert metrics['in_flight'] == 0
+        assert metrics['rate'] == 0.5
+        assert metrics['error_rate'] == 0.2
+        assert metrics['latency_p50'] == 0.3
+        assert metrics['latency_p99'] == 0.5
+        assert ratelimit.format_metrics(metrics) == (
+            'concurrency {0}, 0.50 commands/s, 20.0% errors, latency '
+            'p50 0.300s p90 0.500s p99 0.500s'.format(metrics['limit']))
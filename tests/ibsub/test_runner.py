@@ -0,0 +1,131 @@
+import sys
+
+from mock import MagicMock
+from pytest import fixture, raises
+
+from lsf_ibutils.ibsub import runner
+from lsf_ibutils.ibsub.runner import CommandError, CommandRunner
+
+
+class TestRun(object):
+    def test_output_and_status(self):
+        result = runner.run([sys.executable, '-c',
+                             'import sys; print("out"); '
+                             'sys.stderr.write("err\\n"); sys.exit(3)'])
+        assert result.returncode == 3
+        assert not result.succeeded
+        assert sorted(result.output.splitlines()) == ['err', 'out']
+        assert result.seconds > 0
+
+    def test_input(self):
+        result = runner.run(
+            [sys.executable, '-c', 'import sys; print(sys.stdin.read())'],
+            input='hello')
+        assert result.succeeded
+        assert result.output.strip() == 'hello'
+
+    def test_shell(self):
+        result = runner.run('echo "a b" | tr a c', shell=True)
+        assert result.output == 'c b\n'
+
+    def test_missing_command(self):
+        result = runner.run(['no-such-lsf-command'])
+        assert result.returncode is None
+        assert not result.succeeded
+        assert 'no-such-lsf-command' in result.output
+
+    def test_timeout(self):
+        result = runner.run(
+            [sys.executable, '-c', 'import time; time.sleep(30)'],
+            timeout=0.2)
+        assert result.timed_out
+        assert not result.succeeded
+        assert result.seconds < 10
+
+
+class TestStreamLines(object):
+    def test_lines(self):
+        assert list(runner.stream_lines(
+            [sys.executable, '-c', 'print("a"); print("b c")'])) == [
+                'a', 'b c']
+
+    def test_failure(self):
+        lines = runner.stream_lines(
+            [sys.executable, '-c', 'print("a"); raise SystemExit(2)'])
+        assert next(lines) == 'a'
+        with raises(CommandError) as exc_info:
+            next(lines)
+        assert 'exited with status 2' in str(exc_info.value)
+
+    def test_missing_command(self):
+        with raises(CommandError):
+            list(runner.stream_lines(['no-such-lsf-command']))
+
+    def test_timeout(self):
+        with raises(CommandError) as exc_info:
+            list(runner.stream_lines(
+                [sys.executable, '-c',
+                 'import time; print("a"); time.sleep(30)'],
+                timeout=0.2))
+        assert 'timed out after 0.2 seconds' in str(exc_info.value)
+
+    def test_stopping_early_kills_command(self):
+        lines = runner.stream_lines(
+            [sys.executable, '-c',
+             'import time\nwhile True: print("y")'])
+        assert next(lines) == 'y'
+        # Shouldn't hang.
+        lines.close()
+
+
+class TestCommandRunner(object):
+    @fixture
+    def mock_completion_cache(self):
+        cache = MagicMock()
+        cache.get.side_effect = lambda key, compute: compute()
+        return cache
+
+    @fixture
+    def command_runner(self, mock_completion_cache):
+        return CommandRunner(mock_completion_cache)
+
+    def test_query_parses_and_caches(
+            self, command_runner, mock_completion_cache, monkeypatch):
+        monkeypatch.setenv('USER', 'alice')
+        args = [sys.executable, '-c', 'print("x"); print("y")']
+        assert command_runner.query(args, list) == ['x', 'y']
+        key = mock_completion_cache.get.call_args[0][0]
+        assert key == CommandRunner.cache_key(args)
+        assert key.startswith('cmd-alice-')
+
+    def test_cache_key_depends_on_user_and_args(self, monkeypatch):
+        monkeypatch.setenv('USER', 'alice')
+        key = CommandRunner.cache_key(['bqueues'])
+        assert key != CommandRunner.cache_key(['bqueues', '-l'])
+        monkeypatch.setenv('USER', 'bob')
+        assert key != CommandRunner.cache_key(['bqueues'])
+
+    def test_query_failure(self, command_runner):
+        assert command_runner.query(['no-such-lsf-command'], list) is None
+        timing, = command_runner.timings
+        assert timing.args == ['no-such-lsf-command']
+        assert 'no-such-lsf-command' in timing.error
+
+    def test_query_refresh(self, command_runner, mock_completion_cache):
+        mock_completion_cache.refresh.side_effect = (
+            lambda key, compute: compute())
+        args = [sys.executable, '-c', 'print(1)']
+        assert command_runner.query(args, list, refresh=True) == ['1']
+        assert mock_completion_cache.get.call_count == 0
+        assert mock_completion_cache.refresh.call_args[0][0] == (
+            CommandRunner.cache_key(args))
+
+    def test_query_without_cache(
+            self, command_runner, mock_completion_cache):
+        assert command_runner.query(
+            [sys.executable, '-c', 'print(1)'], list,
+            use_cache=False) == ['1']
+        assert mock_completion_cache.get.call_count == 0
+        timing, = command_runner.timings
+        assert timing.error is None
+        assert timing.seconds > 0
@@ -0,0 +1,159 @@
+import socket
+import threading
+
+from mock import MagicMock, create_autospec, sentinel
+from pytest import fixture, raises
+
+from lsf_ibutils.ibsub import client
+from lsf_ibutils.ibsub.output import build_command
+from lsf_ibutils.ibsub.server import RenderRequest, Server, ServerError
+from tests.helpers import assert_exc_info_msg
+
+
+@fixture
+def mock_exec_row():
+    return MagicMock(return_value=(sentinel.flags, sentinel.command, []))
+
+
+@fixture
+def mock_build_script():
+    return MagicMock(return_value=sentinel.script)
+
+
+@fixture
+def mock_build_command():
+    return create_autospec(build_command, spec_set=True,
+                           return_value=sentinel.bsub)
+
+
+@fixture
+def render_request(mock_exec_row, mock_build_script, mock_build_command):
+    return RenderRequest(mock_exec_row, mock_build_script, mock_build_command)
+
+
+class TestRenderRequest(object):
+    def test_script(self, render_request, mock_exec_row, mock_build_script):
+        response = render_request({
+            'answers': {'JobName': 'a'}, 'type': 'script', 'syntax': 'zsh'})
+        assert response == {'output': sentinel.script}
+        mock_exec_row.assert_called_once_with({'JobName': 'a'})
+        mock_build_script.assert_called_once_with(
+            sentinel.flags, sentinel.command, 'zsh')
+
+    def test_command(self, render_request, mock_build_command):
+        response = render_request({'answers': {}, 'type': 'command'})
+        assert response == {'output': sentinel.bsub}
+        mock_build_command.assert_called_once_with(
+            sentinel.flags, sentinel.command)
+
+    def test_defaults_to_bash_script(self, render_request, mock_build_script):
+        render_request({'answers': {}})
+        mock_build_script.assert_called_once_with(
+            sentinel.flags, sentinel.command, 'bash')
+
+    def test_answer_errors(self, render_request, mock_exec_row):
+        mock_exec_row.return_value = ([], None, ['JobName: bad'])
+        assert render_request({'answers': {}}) == {'errors': ['JobName: bad']}
+
+    def test_invalid_request(self, render_request):
+        response = render_request({
+            'answers': [], 'type': 'neither', 'syntax': 'fish'})
+        assert response == {'errors': [
+            'type: expected one of script, command',
+            'syntax: expected one of bash, zsh, tcsh, ksh, python',
+            'answers: expected a JSON object',
+        ]}
+
+    def test_not_an_object(self, render_request):
+        assert render_request([]) == {
+            'errors': ['request must be a JSON object']}
+
+
+@fixture
+def socket_path(tmpdir):
+    return str(tmpdir.join('ibsub.sock'))
+
+
+@fixture
+def running_server(socket_path):
+    def render_request(request):
+        return {'output': request['answers']['JobName']}
+    server = Server(socket_path, render_request)
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs={'poll_interval': 0.01})
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestServer(object):
+    def test_round_trip(self, running_server, socket_path):
+        for name in ['a', 'b']:
+            assert client.send(
+                {'answers': {'JobName': name}}, socket_path) == {
+                    'output': name}
+
+    def test_invalid_json(self, running_server, socket_path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+        sock.sendall(b'{oops\n')
+        line = sock.makefile('rb').readline()
+        sock.close()
+        assert b'invalid JSON' in line
+
+    def test_refuses_to_replace_running_server(
+            self, running_server, socket_path):
+        with raises(ServerError) as exc_info:
+            Server(socket_path, MagicMock())
+        assert_exc_info_msg(
+            exc_info, '{0}: a server is already running'.format(socket_path))
+
+    def test_replaces_stale_socket(self, socket_path):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        server = Server(socket_path, MagicMock())
+        server.server_close()
+
+    def test_refreshes_periodically(self, socket_path):
+        now = [0]
+        refresh = MagicMock()
+        server = Server(socket_path, MagicMock(), refresh=refresh,
+                        refresh_interval=60, clock=lambda: now[0])
+        server.refresh_if_due()
+        now[0] = 60
+        server.refresh_if_due()
+        server.refresh_if_due()
+        server.server_close()
+        assert refresh.call_count == 1
+
+    def test_refreshes_while_serving(self, socket_path):
+        refreshed = threading.Event()
+        server = Server(socket_path, MagicMock(), refresh=refreshed.set,
+                        refresh_interval=0)
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        try:
+            assert refreshed.wait(5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_idle_connection_does_not_block_others(
+            self, running_server, socket_path):
+        idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        idle.connect(socket_path)
+        try:
+            assert client.send(
+                {'answers': {'JobName': 'a'}}, socket_path) == {'output': 'a'}
+        finally:
+            idle.close()
+
+
+def test_client_without_server(socket_path):
+    with raises(client.ServerUnavailable):
+        client.send({}, socket_path)
@@ -3,10 +3,13 @@ import sys
 import inspect
 import subprocess
 
+from mock import MagicMock
+from pytest import fixture
 import pytest
 parametrize = pytest.mark.parametrize
 
-from lsf_ibutils.ibsub import shell
+from lsf_ibutils.ibsub import procfs, shell
+from lsf_ibutils.ibsub.cache import DiskCache
 
 ## Python 2.6 subprocess.check_output compatibility.
 if 'check_output' not in dir(subprocess):
@@ -63,3 +66,57 @@ class TestDetect(object):
         # the executable, I guess).
         detected_shell = out.rstrip()
         assert detected_shell == shell_exe.encode('ascii')
+
+
+class TestDetectWithReason(object):
+    @fixture
+    def session_cache(self, tmpdir):
+        return DiskCache(str(tmpdir))
+
+    @fixture
+    def ancestors(self, monkeypatch):
+        ancestors = MagicMock(return_value=iter([]))
+        monkeypatch.setattr(shell, '_ancestors', ancestors)
+        return ancestors
+
+    @fixture(autouse=True)
+    def parent(self, monkeypatch):
+        monkeypatch.setattr(os, 'getppid', lambda: 100)
+        monkeypatch.setattr(procfs, 'read_comm', lambda pid: 'python')
+        monkeypatch.delenv('SHELL', raising=False)
+
+    def test_parent(self, monkeypatch, session_cache, ancestors):
+        monkeypatch.setattr(procfs, 'read_comm', lambda pid: 'zsh')
+        detection = shell.detect_with_reason(session_cache)
+        assert detection.shell == 'zsh'
+        assert detection.reason == 'parent process zsh (pid 100)'
+        assert ancestors.call_count == 0
+
+    def test_walk(self, session_cache, ancestors):
+        ancestors.return_value = iter([
+            (1, 100, 'python'), (2, 50, 'bash-4.1'), (3, 1, 'init')])
+        detection = shell.detect_with_reason(session_cache)
+        assert detection.shell == 'bash'
+        assert detection.reason == (
+            'ancestor process bash-4.1 (pid 50) at depth 2')
+        ancestors.assert_called_once_with(shell.MAX_DEPTH)
+
+    def test_login_shell(self, monkeypatch, session_cache, ancestors):
+        monkeypatch.setenv('SHELL', '/bin/tcsh')
+        detection = shell.detect_with_reason(session_cache)
+        assert detection.shell == 'tcsh'
+        assert detection.reason == '$SHELL is /bin/tcsh'
+
+    def test_nothing_found(self, monkeypatch, session_cache, ancestors):
+        monkeypatch.setenv('SHELL', '/usr/bin/fish')
+        assert shell.detect_with_reason(session_cache).shell is None
+
+    def test_remembered_for_session(self, session_cache, ancestors):
+        ancestors.return_value = iter([(1, 100, 'ksh')])
+        shell.detect_with_reason(session_cache)
+        detection = shell.detect_with_reason(session_cache)
+        assert detection.shell == 'ksh'
+        assert detection.reason == (
+            'remembered for this session: ancestor process ksh (pid 100) at '
+            'depth 1')
+        assert ancestors.call_count == 1
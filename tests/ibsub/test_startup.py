@@ -0,0 +1,28 @@
+import sys
+
+import pytest
+
+from benchmarks.startup import HEAVY_MODULES, import_times, parse_import_times
+
+parametrize = pytest.mark.parametrize
+
+# -X importtime appeared in Python 3.7.
+requires_importtime = pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='requires python -X importtime')
+
+
+def test_parse_import_times():
+    assert parse_import_times([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       120 |        340 | lsf_ibutils',
+        'import time:        20 |         20 |   lsf_ibutils.metadata',
+        'unrelated output',
+    ]) == {'lsf_ibutils': 340, 'lsf_ibutils.metadata': 20}
+
+
+@requires_importtime
+@parametrize('args', [['--version'], ['-t', 'command', '--help']])
+def test_heavy_modules_not_imported(args):
+    times = import_times(args)
+    assert 'lsf_ibutils.ibsub.main' in times
+    assert [name for name in HEAVY_MODULES if name in times] == []
@@ -0,0 +1,177 @@
+import json
+import os
+import stat
+from io import StringIO
+
+from mock import MagicMock
+from pytest import fixture, raises
+
+from lsf_ibutils.ibsub import submit
+from lsf_ibutils.ibsub.ratelimit import AdaptiveLimiter
+from lsf_ibutils.ibsub.submit import Submitter, SubmitResult
+from tests.helpers import assert_exc_info_msg
+
+# Fake bsub which fails as "too busy" until it has been called $BUSY_TIMES
+# times, then accepts the job. It rejects jobs in the queue `bad'.
+FAKE_BSUB = '''#!/bin/sh
+calls_file="$FAKE_BSUB_DIR/calls"
+# Appending a short line is atomic, so concurrent calls each add their own
+# line, and a call's number is the position of its line. A recycled PID
+# matches an earlier line too, so take the last match.
+echo $$ >> "$calls_file"
+count=$(grep -n "^$$\$" "$calls_file" | tail -n 1 | cut -d: -f1)
+if [ "$count" -le "${BUSY_TIMES:-0}" ]; then
+    echo "mbatchd: too busy. Try again later."
+    exit 255
+fi
+for arg in "$@"; do
+    if [ "$arg" = bad ]; then
+        echo "bad: No such queue. Job not submitted."
+        exit 255
+    fi
+done
+if [ $# -eq 0 ]; then
+    cat > "$FAKE_BSUB_DIR/stdin"
+fi
+echo "Job <$((1000 + count))> is submitted to queue <normal>."
+'''
+
+
+@fixture
+def fake_bsub(tmpdir, monkeypatch):
+    bsub = tmpdir.join('bsub')
+    bsub.write(FAKE_BSUB)
+    os.chmod(str(bsub), stat.S_IRWXU)
+    monkeypatch.setenv('PATH', str(tmpdir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_BSUB_DIR', str(tmpdir))
+    return tmpdir
+
+
+@fixture
+def mock_sleep():
+    return MagicMock()
+
+
+@fixture
+def submitter(mock_sleep):
+    return Submitter(workers=3, retries=2, backoff=1.0, max_backoff=3.0,
+                     sleep=mock_sleep, random=lambda: 0.5)
+
+
+class TestSubmit(object):
+    def test_success(self, fake_bsub, submitter, mock_sleep):
+        result = submitter.submit('bsub -q normal echo hi', key=7)
+        assert result.succeeded
+        assert result.job_id == '1001'
+        assert result.queue == 'normal'
+        assert result.attempts == 1
+        assert result.key == 7
+        assert mock_sleep.call_count == 0
+
+    def test_script_on_stdin(self, fake_bsub, submitter):
+        result = submitter.submit(script='#BSUB -J x\necho hi\n')
+        assert result.succeeded
+        assert fake_bsub.join('stdin').read() == '#BSUB -J x\necho hi\n'
+
+    def test_retries_when_busy(
+            self, fake_bsub, submitter, mock_sleep, monkeypatch):
+        monkeypatch.setenv('BUSY_TIMES', '2')
+        result = submitter.submit('bsub echo hi')
+        assert result.succeeded
+        assert result.attempts == 3
+        assert result.error is None
+        # Exponential backoff, halved by the fixed jitter.
+        assert [args[0] for args, _ in mock_sleep.call_args_list] == [
+            0.5, 1.0]
+
+    def test_gives_up_after_retries(
+            self, fake_bsub, submitter, mock_sleep, monkeypatch):
+        monkeypatch.setenv('BUSY_TIMES', '10')
+        result = submitter.submit('bsub echo hi')
+        assert not result.succeeded
+        assert result.attempts == 3
+        assert 'too busy' in result.error
+
+    def test_does_not_retry_rejection(
+            self, fake_bsub, submitter, mock_sleep):
+        result = submitter.submit('bsub -q bad echo hi')
+        assert not result.succeeded
+        assert result.attempts == 1
+        assert result.error == 'bad: No such queue. Job not submitted.'
+
+    def test_backoff_is_capped(self, submitter):
+        submitter._random = lambda: 1.0
+        assert [submitter._retry_delay(n) for n in range(1, 5)] == [
+            1.0, 2.0, 3.0, 3.0]
+
+
+class TestSubmitAll(object):
+    def test_submits_everything(self, fake_bsub, submitter):
+        jobs = (('row{0}'.format(n), 'bsub echo {0}'.format(n))
+                for n in range(10))
+        results = list(submitter.submit_all(jobs))
+        assert sorted(result.key for result in results) == sorted(
+            'row{0}'.format(n) for n in range(10))
+        assert all(result.succeeded for result in results)
+        # Concurrent calls of the fake each get their own job ID.
+        assert sorted(int(result.job_id) for result in results) == list(
+            range(1001, 1011))
+
+    def test_reraises_input_errors(self, fake_bsub, submitter):
+        def jobs():
+            yield 1, 'bsub echo 1'
+            raise ValueError('bad input')
+        with raises(ValueError) as exc_info:
+            list(submitter.submit_all(jobs()))
+        assert_exc_info_msg(exc_info, 'bad input')
+
+
+def test_write_manifest():
+    succeeded = SubmitResult(1, 'bsub a')
+    succeeded.job_id = '10'
+    succeeded.queue = 'normal'
+    failed = SubmitResult(2, 'bsub b')
+    failed.error = 'rejected'
+    stream = StringIO()
+    assert submit.write_manifest([succeeded, failed], stream) == (1, 1)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line['job_id'] for line in lines] == ['10', None]
+    assert lines[1]['error'] == 'rejected'
+
+
+def test_limiter_gates_submissions(fake_bsub, monkeypatch):
+    monkeypatch.setenv('BUSY_TIMES', '1')
+    limiter = AdaptiveLimiter(initial=1, maximum=2, target_latency=60.0)
+    submitter = Submitter(workers=2, retries=2, sleep=MagicMock(),
+                          limiter=limiter)
+    results = list(submitter.submit_all(
+        (n, 'bsub echo {0}'.format(n)) for n in range(5)))
+    assert all(result.succeeded for result in results)
+    metrics = limiter.metrics()
+    assert metrics['completed'] == 6
+    assert metrics['error_rate'] == 1.0 / 6
+    assert metrics['in_flight'] == 0
+
+
+def test_limiter_released_when_bsub_raises(monkeypatch):
+    def broken_run(*args, **kwargs):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(submit.runner, 'run', broken_run)
+    limiter = AdaptiveLimiter(initial=1, maximum=1, target_latency=60.0)
+    submitter = Submitter(workers=1, sleep=MagicMock(), limiter=limiter)
+    results = list(submitter.submit_all(
+        (n, 'bsub echo {0}'.format(n)) for n in range(3)))
+    assert [result.error for result in results] == ['broken'] * 3
+    assert limiter.metrics()['in_flight'] == 0
+
+
+def test_timeout(tmpdir, monkeypatch):
+    bsub = tmpdir.join('bsub')
+    bsub.write('#!/bin/sh\nexec sleep 10\n')
+    os.chmod(str(bsub), stat.S_IRWXU)
+    monkeypatch.setenv('PATH', str(tmpdir) + os.pathsep + os.environ['PATH'])
+    submitter = Submitter(sleep=MagicMock(), timeout=0.2)
+    result = submitter.submit(script='echo hi\n')
+    assert not result.succeeded
+    assert result.attempts == 1
+    assert result.error == 'bsub timed out after 0.2 seconds'
@@ -0,0 +1,173 @@
+from io import StringIO
+
+from pytest import fixture, raises
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import sweep
+from lsf_ibutils.ibsub.sweep import (
+    Values, Range, Product, Zip, SweepError)
+from tests.helpers import assert_exc_info_msg
+
+
+class TestValues(object):
+    def test_points(self):
+        values = Values('tasks', [16, 32])
+        assert values.names == ['tasks']
+        assert len(values) == 2
+        assert list(values) == [('16',), ('32',)]
+
+
+class TestRange(object):
+    @parametrize(('args', 'points'), [
+        ((1, 3), ['1', '2', '3']),
+        ((0, 10, 5), ['0', '5', '10']),
+        ((3, 1, -1), ['3', '2', '1']),
+    ])
+    def test_stop_is_inclusive(self, args, points):
+        assert [value for value, in Range('n', *args)] == points
+
+    def test_zero_step(self):
+        with raises(SweepError):
+            Range('n', 1, 2, 0)
+
+
+class TestProduct(object):
+    def test_points(self):
+        product = Product(Values('a', [1, 2]), Values('b', ['x', 'y', 'z']))
+        assert product.names == ['a', 'b']
+        assert len(product) == 6
+        assert list(product)[:4] == [
+            ('1', 'x'), ('1', 'y'), ('1', 'z'), ('2', 'x')]
+
+    def test_duplicate_names(self):
+        with raises(SweepError) as exc_info:
+            Product(Values('a', [1]), Values('a', [2]))
+        assert_exc_info_msg(exc_info, "parameter 'a' appears twice")
+
+
+class TestZip(object):
+    def test_points(self):
+        zipped = Zip(Values('a', [1, 2]), Values('b', ['x', 'y']))
+        assert zipped.names == ['a', 'b']
+        assert len(zipped) == 2
+        assert list(zipped) == [('1', 'x'), ('2', 'y')]
+
+    def test_different_lengths(self):
+        with raises(SweepError) as exc_info:
+            Zip(Values('a', [1, 2]), Values('b', ['x']))
+        assert_exc_info_msg(
+            exc_info, "zipped parameters 'a', 'b' have different lengths")
+
+
+class TestParse(object):
+    def test_nested(self):
+        parsed = sweep.parse({'product': [
+            {'name': 'tasks', 'range': [16, 64, 16]},
+            {'zip': [
+                {'name': 'ptile', 'values': [8, 16]},
+                {'name': 'walltime', 'values': ['1:00', '0:30']},
+            ]},
+        ]})
+        assert parsed.names == ['tasks', 'ptile', 'walltime']
+        assert len(parsed) == 8
+
+    @parametrize(('spec', 'message'), [
+        ([], 'expected an object, got []'),
+        ({'product': []}, "'product' needs a non-empty list"),
+        ({'values': [1]},
+         "expected one of 'name', 'product' or 'zip' in {'values': [1]}"),
+        ({'name': 'n'}, "parameter 'n' needs 'values' or 'range'"),
+        ({'name': 'n', 'range': ['a', 'b']},
+         "range for 'n' needs 2 or 3 integers"),
+        ({'name': 'n', 'range': [1]},
+         "range for 'n' needs 2 or 3 integers"),
+        ({'name': 'my-var; touch /tmp/pwned', 'values': [1, 2]},
+         "invalid parameter name 'my-var; touch /tmp/pwned': expected "
+         "letters, digits and underscores, not starting with a digit"),
+        ({'name': 1, 'values': [1, 2]},
+         'invalid parameter name 1: expected letters, digits and '
+         'underscores, not starting with a digit'),
+        ({'name': '2n', 'range': [1, 2]},
+         "invalid parameter name '2n': expected letters, digits and "
+         "underscores, not starting with a digit"),
+        ({'name': 'n', 'values': []}, "parameter 'n' has no values"),
+        ({'name': 'n', 'values': 'abc'}, "values for 'n' must be a list"),
+        ({'name': 'n', 'range': [5, 1]}, "parameter 'n' has no values"),
+    ])
+    def test_invalid(self, spec, message):
+        with raises(SweepError) as exc_info:
+            sweep.parse(spec)
+        assert_exc_info_msg(exc_info, message)
+
+    def test_load(self):
+        assert len(sweep.load(StringIO(
+            u'{"name": "n", "values": [1, 2, 3]}'))) == 3
+
+    def test_load_invalid_json(self):
+        with raises(SweepError):
+            sweep.load(StringIO(u'{'))
+
+
+class TestArrayFlags(object):
+    def test_flags(self):
+        assert sweep.array_flags([
+            ['-J', 'name'],
+            ['-o', 'name.%J.out'],
+            ['-e', 'name.%J.%I.err'],
+            ['-n', '4'],
+        ], 10) == [
+            ['-J', 'name[1-10]'],
+            ['-o', 'name.%J.%I.out'],
+            ['-e', 'name.%J.%I.err'],
+            ['-n', '4'],
+        ]
+
+    def test_no_job_name(self):
+        assert sweep.array_flags([['-n', '4']], 2) == [
+            ['-J', 'ibsub[1-2]'], ['-n', '4']]
+
+
+class TestLookupTable(object):
+    @fixture
+    def two_parameters(self):
+        return Zip(Values('n', [1, 2]), Values('label', ['a b', 'c']))
+
+    @parametrize(('syntax', 'lines'), [
+        ('bash', [
+            'sweep_n=(1 2)',
+            'export n="${sweep_n[$((LSB_JOBINDEX - 1))]}"',
+            "sweep_label=('a b' c)",
+            'export label="${sweep_label[$((LSB_JOBINDEX - 1))]}"',
+        ]),
+        ('ksh', [
+            'set -A sweep_n 1 2',
+            'export n="${sweep_n[$((LSB_JOBINDEX - 1))]}"',
+            "set -A sweep_label 'a b' c",
+            'export label="${sweep_label[$((LSB_JOBINDEX - 1))]}"',
+        ]),
+        ('zsh', [
+            'sweep_n=(1 2)',
+            'export n="${sweep_n[$LSB_JOBINDEX]}"',
+            "sweep_label=('a b' c)",
+            'export label="${sweep_label[$LSB_JOBINDEX]}"',
+        ]),
+        ('tcsh', [
+            'set sweep_n = ( 1 2 )',
+            'setenv n "$sweep_n[$LSB_JOBINDEX]"',
+            "set sweep_label = ( 'a b' c )",
+            'setenv label "$sweep_label[$LSB_JOBINDEX]"',
+        ]),
+        ('python', [
+            'import os',
+            '_sweep = [',
+            "    ('1', 'a b'),",
+            "    ('2', 'c'),",
+            ']',
+            "for _name, _value in zip(('n', 'label'), "
+            "_sweep[int(os.environ['LSB_JOBINDEX']) - 1]):",
+            '    os.environ[_name] = _value',
+        ]),
+    ])
+    def test_syntaxes(self, two_parameters, syntax, lines):
+        assert sweep.lookup_table(two_parameters, syntax) == lines
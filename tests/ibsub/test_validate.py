@@ -47,3 +47,44 @@ def test_time_duration(text, valid):
 ])
 def test_yes_no(text, valid):
     assert validate.yes_no(text) == valid
+
+
+COLUMN_TEXTS = [
+    '', '0', '00', '7', '05', '+3', ' 7 ', '1_0', u'١', u'\xb2', '-1',
+    '1:00', '12:3', ':1', '1\n', '\n', 'y', 'n', 'yy', 'x',
+]
+
+
+@parametrize(('column_validator', 'validator'), [
+    (validate.positive_integer_column, validate.positive_integer),
+    (validate.time_duration_column, validate.time_duration),
+    (validate.yes_no_column, validate.yes_no),
+])
+@parametrize('texts', [
+    [],
+    ['30', '45', 'y', 'n'],
+    # Each text on its own, then next to every other text.
+    [[text] for text in COLUMN_TEXTS],
+    [[a, b] for a in COLUMN_TEXTS for b in COLUMN_TEXTS],
+])
+def test_columns_agree(column_validator, validator, texts):
+    columns = texts if texts and isinstance(texts[0], list) else [texts]
+    for column in columns:
+        mask, errors = column_validator(column)
+        assert mask == [validator(text) for text in column]
+        assert errors == [
+            index for index, valid in enumerate(mask) if not valid]
+
+
+def test_column_chunks(monkeypatch):
+    monkeypatch.setattr(validate, 'COLUMN_CHUNK_SIZE', 3)
+    texts = ['1', '2', '3', '4', 'x', '6', '7', '0']
+    assert validate.positive_integer_column(texts) == (
+        [True] * 4 + [False, True, True, False], [4, 7])
+
+
+def test_column_accepts_numpy_arrays():
+    numpy = pytest.importorskip('numpy')
+    mask, errors = validate.yes_no_column(numpy.array(['y', 'x', 'n']))
+    assert mask.tolist() == [True, False, True]
+    assert errors.tolist() == [1]
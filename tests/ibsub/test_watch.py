@@ -0,0 +1,170 @@
+import os
+import stat
+
+from pytest import fixture, raises
+import pytest
+parametrize = pytest.mark.parametrize
+
+from lsf_ibutils.ibsub import watch
+from lsf_ibutils.ibsub.main import WatchMain
+from lsf_ibutils.ibsub.watch import JobWatcher, MISSING
+
+# Fake bjobs which prints the file `output', counting its calls and recording
+# its arguments. It fails with status $BJOBS_STATUS, if set.
+FAKE_BJOBS = '''#!/bin/sh
+echo "$@" >> "$FAKE_BJOBS_DIR/args"
+cat "$FAKE_BJOBS_DIR/output"
+exit ${BJOBS_STATUS:-0}
+'''
+
+
+@fixture
+def fake_bjobs(tmpdir, monkeypatch):
+    bjobs = tmpdir.join('bjobs')
+    bjobs.write(FAKE_BJOBS)
+    os.chmod(str(bjobs), stat.S_IRWXU)
+    tmpdir.join('output').write('')
+    monkeypatch.setenv('PATH', str(tmpdir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_BJOBS_DIR', str(tmpdir))
+    return tmpdir
+
+
+def set_jobs(fake_bjobs, *jobs):
+    fake_bjobs.join('output').write(''.join(
+        ';'.join(job) + '\n' for job in jobs))
+
+
+def calls(fake_bjobs):
+    return fake_bjobs.join('args').read().splitlines()
+
+
+def test_read_job_ids():
+    assert list(watch.read_job_ids([
+        '{"job_id": "1001", "key": 1}\n',
+        '{"job_id": null, "error": "rejected"}\n',
+        'Job <1002> is submitted to default queue <regular>.\n',
+        '1003\n',
+        '1004[2]\n',
+        'garbage\n',
+        '\n',
+    ])) == ['1001', '1002', '1003', '1004[2]']
+
+
+def test_parse_bjobs():
+    assert list(watch.parse_bjobs(iter([
+        '1001;0;RUN;-',
+        '1002;3;EXIT;1',
+        'No unfinished job found',
+        '',
+    ]))) == [
+        ('1001', None, 'RUN', None),
+        ('1002[3]', '1002', 'EXIT', '1'),
+    ]
+
+
+class TestJobWatcher(object):
+    def test_reports_only_changes(self, fake_bjobs):
+        watcher = JobWatcher(['1', '2'])
+        set_jobs(fake_bjobs, ('1', '0', 'PEND', '-'), ('2', '0', 'PEND', '-'),
+                 ('3', '0', 'RUN', '-'))
+        assert [str(t) for t in watcher.poll()] == [
+            '1\t- -> PEND', '2\t- -> PEND']
+        set_jobs(fake_bjobs, ('1', '0', 'RUN', '-'), ('2', '0', 'PEND', '-'))
+        assert [str(t) for t in watcher.poll()] == ['1\tPEND -> RUN']
+        assert watcher.poll() == []
+        set_jobs(fake_bjobs, ('1', '0', 'EXIT', '3'), ('2', '0', 'DONE', '-'))
+        assert [str(t) for t in watcher.poll()] == [
+            '1\tRUN -> EXIT (exit code 3)', '2\tPEND -> DONE']
+        assert watcher.finished
+        assert watcher.exit_codes == {'1': '3'}
+        # One bjobs call per poll, however many jobs are watched.
+        assert calls(fake_bjobs) == [
+            '-a -noheader -o {0}'.format(watch.BJOBS_FIELDS)] * 4
+
+    def test_missing_jobs(self, fake_bjobs):
+        watcher = JobWatcher(['1', '2'])
+        set_jobs(fake_bjobs, ('1', '0', 'RUN', '-'))
+        transitions = watcher.poll()
+        assert [(t.job_id, t.new_state) for t in transitions] == [
+            ('1', 'RUN'), ('2', MISSING)]
+        assert not watcher.finished
+        assert watcher.counts() == {'RUN': 1, MISSING: 1}
+
+    def test_failed_poll_marks_nothing_missing(
+            self, fake_bjobs, monkeypatch):
+        monkeypatch.setenv('BJOBS_STATUS', '255')
+        watcher = JobWatcher(['1', '2'])
+        set_jobs(fake_bjobs, ('1', '0', 'RUN', '-'))
+        assert [t.job_id for t in watcher.poll()] == ['1']
+        assert watcher.error == 'bjobs: exited with status 255'
+        assert watcher.states == {'1': 'RUN', '2': None}
+
+    def test_tracks_array_elements(self, fake_bjobs):
+        watcher = JobWatcher(['5'])
+        set_jobs(fake_bjobs, ('5', '1', 'RUN', '-'), ('5', '2', 'PEND', '-'))
+        watcher.poll()
+        assert watcher.states == {'5[1]': 'RUN', '5[2]': 'PEND'}
+        set_jobs(fake_bjobs, ('5', '1', 'DONE', '-'), ('5', '2', 'RUN', '-'))
+        assert [str(t) for t in watcher.poll()] == [
+            '5[1]\tRUN -> DONE', '5[2]\tPEND -> RUN']
+
+    def test_user(self, fake_bjobs):
+        JobWatcher(['1'], user='all').poll()
+        assert calls(fake_bjobs)[0].endswith(' -u all')
+
+    def test_watch_stops_when_finished(self, fake_bjobs):
+        watcher = JobWatcher(['1'])
+        outputs = [('1', '0', 'RUN', '-'), ('1', '0', 'DONE', '-')]
+        set_jobs(fake_bjobs, outputs.pop(0))
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            set_jobs(fake_bjobs, outputs.pop(0))
+        polls = list(watcher.watch(interval=5, sleep=sleep))
+        assert [[t.new_state for t in poll] for poll in polls] == [
+            ['RUN'], ['DONE']]
+        assert sleeps == [5]
+
+
+class TestWatchMain(object):
+    def test_reads_job_ids(self, tmpdir):
+        manifest = tmpdir.join('manifest.jsonl')
+        manifest.write('{"job_id": "1"}\n{"job_id": "2"}\n')
+        args = WatchMain.parse_args(
+            ['progname', '-j', '3', str(manifest)])
+        assert args.job_ids == ['3', '1', '2']
+
+    @parametrize('argv', [
+        ['progname'],
+        ['progname', '-j', 'x'],
+        ['progname', '-j', '1', '--interval', '0'],
+    ])
+    def test_invalid_args(self, argv):
+        with raises(SystemExit):
+            WatchMain.parse_args(argv)
+
+    def test_prints_changes(self, fake_bjobs, capsys):
+        outputs = [
+            [('1', '0', 'RUN', '-'), ('2', '0', 'PEND', '-')],
+            [('1', '0', 'DONE', '-'), ('2', '0', 'EXIT', '2')],
+        ]
+        set_jobs(fake_bjobs, *outputs.pop(0))
+        args = WatchMain.parse_args(['progname', '-j', '1', '-j', '2'])
+        assert WatchMain().run(
+            args, sleep=lambda seconds: set_jobs(
+                fake_bjobs, *outputs.pop(0))) == 1
+        out, err = capsys.readouterr()
+        # The first poll only sets the baseline.
+        assert out == '1\tRUN -> DONE\n2\tPEND -> EXIT (exit code 2)\n'
+        lines = err.splitlines()
+        assert lines[0].endswith(' PEND=1 RUN=1')
+        assert lines[1].endswith(' DONE=1 EXIT=1')
+
+    def test_once(self, fake_bjobs, capsys):
+        set_jobs(fake_bjobs, ('1', '0', 'RUN', '-'))
+        args = WatchMain.parse_args(['progname', '--once', '-j', '1'])
+        assert WatchMain().run(args) == 0
+        out, err = capsys.readouterr()
+        assert out == ''
+        assert err.endswith(' RUN=1\n')